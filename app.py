@@ -1,9 +1,38 @@
 import sys
-from PyQt5 import QtWidgets
+import time
+
+_started = time.perf_counter()
+
+from PyQt5 import QtWidgets, QtCore
 from gui import MainWindow
 
+
+def report_startup(imported, constructed):
+    """
+    --measure-startup: 窗口显示并处理完第一轮事件后，输出启动各阶段耗时（JSON）并立即退出，
+    供 cli.py bench window 使用
+    """
+    import os
+    import json
+    shown = time.perf_counter()
+    print(json.dumps({
+        "import_ms": (imported - _started) * 1000,
+        "construct_ms": (constructed - imported) * 1000,
+        "window_ms": (shown - _started) * 1000,
+    }), flush=True)
+    # 监控线程和连接线程仍在运行，直接结束进程
+    os._exit(0)
+
+
 if __name__ == "__main__":
+    measure_startup = "--measure-startup" in sys.argv
+    if measure_startup:
+        sys.argv.remove("--measure-startup")
+    imported = time.perf_counter()
     app = QtWidgets.QApplication(sys.argv)
     window = MainWindow()
     window.show()
-    sys.exit(app.exec_()) 
\ No newline at end of file
+    if measure_startup:
+        constructed = time.perf_counter()
+        QtCore.QTimer.singleShot(0, lambda: report_startup(imported, constructed))
+    sys.exit(app.exec_())
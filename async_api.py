@@ -0,0 +1,278 @@
+import os
+import time
+import base64
+import asyncio
+from functools import partial
+
+import main
+from main import SERVER_CONFIG
+from key_cache import unwrapped_key_cache
+from cancellation import CancellationToken
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+
+def _endpoint_url(name, **params):
+    """根据配置拼接服务器端点URL"""
+    return f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints'][name].format(**params)}"
+
+
+class ProgressStream:
+    """
+    进度异步迭代器
+    加密/解密在线程池中执行时通过 callback 上报进度，调用方使用 async for 逐个读取，
+    任务结束后迭代自动停止
+    stats为True时逐个产生统计字典（percent、bytes_done、bytes_total、speed、eta、elapsed，
+    见 progress_reporter.ProgressReporter），否则产生百分比；
+    本地加密模式只上报百分比，此时统计字典只包含 percent，speed 和 eta 为None
+    """
+
+    _CLOSED = object()
+
+    def __init__(self, stats=False):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.stats = stats
+
+    def _post(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            # 事件循环已关闭（调用方已放弃等待），丢弃迟到的进度
+            pass
+
+    def callback(self, progress):
+        """线程安全的进度回调，可直接作为 progress_callback 传入同步接口"""
+        self._post(progress)
+
+    @property
+    def progress_callback(self):
+        """传给同步接口的 progress_callback"""
+        if not self.stats:
+            return self.callback
+        return lambda percent: self.callback({"percent": percent, "speed": None, "eta": None})
+
+    @property
+    def stats_callback(self):
+        """传给同步接口的 stats_callback，非统计模式时为None"""
+        return self.callback if self.stats else None
+
+    def close(self):
+        """结束进度流"""
+        self._post(self._CLOSED)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        item = await self.queue.get()
+        if item is self._CLOSED:
+            raise StopAsyncIteration
+        return item
+
+
+class AsyncServerClient:
+    """
+    异步服务器客户端
+    安装了aiohttp时网络请求直接在事件循环上执行，否则回退到在线程池中调用requests
+    """
+
+    def __init__(self):
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """关闭底层HTTP会话"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method, url, **kwargs):
+        """发送请求，返回 (状态码, JSON数据)"""
+        if HAS_AIOHTTP:
+            if self._session is None:
+                self._session = aiohttp.ClientSession(
+                    timeout=aiohttp.ClientTimeout(total=SERVER_CONFIG["timeout"])
+                )
+            async with self._session.request(method, url, **kwargs) as response:
+                if response.status != 200:
+                    return response.status, None
+                return response.status, await response.json(content_type=None)
+
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            None, partial(main.requests.request, method, url, timeout=SERVER_CONFIG["timeout"], **kwargs)
+        )
+        if response.status_code != 200:
+            return response.status_code, None
+        return response.status_code, response.json()
+
+    async def get_user_public_key(self, user_id):
+        """获取用户RSA公钥，失败时返回None"""
+        try:
+            status, data = await self._request("GET", _endpoint_url("get_public_key", user_id=user_id))
+            if status == 200:
+                return main.RSA.import_key(data["public_key"])
+            print(f"获取公钥失败，状态码: {status}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"获取公钥时出错: {e}")
+        return None
+
+    async def get_symmetric_key(self, user_id, encrypted_key):
+        """发送密钥密文到服务器解密，返回 (symmetric_key, salt)"""
+        symmetric_key, salt = unwrapped_key_cache.get(user_id, encrypted_key)
+        if symmetric_key is not None:
+            return symmetric_key, salt
+        try:
+            status, data = await self._request(
+                "POST",
+                _endpoint_url("decrypt_key", user_id=user_id),
+                json={"encrypted_key": base64.b64encode(encrypted_key).decode()}
+            )
+            if status == 200:
+                symmetric_key = bytes.fromhex(data["symmetric_key"])
+                salt = bytes.fromhex(data["salt"]) if data.get("salt") else None
+                unwrapped_key_cache.put(user_id, encrypted_key, symmetric_key, salt)
+                return symmetric_key, salt
+            print(f"服务器返回错误: {status}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"获取对称密钥时出错: {e}")
+        return None, None
+
+    async def register_session(self, client_id="pc_client"):
+        """注册加密会话，返回session_id，失败时返回None"""
+        try:
+            status, data = await self._request(
+                "POST", _endpoint_url("register_session"), json={"client_id": client_id}
+            )
+            if status == 200:
+                return data.get("session_id")
+            print(f"注册会话失败，状态码: {status}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"注册会话时出错: {e}")
+        return None
+
+    async def poll_for_approval(self, session_id, timeout=60, interval=2):
+        """
+        轮询服务器检查用户是否已通过移动端确认
+        返回: (approved, symmetric_key, salt)
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                status, data = await self._request("GET", _endpoint_url("check_approval", session_id=session_id))
+                if status == 200 and data.get("approved", False):
+                    symmetric_key = bytes.fromhex(data.get("symmetric_key", ""))
+                    salt = bytes.fromhex(data["salt"]) if data.get("salt") else None
+                    return True, symmetric_key, salt
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"轮询服务器时出错: {e}")
+            await asyncio.sleep(interval)
+        return False, None, None
+
+
+async def aes_encrypt_file_async(file_path, user_id, progress=None, acceleration_method=None,
+                                 thread_count=None, password=None, client=None, executor=None):
+    """
+    异步加密文件
+    公钥请求在事件循环上执行，加密计算在线程池中执行（内部仍使用进程池并行加密）
+    progress: 可选的 ProgressStream，任务结束时自动关闭
+    任务被取消时立即停止等待，并通过取消标记让线程池中的加密计算停止提交数据块、删除未完成的文件
+    返回: 加密后的文件路径，失败时返回None
+    """
+    own_client = client is None
+    client = client or AsyncServerClient()
+    loop = asyncio.get_running_loop()
+    cancel_token = CancellationToken()
+    try:
+        rsa_public_key = await client.get_user_public_key(user_id)
+        if rsa_public_key is None:
+            print("无法获取服务器公钥，使用本地加密模式")
+            return await loop.run_in_executor(
+                executor, main.encrypt_locally, file_path, password, progress.progress_callback if progress else None
+            )
+        return await loop.run_in_executor(executor, partial(
+            main.aes_encrypt_file,
+            file_path,
+            user_id,
+            progress_callback=progress.progress_callback if progress and not progress.stats else None,
+            stats_callback=progress.stats_callback if progress else None,
+            acceleration_method=acceleration_method,
+            thread_count=thread_count,
+            password=password,
+            rsa_public_key=rsa_public_key,
+            cancel_token=cancel_token,
+        ))
+    except asyncio.CancelledError:
+        cancel_token.cancel()
+        raise
+    finally:
+        if progress:
+            progress.close()
+        if own_client:
+            await client.close()
+
+
+async def aes_decrypt_file_async(encrypted_file_path, user_id, progress=None, client=None, executor=None):
+    """
+    异步解密文件
+    文件头尾读取和解密计算在线程池中执行，密钥解密请求在事件循环上执行
+    progress: 可选的 ProgressStream，任务结束时自动关闭
+    任务被取消时通过取消标记停止线程池中的解密计算并删除未完成的文件
+    返回: 解密后的文件路径，失败时返回None
+    """
+    own_client = client is None
+    client = client or AsyncServerClient()
+    loop = asyncio.get_running_loop()
+    progress_callback = progress.progress_callback if progress else None
+    stats_callback = progress.stats_callback if progress else None
+    cancel_token = CancellationToken()
+    try:
+        if not os.path.exists(encrypted_file_path):
+            print(f"加密文件不存在: {encrypted_file_path}")
+            return None
+
+        file_info = await loop.run_in_executor(executor, main.read_encrypted_file_info, encrypted_file_path)
+        if file_info is None:
+            return None
+        if file_info["mode"] == "local":
+            return await loop.run_in_executor(executor, main.decrypt_locally, encrypted_file_path, progress_callback)
+        if stats_callback:
+            progress_callback = None  # 统计中已包含百分比
+
+        symmetric_key, _ = await client.get_symmetric_key(user_id, file_info["encrypted_key"])
+        if symmetric_key is None:
+            print("无法从服务器获取对称密钥，解密失败")
+            return None
+        if file_info["mode"] == "session":
+            symmetric_key = main.derive_file_key(symmetric_key, file_info["iv"], file_info["key_id"])
+
+        return await loop.run_in_executor(
+            executor, main.decrypt_file_with_key, encrypted_file_path, symmetric_key, file_info,
+            progress_callback, cancel_token, stats_callback
+        )
+    except asyncio.CancelledError:
+        cancel_token.cancel()
+        raise
+    finally:
+        if progress:
+            progress.close()
+        if own_client:
+            await client.close()
@@ -0,0 +1,33 @@
+import threading
+
+
+class OperationCancelled(Exception):
+    """操作已被取消"""
+
+
+class CancellationToken:
+    """
+    协作式取消标记
+    发起方调用 cancel()，执行方在处理数据块之间检查 cancelled 或调用 raise_if_cancelled()；
+    可在任意线程中使用
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """请求取消"""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """已请求取消时抛出 OperationCancelled"""
+        if self._event.is_set():
+            raise OperationCancelled("操作已取消")
+
+    def wait(self, timeout=None):
+        """等待取消请求，返回是否已取消"""
+        return self._event.wait(timeout)
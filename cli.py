@@ -0,0 +1,523 @@
+import os
+import sys
+import time
+import argparse
+
+# 命令行入口，不依赖图形界面，可在没有 PyQt5 / pywin32 的Linux服务器上使用
+# 每个子命令只在执行时导入所需的模块，例如 inspect 只使用标准库，不会加载加密库和网络库
+
+# 每个子命令执行时导入的模块，bench startup 按此测量各子命令的启动时间
+COMMAND_IMPORTS = {
+    "inspect": ("enc_format",),
+    "encrypt": ("main",),
+    "decrypt": ("main",),
+    "batch": ("main", "watch_folder"),
+    "watch": ("watch_folder",),
+    "bench": ("main",),
+}
+
+# 需要与服务器通信的子命令，执行期间运行通知发件箱，发送积压的加密完成通知
+OUTBOX_COMMANDS = ("encrypt", "decrypt", "batch", "watch")
+
+# 启动较慢或只在Windows/图形界面下可用的模块，bench startup 会列出子命令加载了其中哪些
+HEAVY_MODULES = ("PyQt5", "gui", "win32gui", "pywinauto", "pythoncom", "numpy", "qrcode", "requests", "Crypto",
+                 "cryptography", "main")
+
+
+def _print_stats(stats):
+    from progress_reporter import format_speed, format_eta
+    sys.stderr.write(f"\r{stats['percent']:5.1f}%  {format_speed(stats['speed'])}  剩余 {format_eta(stats['eta'])} ")
+    if stats["bytes_done"] >= stats["bytes_total"]:
+        sys.stderr.write("\n")
+    sys.stderr.flush()
+
+
+def _encrypt_files(files, args):
+    """加密文件列表，返回失败的文件数"""
+    import main
+
+    if args.local:
+        return sum(main.encrypt_locally(path, args.password) is None for path in files)
+
+    if len(files) == 1:
+        return int(main.aes_encrypt_file(files[0], args.user, acceleration_method=args.method,
+                                         thread_count=args.processes, password=args.password,
+                                         stats_callback=_print_stats) is None)
+
+    # 多个文件共享一个加密会话（只进行一次RSA包装）和进程池
+    session = main.create_encryption_session(args.user, args.password)
+    if session is None:
+        return len(files)
+    pool = main.get_shared_pool(args.processes)
+    failed = 0
+    for i, path in enumerate(files, 1):
+        print(f"[{i}/{len(files)}] {path}")
+        if main.aes_encrypt_file(path, args.user, acceleration_method=args.method, password=args.password,
+                                 session=session, pool=pool) is None:
+            failed += 1
+    return failed
+
+
+def _decrypt_files(files, args):
+    """解密文件列表，返回失败的文件数"""
+    import main
+
+    if len(files) == 1:
+        return int(main.aes_decrypt_file(files[0], args.user, stats_callback=_print_stats) is None)
+
+    results = main.batch_decrypt_files(files, args.user, pool=main.get_shared_pool(args.processes))
+    return sum(result is None for result in results.values())
+
+
+def cmd_encrypt(args):
+    failed = _encrypt_files(args.files, args)
+    print(f"加密完成: 成功 {len(args.files) - failed} 个，失败 {failed} 个")
+    return 1 if failed else 0
+
+
+def cmd_decrypt(args):
+    failed = _decrypt_files(args.files, args)
+    print(f"解密完成: 成功 {len(args.files) - failed} 个，失败 {failed} 个")
+    return 1 if failed else 0
+
+
+def cmd_batch(args):
+    from watch_folder import iter_files
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(iter_files([path], recursive=args.recursive))
+        else:
+            files.append(path)
+    if args.decrypt:
+        files = [path for path in files if path.endswith(".enc")]
+    else:
+        files = [path for path in files if not path.endswith(".enc")]
+    if not files:
+        print("没有需要处理的文件")
+        return 0
+
+    action = "解密" if args.decrypt else "加密"
+    print(f"批量{action} {len(files)} 个文件")
+    started = time.perf_counter()
+    failed = _decrypt_files(files, args) if args.decrypt else _encrypt_files(files, args)
+    print(f"批量{action}完成: 成功 {len(files) - failed} 个，失败 {failed} 个，用时 {time.perf_counter() - started:.2f} 秒")
+    return 1 if failed else 0
+
+
+def cmd_inspect(args):
+    import json
+    from enc_format import read_encrypted_file_info
+
+    failed = 0
+    for path in args.files:
+        info = read_encrypted_file_info(path)
+        if info is None:
+            failed += 1
+            continue
+        report = {"path": path, "mode": info["mode"], "file_size": os.path.getsize(path)}
+        if "original_size" in info:
+            report["original_size"] = info["original_size"]
+            report["encrypted_data_size"] = info["encrypted_data_size"]
+            report["iv"] = info["iv"].hex()
+            report["wrapped_key_size"] = len(info["encrypted_key"])
+        if "key_id" in info:
+            report["key_id"] = info["key_id"].hex()
+        if args.json:
+            print(json.dumps(report, ensure_ascii=False))
+        else:
+            print(path)
+            for name, value in report.items():
+                if name != "path":
+                    print(f"  {name}: {value}")
+    return 1 if failed else 0
+
+
+def cmd_watch(args):
+    from watch_folder import main_cli as watch_main
+    return watch_main(args.watch_args)
+
+
+def _probe_imports(command):
+    """导入子命令所需的模块并输出耗时和加载的重量级模块（bench startup 在子进程中调用）"""
+    import json
+    import importlib
+
+    started = time.perf_counter()
+    error = None
+    try:
+        for name in COMMAND_IMPORTS[command]:
+            importlib.import_module(name)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(json.dumps({"import_ms": elapsed * 1000, "heavy": heavy, "error": error}))
+    return 0
+
+
+def _probe_first_encryption(size_mb):
+    """
+    测量首次加密的耗时：导入 main、检测加密后端、创建进程池并加密一个 size_mb MB 的临时文件
+    （bench first-encryption 在子进程中调用）。使用随机主密钥的加密会话，不需要连接服务器
+    """
+    import json
+    import tempfile
+
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    with os.fdopen(fd, "wb") as f:
+        f.write(os.urandom(int(size_mb * 1024 * 1024)))
+    result = {}
+    try:
+        started = time.perf_counter()
+        import main
+        imported = time.perf_counter()
+        session = main.EncryptionSession(os.urandom(32), os.urandom(256))
+        encrypted = main.aes_encrypt_file(path, "bench", session=session)
+        done = time.perf_counter()
+        result = {
+            "import_ms": (imported - started) * 1000,
+            "encrypt_ms": (done - imported) * 1000,
+            "error": None if encrypted else "加密失败",
+        }
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        for leftover in (path, path + ".enc"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+def _run_timed(command_line, timeout=None):
+    import subprocess
+
+    started = time.perf_counter()
+    try:
+        result = subprocess.run(command_line, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=timeout)
+        output = result.stdout
+    except subprocess.TimeoutExpired:
+        output = ""
+    return (time.perf_counter() - started) * 1000, output
+
+
+def _repeat_timed(command_line, repeat, timeout=None):
+    """
+    在新进程中重复运行 command_line，返回 (墙钟时间中位数 ms, 最后一次运行输出的JSON结果)；
+    子进程最后一行输出为JSON结果，没有输出时结果中只包含 error
+    """
+    import json
+    import statistics
+
+    walls, probe = [], {}
+    for _ in range(repeat):
+        wall, output = _run_timed(command_line, timeout)
+        walls.append(wall)
+        try:
+            probe = json.loads(output.strip().splitlines()[-1])
+        except (ValueError, IndexError):
+            probe = {"error": "子进程没有输出结果"}
+    return statistics.median(walls), probe
+
+
+def _report_timings(args, title, results, baseline):
+    """输出计时结果（results: 名称 -> 结果字典，含 total_ms），超过预算时返回1"""
+    import json
+
+    over_budget = [name for name, result in results.items()
+                   if args.budget_ms and result["total_ms"] > args.budget_ms]
+    if args.json:
+        print(json.dumps({"python_ms": baseline, title: results}, ensure_ascii=False))
+    else:
+        print(f"空解释器启动: {baseline:.1f} ms（{args.repeat} 次中位数）")
+        for name, result in results.items():
+            line = f"  {name:<8} {result['total_ms']:7.1f} ms  (+{max(result['total_ms'] - baseline, 0.0):.1f} ms)"
+            for field in ("import_ms", "construct_ms", "window_ms", "encrypt_ms"):
+                if result.get(field) is not None:
+                    line += f"  {field}={result[field]:.1f}"
+            if result.get("heavy"):
+                line += f"  加载: {', '.join(result['heavy'])}"
+            if result.get("error"):
+                line += f"  失败: {result['error']}"
+            print(line)
+        for name in over_budget:
+            print(f"{name} 超过预算 {args.budget_ms} ms")
+    return 1 if over_budget else 0
+
+
+def _python_baseline(repeat):
+    return _repeat_timed([sys.executable, "-c", "print('{}')"], repeat)[0]
+
+
+def bench_startup(args):
+    """
+    在新的解释器进程中测量每个子命令的启动时间（解释器启动 + 导入子命令所需模块），
+    重复 repeat 次取中位数，并列出空解释器的启动时间作对比
+    """
+    results = {}
+    for command in args.commands or list(COMMAND_IMPORTS):
+        wall, probe = _repeat_timed([sys.executable, os.path.abspath(__file__), "--probe-imports", command],
+                                    args.repeat)
+        results[command] = dict(probe, total_ms=wall)
+    return _report_timings(args, "commands", results, _python_baseline(args.repeat))
+
+
+def bench_window(args):
+    """测量从启动 app.py 到主窗口显示的时间（需要 PyQt5 和图形环境）"""
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+    wall, probe = _repeat_timed([sys.executable, app_path, "--measure-startup"], args.repeat, timeout=60)
+    return _report_timings(args, "window", {"window": dict(probe, total_ms=wall)}, _python_baseline(args.repeat))
+
+
+def bench_first_encryption(args):
+    """测量新进程中从启动到第一个文件加密完成的时间"""
+    wall, probe = _repeat_timed([sys.executable, os.path.abspath(__file__), "--probe-first-encryption",
+                                 str(args.size or 1)], args.repeat, timeout=300)
+    return _report_timings(args, "first_encryption", {"encrypt": dict(probe, total_ms=wall)},
+                           _python_baseline(args.repeat))
+
+
+def bench_throughput(args):
+    """在当前进程中测量各加速方式单个数据块的加密速度（单核）"""
+    import json
+    import main
+    from progress_reporter import format_speed
+
+    chunk_size = main.ENCRYPTION_CONFIG["chunk_size"]
+    total = int((args.size or 64) * 1024 * 1024)
+    chunk = os.urandom(chunk_size)
+    key, iv = os.urandom(32), os.urandom(16)
+    methods = [args.method] if args.method else main.get_available_acceleration_methods()
+    results = {}
+    for method in methods:
+        done = 0
+        started = time.perf_counter()
+        while done < total:
+            if main.encrypt_chunk_process(chunk, key, iv, done // chunk_size, method) is None:
+                break
+            done += chunk_size
+        elapsed = time.perf_counter() - started
+        results[method] = done / elapsed if elapsed > 0 else 0.0
+    if args.json:
+        print(json.dumps({"chunk_size": chunk_size, "bytes": total, "speed": results}, ensure_ascii=False))
+    else:
+        for method, speed in results.items():
+            print(f"  {method}: {format_speed(speed)}")
+    return 0
+
+
+def _hover_bench_events(duration, cycle=10.0):
+    """
+    合成的悬停事件流：每 cycle 秒依次为在资源管理器中快速移动1秒、停在一个文件上4秒、
+    移到其他窗口1秒、停在资源管理器的空白处4秒
+    """
+    events = []
+    start = 0.0
+    while start < duration:
+        t = start
+        while t < start + 1.0:
+            step = int((t - start) / 0.02)
+            events.append((t, 40 + 30 * step, 40 + 7 * step, "explorer"))
+            t += 0.02
+        events.append((start + 1.0, 40, 40, "explorer"))
+        events.append((start + 5.0, 500, 500, "other"))
+        events.append((start + 6.0, 1590, 1590, "explorer"))
+        start += cycle
+    return events
+
+
+def _hover_bench_file(window, x, y):
+    # 100像素一格的图标网格，每格左上角 80x80 为文件项
+    if x % 100 >= 80 or y % 100 >= 80:
+        return None
+    return f"file_{x // 100}_{y // 100}.txt"
+
+
+def bench_hover(args):
+    """在当前进程中回放合成事件流，测量悬停检测每次采样的耗时、采样次数和文件解析次数"""
+    import json
+    from hover_core import ScriptedHoverSource, replay
+
+    duration = args.size or 600
+    source = ScriptedHoverSource(_hover_bench_events(duration), {"explorer"}, _hover_bench_file)
+    started = time.perf_counter()
+    triggers, loop = replay(source)
+    elapsed = time.perf_counter() - started
+    result = {
+        "simulated_s": duration,
+        "samples": loop.samples,
+        "resolves": loop.resolves,
+        "triggers": len(triggers),
+        "wall_ms": elapsed * 1000,
+        "step_us": elapsed / loop.samples * 1e6 if loop.samples else 0.0,
+    }
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(f"  模拟 {duration:.0f} 秒: 采样 {loop.samples} 次，解析文件 {loop.resolves} 次，"
+              f"触发 {len(triggers)} 次，耗时 {result['wall_ms']:.1f} ms（每次采样 {result['step_us']:.1f} µs）")
+    return 0
+
+
+def _codec_bench_messages():
+    """bench codec 使用的典型消息：心跳、进度、RPC请求/响应、无schema的消息和一帧20条进度的批量消息"""
+    progress = [{"type": "progress", "timestamp": 1700000000.0 + i,
+                 "data": {"session_id": "3f2b6c1e-8a47-4d0b-9c55-0e1f2a3b4c5d", "file_name": "报告.pdf",
+                          "progress": i * 5, "bytes_done": i * 524288, "bytes_total": 10485760}}
+                for i in range(20)]
+    return {
+        "heartbeat": {"type": "heartbeat", "timestamp": 1700000000.0, "data": {"client_id": "pc_client"}},
+        "progress": progress[0],
+        "rpc_request": {"type": "rpc_request", "timestamp": 1700000000.0,
+                        "data": {"request_id": "0d9e8f7a-6b5c-4d3e-2f1a-0b9c8d7e6f5a", "method": "decrypt_key",
+                                 "params": {"user_id": "alice", "encrypted_key": "A" * 344}}},
+        "rpc_response": {"type": "rpc_response", "timestamp": 1700000000.0,
+                         "data": {"request_id": "0d9e8f7a-6b5c-4d3e-2f1a-0b9c8d7e6f5a",
+                                  "result": {"symmetric_key": "B" * 44}, "error": None}},
+        "unknown": {"type": "session_rejected", "timestamp": 1700000000.0,
+                    "data": {"session_id": "3f2b6c1e-8a47-4d0b-9c55-0e1f2a3b4c5d"}},
+        "batch": progress,
+    }
+
+
+def bench_codec(args):
+    """在当前进程中测量本机可用的各WebSocket消息编码的帧大小和编解码耗时"""
+    import json
+    from ws_codec import MessageCodec, available_encodings
+
+    iterations = max(int((args.size or 10) * 1000), 1)
+    results = {}
+    for encoding in available_encodings():
+        codec = MessageCodec(encoding)
+        results[encoding] = {}
+        for name, message in _codec_bench_messages().items():
+            encode = codec.encode_batch if name == "batch" else codec.encode
+            started = time.perf_counter()
+            for _ in range(iterations):
+                frame = encode(message)
+            encoded = time.perf_counter()
+            for _ in range(iterations):
+                codec.decode(frame)
+            decoded = time.perf_counter()
+            size = len(frame.encode("utf-8")) if isinstance(frame, str) else len(frame)
+            results[encoding][name] = {
+                "bytes": size,
+                "encode_us": (encoded - started) / iterations * 1e6,
+                "decode_us": (decoded - encoded) / iterations * 1e6,
+            }
+    if args.json:
+        print(json.dumps({"iterations": iterations, "encodings": results}, ensure_ascii=False))
+    else:
+        for encoding, messages in results.items():
+            print(f"{encoding}:")
+            for name, result in messages.items():
+                print(f"  {name:<13} {result['bytes']:6d} 字节  编码 {result['encode_us']:6.1f} µs"
+                      f"  解码 {result['decode_us']:6.1f} µs")
+    return 0
+
+
+BENCH_TARGETS = {
+    "startup": bench_startup,
+    "window": bench_window,
+    "first-encryption": bench_first_encryption,
+    "throughput": bench_throughput,
+    "hover": bench_hover,
+    "codec": bench_codec,
+}
+
+
+def cmd_bench(args):
+    return BENCH_TARGETS[args.target](args)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="文件加密命令行工具（无图形界面）")
+    parser.add_argument("--probe-imports", metavar="COMMAND", choices=list(COMMAND_IMPORTS), help=argparse.SUPPRESS)
+    parser.add_argument("--probe-first-encryption", metavar="MB", type=float, help=argparse.SUPPRESS)
+    subparsers = parser.add_subparsers(dest="command")
+
+    def add_key_options(sub):
+        sub.add_argument("--user", default="default_user", help="用户ID")
+        sub.add_argument("--processes", type=int, default=None, help="加密/解密进程数")
+
+    def add_encrypt_options(sub):
+        sub.add_argument("--password", default=None, help="生成密钥使用的密码")
+        sub.add_argument("--method", default=None, help="加速方式，见 bench throughput 的输出")
+        sub.add_argument("--local", action="store_true", help="本地加密模式，不连接服务器")
+
+    sub = subparsers.add_parser("encrypt", help="加密文件")
+    sub.add_argument("files", nargs="+")
+    add_key_options(sub)
+    add_encrypt_options(sub)
+    sub.set_defaults(func=cmd_encrypt)
+
+    sub = subparsers.add_parser("decrypt", help="解密 .enc 文件")
+    sub.add_argument("files", nargs="+")
+    add_key_options(sub)
+    sub.set_defaults(func=cmd_decrypt)
+
+    sub = subparsers.add_parser("batch", help="批量加密目录中的文件（--decrypt 时批量解密 .enc 文件）")
+    sub.add_argument("paths", nargs="+", help="文件或目录")
+    sub.add_argument("--decrypt", action="store_true", help="解密 .enc 文件")
+    sub.add_argument("--no-recursive", dest="recursive", action="store_false", help="不处理子目录")
+    add_key_options(sub)
+    add_encrypt_options(sub)
+    sub.set_defaults(func=cmd_batch)
+
+    sub = subparsers.add_parser("inspect", help="查看 .enc 文件的头部和尾部信息（不加载加密库）")
+    sub.add_argument("files", nargs="+")
+    sub.add_argument("--json", action="store_true", help="每个文件输出一行JSON")
+    sub.set_defaults(func=cmd_inspect)
+
+    sub = subparsers.add_parser("watch", help="监控目录自动加密，参数同 watch_folder.py")
+    sub.add_argument("watch_args", nargs=argparse.REMAINDER)
+    sub.set_defaults(func=cmd_watch)
+
+    sub = subparsers.add_parser("bench", help="性能测量：子命令启动时间（startup）、主窗口显示时间（window）、"
+                                              "首次加密时间（first-encryption）、加密速度（throughput）、"
+                                              "悬停检测回放（hover）、消息编解码（codec）")
+    sub.add_argument("target", nargs="?", choices=list(BENCH_TARGETS), default="startup")
+    sub.add_argument("--commands", nargs="+", choices=list(COMMAND_IMPORTS), default=None,
+                     help="startup: 要测量的子命令，默认全部")
+    sub.add_argument("--repeat", type=int, default=5, help="startup/window/first-encryption: 重复次数")
+    sub.add_argument("--budget-ms", type=float, default=None,
+                     help="startup/window/first-encryption: 时间预算，超过时返回1")
+    sub.add_argument("--size", type=float, default=None,
+                     help="throughput: 每种加速方式加密的数据量（MB，默认64）；first-encryption: 文件大小（MB，默认1）；"
+                          "hover: 回放的模拟时长（秒，默认600）；codec: 每种消息编解码的次数（千次，默认10）")
+    sub.add_argument("--method", default=None, help="throughput: 只测量指定的加速方式")
+    sub.add_argument("--json", action="store_true", help="输出JSON")
+    sub.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main_cli(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.probe_imports:
+        return _probe_imports(args.probe_imports)
+    if args.probe_first_encryption is not None:
+        return _probe_first_encryption(args.probe_first_encryption)
+    if not args.command:
+        parser.print_help()
+        return 2
+    outbox = None
+    if args.command in OUTBOX_COMMANDS:
+        from notification_outbox import get_notification_outbox
+        outbox = get_notification_outbox()
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        print("已中断")
+        return 130
+    finally:
+        if outbox is not None:
+            # 退出前尝试发送剩余通知，发送失败的留在发件箱中下次启动时重试
+            outbox.stop(flush=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -10,9 +10,12 @@ SERVER_CONFIG = {
         "register_session": "/api/session/register",   # 注册会话
         "check_approval": "/api/session/check/{session_id}", # 检查用户确认状态
         "encryption_completed": "/api/encryption/completed", # 通知加密完成
+        "encryption_completed_batch": "/api/encryption/completed_batch", # 批量通知加密完成
         "get_key": "/api/key/get",                     # 获取密钥
         "decrypt_key": "/api/key/decrypt/{user_id}",   # 解密密钥
+        "decrypt_key_batch": "/api/key/decrypt_batch/{user_id}", # 批量解密密钥
         "get_public_key": "/api/key/public/{user_id}", # 获取公钥
+        "qr_token": "/api/qr/token",  # 登记二维码元数据，换取短令牌
         "websocket": "/ws",                            # WebSocket连接
     },
     
@@ -21,6 +24,15 @@ SERVER_CONFIG = {
     "ws_timeout": 10,  # WebSocket连接超时时间（秒）
     "retry_count": 3,  # 重试次数
     "heartbeat_interval": 30,  # 心跳包间隔（秒）
+    "reconnect_base_delay": 1,  # WebSocket断线重连的初始等待时间（秒）
+    "reconnect_max_delay": 60,  # WebSocket断线重连的最大等待时间（秒）
+    "send_buffer_size": 1000,  # 断线期间最多缓存的待发送消息数
+    "send_batch_max": 64,  # 同时就绪的消息合并为一帧发送的最大条数
+    "rpc_timeout": 10,  # WebSocket RPC请求的默认超时时间（秒）
+    "ws_encodings": ["msgpack", "cbor", "json"],  # 向服务器提议的消息编码（按优先级），仅包含json时不协商
+    "ws_compression": True,  # 启用WebSocket permessage-deflate压缩
+    "dispatch_workers": 4,  # 执行WebSocket消息处理函数的工作线程数
+    "dispatch_queue_size": 256,  # 待处理消息数上限，达到上限时暂停读取连接
 }
 
 # 加密配置
@@ -30,6 +42,10 @@ ENCRYPTION_CONFIG = {
     "rsa_key_size": 2048,
     "max_workers": None,  # 多进程工作进程数，None表示使用CPU核心数
     "process_timeout": 300,  # 进程超时时间（秒）
+    "inflight_per_worker": 2,  # 加密时每个进程在途的数据块数，限制内存占用和取消等待时间
+    "progress_interval": 0.1,  # 进度回调的最小间隔（秒）
+    "unwrap_batch_size": 256,  # 批量解密密钥时每次请求包含的密钥数
+    "footer_read_workers": 16,  # 批量解密时并行读取文件尾部的线程数
 }
 
 # 界面配置
@@ -37,4 +53,88 @@ UI_CONFIG = {
     "window_title": "文件自动加密系统",
     "window_size": (800, 600),
     "qr_size": (300, 300),
-} 
\ No newline at end of file
+    "max_concurrent_jobs": 2,  # 同时运行的加密/解密任务数，其余任务排队
+    "job_history": 20,  # 任务队列中保留显示的已完成任务数
+    "progress_refresh_ms": 200,  # 任务进度界面的合并刷新间隔（毫秒）
+} 
+
+# 密钥缓存配置
+KEY_CACHE_CONFIG = {
+    "enabled": True,  # 是否缓存服务器解密后的对称密钥
+    "max_entries": 256,  # 最多缓存的密钥数
+    "ttl": 600,  # 密钥缓存有效期（秒）
+    "purge_interval": 30,  # 清除过期密钥的间隔（秒），查询缓存时和主窗口定时器中按此间隔清理
+    "public_key_ttl": 600,  # 服务器公钥缓存有效期（秒），0表示不缓存
+}
+
+# 加密完成通知发件箱配置
+NOTIFICATION_CONFIG = {
+    "outbox_path": "notification_outbox.db",  # 本地发件箱数据库路径
+    "batch_size": 100,  # 每次批量发送的通知数
+    "flush_interval": 2,  # 发送周期（秒）
+    "retry_base_delay": 1,  # 发送失败后的初始重试间隔（秒）
+    "retry_max_delay": 300,  # 最大重试间隔（秒）
+}
+
+# 二维码配置
+QR_CONFIG = {
+    # 二维码内容格式: "token" 服务器短令牌（失败时回退到compact），
+    # "compact" 本地紧凑二进制+base45，"json" 完整JSON（旧格式）
+    "payload_mode": "compact",
+    "compact_version": 5,  # 紧凑格式使用的固定二维码版本（37x37模块）
+    "max_name_bytes": 32,  # 紧凑格式中文件名最多保留的UTF-8字节数
+}
+
+# 悬停检测配置（hover_core）
+HOVER_CONFIG = {
+    "threshold": 3.0,  # 在同一文件上悬停多少秒后触发加密/解密
+    "cooldown": 10.0,  # 同一文件两次触发的最小间隔（秒）
+    "move_tolerance": 4,  # 鼠标移动不超过该像素数时视为静止，不重新查询文件
+    "fast_interval": 0.05,  # 鼠标刚移动过时的采样间隔（秒）
+    "interval": 0.2,  # 在资源管理器中静止时的采样间隔（秒）
+    "idle_interval": 0.5,  # 不在资源管理器中或已触发后的采样间隔（秒）
+    "settle_time": 0.5,  # 最后一次移动后保持快速采样的时间（秒）
+    "index_cell_size": 0,  # 文件项空间索引的网格大小（像素），0表示按文件项平均尺寸
+    "index_max_windows": 8,  # 缓存文件项索引的资源管理器窗口数
+    "folder_cache_ttl": 5.0,  # 资源管理器窗口文件夹路径的缓存时间（秒），窗口标题变化时立即失效
+}
+
+# 悬停预取配置（prefetch）：鼠标停在文件上开始计时时提前准备加密所需资源
+PREFETCH_CONFIG = {
+    "enabled": True,
+    "warm_pool": True,  # 提前创建共享进程池并检测加密后端
+    "public_key": True,  # 提前获取并缓存服务器公钥
+    "qr": True,  # 提前生成并渲染二维码
+    "read_ahead_bytes": 64 * 1024 * 1024,  # 提前读入系统缓存的文件字节数，0表示不预读
+}
+
+# 移动端确认前的文件预扫描配置（prescan）
+PRESCAN_CONFIG = {
+    "enabled": True,
+    "max_bytes": 4 * 1024 * 1024 * 1024,  # 最多预扫描的字节数（IO预算），0表示不限
+    "memory_bytes": 256 * 1024 * 1024,  # 在内存中保留供加密直接使用的数据块总大小（内存预算）
+    "read_rate": 0,  # 预扫描读取速度上限（字节/秒），0表示不限
+    "sample_bytes": 64 * 1024,  # 每个数据块用于估计可压缩率的抽样字节数
+}
+
+# 监控目录自动加密配置（watch_folder）
+WATCH_CONFIG = {
+    "folders": [],  # 要监控的目录
+    "recursive": True,  # 是否监控子目录
+    "settle_time": 2.0,  # 文件大小和修改时间保持不变多少秒后视为写入完成
+    "poll_interval": 1.0,  # 不支持 inotify 时扫描目录的间隔（秒）
+    "queue_size": 1000,  # 等待加密的文件队列长度
+    "workers": 2,  # 同时加密的文件数，加密计算使用共享进程池
+    "ignore_patterns": ["*.enc", "*.tmp", "*.part", "*.crdownload", "~$*", ".*"],  # 不加密的文件名
+    "encrypt_existing": False,  # 启动时是否加密目录中已有的文件
+    "remove_original": False,  # 加密成功后是否删除原文件
+    "user_id": "default_user",
+}
+
+# 预注册会话池配置（session_pool）
+SESSION_POOL_CONFIG = {
+    "size": 2,  # 保持的备用会话数
+    "max_age": 3600,  # 备用会话注册多少秒后丢弃重新注册（服务器端可能已过期）
+    "retry_base_delay": 2,  # 注册失败后的初始重试间隔（秒）
+    "retry_max_delay": 120,  # 最大重试间隔（秒）
+}
\ No newline at end of file
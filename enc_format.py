@@ -0,0 +1,70 @@
+import os
+
+# 加密文件格式（只依赖标准库，不需要加载加密库即可读取）:
+#   IV(16) | 原始大小(8, 大端) | 密文 | 尾部
+# 尾部按加密模式不同:
+#   服务器密钥: 对称密钥密文 | 密文长度(4) | "ENCRYPTED"
+#   会话密钥:   主密钥密文 | 密钥ID(16) | 密文长度(4) | "SESSION_ENCRYPTED"
+#   本地加密:   对称密钥(32) | "LOCAL_ENCRYPTED"
+
+
+def read_encrypted_file_info(encrypted_file_path):
+    """
+    读取加密文件的头部（IV、原始大小）和尾部（密钥密文）
+    返回: 信息字典，mode为"local"表示本地加密文件，"server"表示服务器密钥加密文件，
+          "session"表示会话主密钥派生密钥加密的文件；不是有效的加密文件时返回None
+    """
+    try:
+        with open(encrypted_file_path, 'rb') as in_file:
+            in_file.seek(0, os.SEEK_END)
+            file_size = in_file.tell()
+            if file_size < 24 + 15:
+                raise ValueError("文件长度不足")
+            in_file.seek(file_size - 15)
+            if in_file.read(15) == b"LOCAL_ENCRYPTED":
+                return {"mode": "local"}
+            
+            in_file.seek(0)
+            iv = in_file.read(16)
+            original_size = int.from_bytes(in_file.read(8), byteorder='big')
+            
+            in_file.seek(file_size - 17)
+            if in_file.read(17) == b"SESSION_ENCRYPTED":
+                # 会话加密文件：尾部为 主密钥密文 | 密钥ID(16) | 密文长度(4) | 标记
+                in_file.seek(file_size - 21)
+                key_length = int.from_bytes(in_file.read(4), byteorder='big')
+                encrypted_data_size = file_size - 24 - key_length - 37
+                if key_length <= 0 or encrypted_data_size < 0:
+                    raise ValueError("密钥长度字段无效")
+                in_file.seek(file_size - 37 - key_length)
+                encrypted_key = in_file.read(key_length)
+                key_id = in_file.read(16)
+                return {
+                    "mode": "session",
+                    "iv": iv,
+                    "original_size": original_size,
+                    "encrypted_key": encrypted_key,
+                    "key_id": key_id,
+                    "encrypted_data_size": encrypted_data_size,
+                }
+            
+            in_file.seek(file_size - 9)
+            if in_file.read(9) != b"ENCRYPTED":
+                raise ValueError("文件不是有效的加密文件")
+            in_file.seek(file_size - 13)
+            key_length = int.from_bytes(in_file.read(4), byteorder='big')
+            encrypted_data_size = file_size - 24 - key_length - 13
+            if key_length <= 0 or encrypted_data_size < 0:
+                raise ValueError("密钥长度字段无效")
+            in_file.seek(file_size - 13 - key_length)
+            encrypted_key = in_file.read(key_length)
+        return {
+            "mode": "server",
+            "iv": iv,
+            "original_size": original_size,
+            "encrypted_key": encrypted_key,
+            "encrypted_data_size": encrypted_data_size,
+        }
+    except Exception as e:
+        print(f"读取加密文件信息失败 {encrypted_file_path}: {e}")
+        return None
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+
+try:
+    from config import HOVER_CONFIG
+except ImportError:
+    HOVER_CONFIG = {
+        "index_cell_size": 0,
+        "index_max_windows": 8,
+    }
+
+
+class GridIndex:
+    """
+    文件项矩形的网格空间索引
+    每个矩形登记到其覆盖的所有网格单元中，命中测试只检查鼠标所在单元内的矩形；
+    单元大小默认取文件项的平均尺寸，每个单元通常只包含一到两个文件项
+    """
+
+    def __init__(self, items, cell_size=None):
+        """items: (文件路径, (left, top, right, bottom)) 的可迭代对象，坐标相对于视图窗口"""
+        self.items = []
+        for path, rect in items:
+            left, top, right, bottom = rect
+            if right < left:
+                left, right = right, left
+            if bottom < top:
+                top, bottom = bottom, top
+            self.items.append((path, (left, top, right, bottom)))
+        self.cell_size = int(cell_size or self._default_cell_size())
+        self.cells = {}  # (列, 行) -> 文件项序号列表
+        size = self.cell_size
+        for i, (_, (left, top, right, bottom)) in enumerate(self.items):
+            for cx in range(int(left) // size, int(right) // size + 1):
+                for cy in range(int(top) // size, int(bottom) // size + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def __len__(self):
+        return len(self.items)
+
+    def hit(self, x, y):
+        """返回包含点 (x, y) 的文件路径，没有时返回None"""
+        size = self.cell_size
+        for i in self.cells.get((int(x) // size, int(y) // size), ()):
+            path, (left, top, right, bottom) = self.items[i]
+            if left <= x <= right and top <= y <= bottom:
+                return path
+        return None
+
+    def _default_cell_size(self):
+        if not self.items:
+            return 64
+        width = sum(rect[2] - rect[0] for _, rect in self.items) / len(self.items)
+        height = sum(rect[3] - rect[1] for _, rect in self.items) / len(self.items)
+        return max(int(max(width, height)), 16)
+
+
+class ExplorerItemIndex:
+    """
+    按窗口缓存的资源管理器文件项索引
+    provider 需提供:
+        view_state(hwnd) -> 可比较相等的视图状态（文件夹、视图模式、滚动位置等），窗口不是文件夹视图时返回None；
+                            每次命中测试调用，应只涉及少量COM调用
+        items(hwnd) -> (文件路径, 矩形) 的可迭代对象，只在视图状态变化时调用
+    视图状态变化（切换文件夹、滚动、切换视图模式、窗口大小变化）时重新枚举文件项并重建索引
+    """
+
+    def __init__(self, provider, cell_size=None, max_windows=None):
+        self.provider = provider
+        self.cell_size = cell_size or HOVER_CONFIG.get("index_cell_size", 0) or None
+        self.max_windows = max_windows or HOVER_CONFIG.get("index_max_windows", 8)
+        self._views = OrderedDict()  # hwnd -> (视图状态, GridIndex)，最近使用的在末尾
+        self.builds = 0  # 重建索引次数
+
+    def hit(self, hwnd, x, y):
+        """返回窗口 hwnd 中视图坐标 (x, y) 处的文件路径，没有时返回None"""
+        index = self.index_for(hwnd)
+        return index.hit(x, y) if index is not None else None
+
+    def index_for(self, hwnd):
+        """返回窗口当前视图的索引，视图状态变化时重建，窗口不是文件夹视图时返回None"""
+        state = self.provider.view_state(hwnd)
+        if state is None:
+            self.invalidate(hwnd)
+            return None
+        cached = self._views.get(hwnd)
+        if cached is not None and cached[0] == state:
+            self._views.move_to_end(hwnd)
+            return cached[1]
+        index = GridIndex(self.provider.items(hwnd), self.cell_size)
+        self.builds += 1
+        # 枚举后重新读取视图状态，提供者可能在枚举时更新了状态中使用的探测项
+        state = self.provider.view_state(hwnd) or state
+        self._views[hwnd] = (state, index)
+        self._views.move_to_end(hwnd)
+        while len(self._views) > self.max_windows:
+            self._views.popitem(last=False)
+        return index
+
+    def invalidate(self, hwnd=None):
+        """丢弃某个窗口（hwnd为None时所有窗口）的索引"""
+        if hwnd is None:
+            self._views.clear()
+        else:
+            self._views.pop(hwnd, None)
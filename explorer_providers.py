@@ -0,0 +1,295 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+try:
+    from config import HOVER_CONFIG
+except ImportError:
+    HOVER_CONFIG = {
+        "folder_cache_ttl": 5.0,
+    }
+
+# 每个线程各自的COM/UIA对象，COM对象只能在创建它的线程（套间）中使用
+_thread_handles = threading.local()
+
+
+def thread_shell():
+    """当前线程的 Shell.Application 对象，首次调用时创建（线程须已调用 pythoncom.CoInitialize）"""
+    shell = getattr(_thread_handles, "shell", None)
+    if shell is None:
+        import win32com.client
+        shell = win32com.client.Dispatch("Shell.Application")
+        _thread_handles.shell = shell
+    return shell
+
+
+def thread_uia_desktop():
+    """当前线程的 pywinauto UIA Desktop 对象，首次调用时创建"""
+    desktop = getattr(_thread_handles, "uia_desktop", None)
+    if desktop is None:
+        from pywinauto import Desktop
+        desktop = Desktop(backend="uia")
+        _thread_handles.uia_desktop = desktop
+    return desktop
+
+
+def release_thread_handles():
+    """释放当前线程的COM/UIA对象，应在 pythoncom.CoUninitialize 之前调用"""
+    _thread_handles.__dict__.clear()
+
+
+class FolderPathCache:
+    """
+    窗口句柄 -> 文件夹路径缓存
+    每条记录带有调用方提供的校验值（如窗口标题，资源管理器切换文件夹时标题随之变化），
+    校验值不一致或超过 ttl 秒时视为失效
+    """
+
+    def __init__(self, ttl=None, max_entries=64, clock=time.monotonic):
+        self.ttl = HOVER_CONFIG.get("folder_cache_ttl", 5.0) if ttl is None else ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # hwnd -> (校验值, 路径, 写入时间)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, hwnd, check=None):
+        """返回缓存的路径，不存在或已失效时返回None"""
+        entry = self._entries.get(hwnd)
+        if entry is not None:
+            entry_check, path, stored_at = entry
+            if entry_check == check and self.clock() - stored_at < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(hwnd)
+                return path
+            del self._entries[hwnd]
+        self.misses += 1
+        return None
+
+    def put(self, hwnd, path, check=None):
+        self._entries[hwnd] = (check, path, self.clock())
+        self._entries.move_to_end(hwnd)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, hwnd=None):
+        """丢弃某个窗口（hwnd为None时所有窗口）的缓存"""
+        if hwnd is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(hwnd, None)
+
+
+class StrategyRanker:
+    """
+    文件路径解析策略的排序与计时
+    每个策略可限定适用的窗口类名；对某个窗口类，按历史数据估计的"每次成功的平均耗时"
+    （平均耗时 / 命中率）从低到高依次尝试，第一个返回非空结果的策略即为结果。
+    统计使用指数滑动平均，窗口行为变化后排序会随之调整；没有统计数据的策略按注册顺序优先尝试
+    """
+
+    def __init__(self, decay=0.9, clock=time.perf_counter):
+        self.decay = decay
+        self.clock = clock
+        self.strategies = []  # (名称, 函数, 适用的窗口类名集合或None)
+        self._stats = {}  # (窗口类名, 策略名称) -> [尝试次数, 平均耗时, 命中率]
+
+    def register(self, name, func, window_classes=None):
+        """注册策略 func(*args) -> 结果或None，window_classes 为None时适用于所有窗口类"""
+        self.strategies.append((name, func, set(window_classes) if window_classes else None))
+
+    def order(self, window_class):
+        """该窗口类适用的策略名称，按尝试顺序排列"""
+        candidates = []
+        for position, (name, func, classes) in enumerate(self.strategies):
+            if classes is not None and window_class not in classes:
+                continue
+            stats = self._stats.get((window_class, name))
+            if stats is None:
+                candidates.append((0, 0.0, position, name, func))
+            else:
+                _, avg_time, hit_rate = stats
+                candidates.append((1, avg_time / max(hit_rate, 0.01), position, name, func))
+        candidates.sort(key=lambda c: c[:3])
+        return [(name, func) for _, _, _, name, func in candidates]
+
+    def resolve(self, window_class, *args):
+        """按排序依次尝试策略，返回第一个非空结果，全部失败时返回None"""
+        for name, func in self.order(window_class):
+            start = self.clock()
+            try:
+                result = func(*args)
+            except Exception as e:
+                print(f"解析策略 {name} 出错: {str(e)}")
+                result = None
+            self._record(window_class, name, self.clock() - start, result is not None)
+            if result is not None:
+                return result
+        return None
+
+    def stats(self):
+        """各窗口类、各策略的统计: {(窗口类名, 策略名称): {"attempts", "avg_time", "hit_rate"}}"""
+        return {key: {"attempts": attempts, "avg_time": avg_time, "hit_rate": hit_rate}
+                for key, (attempts, avg_time, hit_rate) in self._stats.items()}
+
+    def _record(self, window_class, name, elapsed, hit):
+        stats = self._stats.get((window_class, name))
+        if stats is None:
+            self._stats[(window_class, name)] = [1, elapsed, 1.0 if hit else 0.0]
+            return
+        stats[0] += 1
+        stats[1] = self.decay * stats[1] + (1 - self.decay) * elapsed
+        stats[2] = self.decay * stats[2] + (1 - self.decay) * (1.0 if hit else 0.0)
+
+
+class ShellWindowProvider:
+    """
+    通过 Shell.Application 读取资源管理器窗口的文件项（仅Windows）
+    使用当前线程的 Shell.Application 对象（thread_shell），应在创建它的线程中使用
+    """
+
+    def __init__(self):
+        self.shell = thread_shell()
+        self._windows = {}  # hwnd -> Shell窗口对象
+
+    def find_window(self, hwnd):
+        """查找与 hwnd 对应的Shell窗口，结果按hwnd缓存"""
+        window = self._windows.get(hwnd)
+        if window is not None:
+            try:
+                if window.HWND == hwnd:
+                    return window
+            except Exception:
+                pass
+            del self._windows[hwnd]
+        for window in self.shell.Windows():
+            try:
+                if window.HWND == hwnd:
+                    self._windows[hwnd] = window
+                    return window
+            except Exception:
+                continue
+        return None
+
+    def folder_path(self, hwnd):
+        """窗口当前显示的文件夹路径"""
+        window = self.find_window(hwnd)
+        if window is None:
+            return None
+        try:
+            return window.Document.Folder.Self.Path
+        except Exception:
+            return None
+
+    def view_state(self, hwnd):
+        """
+        视图状态：文件夹路径、视图模式、图标大小、文件项数量、第一个文件项的位置（反映滚动）和窗口大小
+        """
+        window = self.find_window(hwnd)
+        if window is None:
+            return None
+        try:
+            import win32gui
+            document = window.Document
+            items = document.Items()
+            count = items.Count
+            first_rect = tuple(items.Item(0).GetRect()) if count else None
+            left, top, right, bottom = win32gui.GetWindowRect(hwnd)
+            return (document.Folder.Self.Path, document.CurrentViewMode, getattr(document, "IconSize", None),
+                    count, first_rect, (right - left, bottom - top))
+        except Exception as e:
+            print(f"读取资源管理器视图状态失败: {str(e)}")
+            self._windows.pop(hwnd, None)
+            return None
+
+    def items(self, hwnd):
+        """枚举窗口中所有文件项的路径和矩形"""
+        window = self.find_window(hwnd)
+        if window is None:
+            return []
+        result = []
+        items = window.Document.Items()
+        for i in range(items.Count):
+            try:
+                item = items.Item(i)
+                if item.IsFolder:
+                    continue
+                result.append((item.Path, tuple(item.GetRect())))
+            except Exception:
+                continue
+        return result
+
+
+class DesktopFolderProvider:
+    """
+    桌面文件项提供者（仅Windows），配合 ExplorerItemIndex 使用，矩形为屏幕坐标
+    视图状态为桌面目录的修改时间（增删、重命名文件时变化）和上次枚举的一个文件项的位置
+    （重新排列图标时变化），两者都不变时命中测试不访问文件系统，只需一次COM调用
+    """
+
+    VIEW_KEY = "desktop"  # 在 ExplorerItemIndex 中代替窗口句柄
+
+    def __init__(self, desktop_path):
+        self.desktop_path = desktop_path
+        self._folder = None
+        self._probe = None  # 上次枚举的第一个文件名
+
+    def folder(self):
+        if self._folder is None:
+            self._folder = thread_shell().NameSpace(self.desktop_path)
+        return self._folder
+
+    def item_rect(self, name):
+        """文件项在桌面上的矩形，获取失败时返回None"""
+        try:
+            item = self.folder().ParseName(name)
+            rect = item.GetRect() if item else None
+            return tuple(rect) if rect else None
+        except Exception:
+            return None
+
+    def view_state(self, hwnd):
+        try:
+            mtime = os.stat(self.desktop_path).st_mtime_ns
+        except OSError:
+            return None
+        return mtime, self.item_rect(self._probe) if self._probe else None
+
+    def items(self, hwnd):
+        result = []
+        with os.scandir(self.desktop_path) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                rect = self.item_rect(entry.name)
+                if rect:
+                    result.append((entry.path, rect))
+        self._probe = os.path.basename(result[0][0]) if result else None
+        print(f"已重建桌面文件索引: {len(result)} 个文件")
+        return result
+
+
+class StaticItemProvider:
+    """
+    内存中的文件项提供者，用于在非Windows平台上测试和基准测试 ExplorerItemIndex
+    views: hwnd -> {"folder": 路径, "mode": 视图模式, "scroll": (dx, dy), "items": [(文件名, 矩形)]}；
+    修改 views 后索引会在下一次命中测试时按新的视图状态重建
+    """
+
+    def __init__(self, views=None):
+        self.views = views if views is not None else {}
+        self.enumerations = 0  # items 被调用的次数
+
+    def view_state(self, hwnd):
+        view = self.views.get(hwnd)
+        if view is None:
+            return None
+        return view.get("folder"), view.get("mode"), tuple(view.get("scroll", (0, 0))), len(view.get("items", ()))
+
+    def items(self, hwnd):
+        self.enumerations += 1
+        view = self.views[hwnd]
+        dx, dy = view.get("scroll", (0, 0))
+        return [(os.path.join(view.get("folder", ""), name), (left - dx, top - dy, right - dx, bottom - dy))
+                for name, (left, top, right, bottom) in view.get("items", ())]
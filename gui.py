@@ -17,7 +17,7 @@ import pythoncom
 
 # 导入配置文件
 try:
-    from config import SERVER_CONFIG
+    from config import SERVER_CONFIG, UI_CONFIG
 except ImportError:
     # 如果配置文件不存在，使用默认配置
     SERVER_CONFIG = {
@@ -28,6 +28,23 @@ except ImportError:
         },
         "timeout": 5,
     }
+    UI_CONFIG = {
+        "qr_size": (300, 300),
+        "max_concurrent_jobs": 2,
+        "job_history": 20,
+        "progress_refresh_ms": 200,
+    }
+
+from rpc_channel import set_rpc_channel, call_server_rpc
+from job_manager import JobManager, JOB_KIND_NAMES, JOB_RUNNING
+from progress_reporter import format_speed, format_eta
+from hover_core import HoverLoop
+from prefetch import Prefetcher
+from session_pool import SessionPool
+from notification_outbox import get_notification_outbox
+from explorer_index import ExplorerItemIndex
+from explorer_providers import (ShellWindowProvider, DesktopFolderProvider, FolderPathCache, StrategyRanker,
+                                thread_shell, thread_uia_desktop, release_thread_handles)
 
 # 导入WebSocket管理器
 try:
@@ -78,43 +95,96 @@ def load_session_id():
         print(f"加载session_id失败: {e}")
     return None
 
+# --- 二维码渲染 ---
+def render_qr_image(payload, box_size=10):
+    """
+    将二维码内容渲染为QImage，不经过磁盘
+    QImage可在工作线程中创建，转换为QPixmap须在GUI线程中进行
+    """
+    matrix = main.make_qr_matrix(payload)
+    size = len(matrix)
+    bytes_per_line = (size + 3) & ~3  # QImage要求每行按4字节对齐
+    pixels = bytearray(b"\xff" * (bytes_per_line * size))
+    for y, row in enumerate(matrix):
+        offset = y * bytes_per_line
+        for x, dark in enumerate(row):
+            if dark:
+                pixels[offset + x] = 0
+    image = QtGui.QImage(bytes(pixels), size, size, bytes_per_line, QtGui.QImage.Format_Grayscale8).copy()
+    return image.scaled(size * box_size, size * box_size, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+
+class QRRenderThread(QThread):
+    """在工作线程中生成二维码内容并渲染，避免阻塞界面"""
+    qr_rendered = pyqtSignal(str, object)  # 二维码内容, QImage
+    qr_failed = pyqtSignal(str)
+
+    def __init__(self, file_path, session_id):
+        super().__init__()
+        self.file_path = file_path
+        self.session_id = session_id
+
+    def run(self):
+        try:
+            payload = main.build_qr_payload(self.file_path, self.session_id)
+            self.qr_rendered.emit(payload, render_qr_image(payload))
+        except Exception as e:
+            print(f"生成二维码失败: {str(e)}")
+            self.qr_failed.emit(str(e))
+
+class ServerCheckThread(QThread):
+    """在工作线程中检查HTTP服务器连接，结果通过信号返回，服务器缓慢或不可用时不阻塞界面"""
+    server_checked = pyqtSignal(bool, str)  # 是否可用, 说明信息
+
+    def run(self):
+        connected, message = main.check_server_health()
+        self.server_checked.emit(connected, message)
+
 # --- 工作线程类 ---
 class EncryptionThread(QThread):
     # 定义信号
     encryption_done = pyqtSignal(str)  # 加密完成信号
     encryption_failed = pyqtSignal(str)  # 加密失败信号
-    qr_generated = pyqtSignal(str)     # 二维码生成完成信号
+    qr_generated = pyqtSignal(object)  # 二维码生成完成信号，传递QImage
     encryption_progress = pyqtSignal(int)  # 加密进度信号
+    encryption_stats = pyqtSignal(object)  # 加密进度统计信号（速度、剩余时间）
     encryption_status = pyqtSignal(str)  # 加密状态信号
     
-    def __init__(self, file_path, acceleration_method=None, thread_count=None, password=None, session_id=None):
+    def __init__(self, file_path, acceleration_method=None, thread_count=None, password=None, session_id=None,
+                 qr_ready=False, cancel_token=None):
         super().__init__()
         self.file_path = file_path
         self.acceleration_method = acceleration_method
         self.thread_count = thread_count
         self.password = password
         self.session_id = session_id
+        self.qr_ready = qr_ready  # 悬停弹窗已生成并显示二维码时不再重复生成
+        self.cancel_token = cancel_token
+    
+    def is_cancelled(self):
+        """是否已请求取消，已取消时发送失败信号"""
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            self.encryption_status.emit("加密已取消")
+            self.encryption_failed.emit("已取消")
+            return True
+        return False
         
     def run(self):
         try:
-            # 发送状态更新
-            self.encryption_status.emit("正在生成二维码...")
-            
             # 生成二维码 - 使用已保存的session_id
             try:
-                if self.session_id:
-                    qr_path = main.generate_qr_code(self.file_path, self.session_id)
-                else:
-                    qr_path = main.generate_qr_code(self.file_path, "unknown-session")
-                
-                # 发送二维码路径信号
-                self.qr_generated.emit(qr_path)
+                if not self.qr_ready:
+                    self.encryption_status.emit("正在生成二维码...")
+                    payload = main.build_qr_payload(self.file_path, self.session_id or "unknown-session")
+                    self.qr_generated.emit(render_qr_image(payload))
             except Exception as e:
                 print(f"生成二维码失败: {str(e)}")
                 self.encryption_status.emit(f"生成二维码失败: {str(e)}")
                 self.encryption_failed.emit(f"生成二维码失败: {str(e)}")
                 return
             
+            if self.is_cancelled():
+                return
+            
             # 发送状态更新
             self.encryption_status.emit("正在连接服务器...")
             
@@ -134,6 +204,9 @@ class EncryptionThread(QThread):
                 self.encrypt_locally()
                 return
             
+            if self.is_cancelled():
+                return
+            
             # 发送状态更新
             self.encryption_status.emit("正在加密文件...")
             
@@ -150,12 +223,17 @@ class EncryptionThread(QThread):
                     self.file_path, 
                     user_id="default_user",  # 添加缺失的user_id参数
                     progress_callback=progress_callback,
+                    stats_callback=self.encryption_stats.emit,
                     acceleration_method=self.acceleration_method,
                     thread_count=self.thread_count,
-                    password=self.password  # 传递密码
+                    password=self.password,  # 传递密码
+                    pool=main.get_shared_pool(self.thread_count),  # 所有任务共用一个进程池
+                    cancel_token=self.cancel_token
                 )
                 
                 # 检查加密结果
+                if not encrypted_file_path and self.is_cancelled():
+                    return
                 if encrypted_file_path:
                     # 加密成功，发送成功信号
                     self.encryption_done.emit(encrypted_file_path)
@@ -179,6 +257,8 @@ class EncryptionThread(QThread):
     def encrypt_locally(self):
         """本地加密模式，不依赖服务器"""
         try:
+            if self.is_cancelled():
+                return
             self.encryption_status.emit("正在使用本地加密模式...")
             
             # 定义进度回调函数
@@ -225,12 +305,14 @@ class DecryptionThread(QThread):
     decryption_done = pyqtSignal(str)  # 解密完成信号
     decryption_failed = pyqtSignal(str)  # 解密失败信号
     decryption_progress = pyqtSignal(int)  # 解密进度信号
+    decryption_stats = pyqtSignal(object)  # 解密进度统计信号（速度、剩余时间）
     decryption_status = pyqtSignal(str)  # 解密状态信号
     
-    def __init__(self, file_path, rsa_private_key=None):
+    def __init__(self, file_path, rsa_private_key=None, cancel_token=None):
         super().__init__()
         self.file_path = file_path
         self.rsa_private_key = rsa_private_key
+        self.cancel_token = cancel_token
         
     def run(self):
         try:
@@ -249,11 +331,16 @@ class DecryptionThread(QThread):
                 decrypted_file_path = main.aes_decrypt_file(
                     self.file_path,
                     user_id="default_user",  # 添加缺失的user_id参数
-                    progress_callback=progress_callback
+                    progress_callback=progress_callback,
+                    stats_callback=self.decryption_stats.emit,
+                    cancel_token=self.cancel_token
                 )
                 
                 # 检查解密结果
-                if decrypted_file_path:
+                if not decrypted_file_path and self.cancel_token is not None and self.cancel_token.cancelled:
+                    self.decryption_status.emit("解密已取消")
+                    self.decryption_failed.emit("已取消")
+                elif decrypted_file_path:
                     # 解密成功，发送成功信号
                     self.decryption_done.emit(decrypted_file_path)
                 else:
@@ -359,8 +446,11 @@ class SettingsDialog(QtWidgets.QDialog):
 
 # --- 二维码弹出窗口类 ---
 class QRCodePopupWindow(QtWidgets.QDialog):
-    def __init__(self, qr_path=None, file_path=None, operation_type="加密", parent=None):
+    cancel_requested = pyqtSignal(str)  # 请求取消该文件的任务，传递文件路径
+    
+    def __init__(self, qr_image=None, file_path=None, operation_type="加密", parent=None):
         super().__init__(parent)
+        self.file_path = file_path
         
         # 设置窗口属性
         self.setWindowTitle("二维码")
@@ -398,9 +488,9 @@ class QRCodePopupWindow(QtWidgets.QDialog):
         self.qr_label.setAlignment(Qt.AlignCenter)
         self.qr_label.setMinimumSize(200, 200)  # 设置最小尺寸以适应整个框
         
-        # 如果传入了二维码路径，显示二维码
-        if qr_path and os.path.exists(qr_path):
-            self.set_qr_code(qr_path)
+        # 如果传入了二维码图像，显示二维码
+        if qr_image is not None:
+            self.set_qr_code(qr_image)
         else:
             self.qr_label.setText("等待生成二维码...")
             
@@ -421,13 +511,18 @@ class QRCodePopupWindow(QtWidgets.QDialog):
         self.status_label.setStyleSheet("font-size: 12px; color: #666666;")
         layout.addWidget(self.status_label)
         
+        # 添加取消按钮
+        self.cancel_button = QtWidgets.QPushButton("取消")
+        self.cancel_button.clicked.connect(self.on_cancel_clicked)
+        layout.addWidget(self.cancel_button)
+        
         # 设置初始大小
         self.resize(250, 380)  # 增加高度以适应文件信息标签
         
-    def set_qr_code(self, qr_path):
-        """设置二维码图像"""
+    def set_qr_code(self, qr_image):
+        """设置二维码图像（QImage）"""
         try:
-            qr_pixmap = QtGui.QPixmap(qr_path)
+            qr_pixmap = QtGui.QPixmap.fromImage(qr_image)
             self.qr_label.setPixmap(qr_pixmap.scaled(
                 250, 250,  # 将二维码尺寸改大到250x250
                 Qt.KeepAspectRatio,
@@ -462,6 +557,13 @@ class QRCodePopupWindow(QtWidgets.QDialog):
         except Exception as e:
             print(f"更新状态标签出错: {str(e)}")
     
+    def on_cancel_clicked(self):
+        """点击取消按钮"""
+        if self.file_path:
+            self.cancel_requested.emit(self.file_path)
+        self.cancel_button.setEnabled(False)
+        self.update_status("正在取消...")
+    
     def show_at_cursor(self, x, y):
         """在指定坐标显示窗口"""
         try:
@@ -477,14 +579,28 @@ class MouseMonitorThread(QThread):
     # 定义信号
     file_detected = pyqtSignal(str)  # 检测到有效文件信号
     show_qr_popup = pyqtSignal(str, int, int)  # 显示二维码弹窗信号，传递文件路径和鼠标坐标
+    hover_candidate = pyqtSignal(str)  # 开始在某个文件上悬停计时
+    hover_candidate_lost = pyqtSignal(str)  # 未达到阈值就离开了该文件
 
     def __init__(self, parent=None):
         super().__init__(parent)
         self.running = True
-        self.hover_start_time = 0
-        self.current_file = None
-        self.hover_threshold = 3.0  # 悬停阈值，单位为秒
-        self.qr_popup_shown = False  # 标记是否已显示二维码弹窗
+        # 资源管理器文件项提供者和索引，COM对象须在本线程中创建（见 shell_provider）
+        self.item_provider = None
+        self.item_index = None
+        self.desktop_provider = None  # 桌面文件项提供者和索引，同样在本线程中创建
+        self.desktop_index = None
+        self.desktop_path = None
+        self.folder_paths = FolderPathCache()  # 顶层窗口 -> 文件夹路径
+        # 文件路径解析方法，按窗口类的历史命中率和耗时排序尝试
+        self.resolvers = StrategyRanker()
+        self.resolvers.register("shell_index", self.resolve_by_shell_index, ["DirectUIHWND"])
+        self.resolvers.register("title", self.resolve_by_title, ["SysTreeView32", "SysListView32"])
+        self.resolvers.register("uia", self.resolve_by_uia)
+        # 悬停计时、去抖和冷却由 hover_core 处理，本线程只提供Windows下的鼠标、窗口和文件查询
+        self.hover_loop = HoverLoop(self, self.on_hover_trigger,
+                                    on_candidate=self.hover_candidate.emit,
+                                    on_candidate_lost=self.hover_candidate_lost.emit)
 
     def run(self):
         # 初始化COM环境 - 必须在线程开始时初始化
@@ -493,67 +609,53 @@ class MouseMonitorThread(QThread):
         try:
             while self.running:
                 try:
-                    # 获取当前鼠标位置
-                    flags, hcursor, (x, y) = win32gui.GetCursorInfo()
-
-                    # 获取鼠标下方窗口句柄
-                    hwnd = win32gui.WindowFromPoint((x, y))
-
-                    # 检查窗口是否为文件资源管理器 - 更严格的检查
-                    if self.is_file_explorer(hwnd):
-                        print(f"鼠标在文件资源管理器中，坐标 ({x}, {y})")
-
-                        # 获取鼠标所指向的文件路径
-                        file_path = self.get_file_under_cursor(hwnd, x, y)
-
-                        # 如果找到了文件路径且与当前记录的不同
-                        if file_path and os.path.isfile(file_path):
-                            if self.current_file != file_path:
-                                # 新文件，重置计时器
-                                print(f"检测到新文件: {file_path}, 开始计时")
-                                self.current_file = file_path
-                                self.hover_start_time = time.time()
-                                self.qr_popup_shown = False
-                            elif time.time() - self.hover_start_time >= self.hover_threshold and not self.qr_popup_shown:
-                                # 在同一文件上悬停超过阈值时间，且尚未显示二维码弹窗
-                                print(f"文件悬停时间超过阈值: {file_path}, 触发加密/解密")
-                                # 先发送显示二维码弹窗的信号
-                                self.show_qr_popup.emit(file_path, x, y)
-                                self.qr_popup_shown = True
-                                # 然后发送文件检测信号，触发加密/解密
-                                self.file_detected.emit(file_path)
-                                # 重置计时器，避免重复触发
-                                self.hover_start_time = time.time() + 10  # 添加一个冷却期
-                            else:
-                                # 打印当前悬停时间（调试信息）
-                                remaining = self.hover_threshold - (time.time() - self.hover_start_time)
-                                if remaining > 0 and remaining % 1 < 0.1:  # 每秒打印一次
-                                    print(f"悬停中: {file_path}, 还需 {remaining:.1f} 秒")
-                        else:
-                            if file_path:
-                                print(f"获取到路径，但不是有效文件: {file_path}")
-                            # 没有文件或不是有效文件，重置
-                            if self.current_file is not None:
-                                print(f"文件路径不再有效，重置计时: {self.current_file}")
-                                self.current_file = None
-                                self.qr_popup_shown = False
-                    else:
-                        # 不在文件资源管理器中，重置
-                        if self.current_file is not None:
-                            print("不在文件资源管理器中，重置计时")
-                            self.current_file = None
-                            self.qr_popup_shown = False
-
-                    # 短暂休眠，避免CPU占用过高
-                    time.sleep(0.1)
-
+                    # 采样间隔由状态机决定：移动中快速采样，静止或不在资源管理器中时低频采样
+                    delay = self.hover_loop.step()
                 except Exception as e:
                     print(f"鼠标监控错误: {str(e)}")
-                    time.sleep(1)  # 发生错误时稍微休眠长一点
+                    delay = 1  # 发生错误时稍微休眠长一点
+                time.sleep(delay)
         finally:
-            # 确保在线程退出时释放COM环境
+            # 确保在线程退出时释放COM环境，先释放本线程创建的COM/UIA对象
+            self.item_provider = None
+            self.item_index = None
+            self.desktop_provider = None
+            self.desktop_index = None
+            release_thread_handles()
             pythoncom.CoUninitialize()
 
+    def on_hover_trigger(self, trigger):
+        """在同一文件上悬停超过阈值"""
+        print(f"文件悬停时间超过阈值: {trigger.file_path}, 触发加密/解密")
+        # 先发送显示二维码弹窗的信号
+        self.show_qr_popup.emit(trigger.file_path, trigger.x, trigger.y)
+        # 然后发送文件检测信号，触发加密/解密
+        self.file_detected.emit(trigger.file_path)
+
+    # 以下为 hover_core.HoverLoop 使用的事件源接口
+
+    def cursor_position(self):
+        """当前鼠标位置"""
+        flags, hcursor, (x, y) = win32gui.GetCursorInfo()
+        return x, y
+
+    def window_at(self, x, y):
+        """鼠标下方窗口句柄"""
+        return win32gui.WindowFromPoint((x, y))
+
+    def is_explorer(self, hwnd):
+        """窗口是否为文件资源管理器或桌面（只在窗口变化时调用）"""
+        return self.is_file_explorer(hwnd)
+
+    def file_at(self, hwnd, x, y):
+        """鼠标所指向的有效文件路径（只在鼠标移动或窗口变化后调用）"""
+        file_path = self.get_file_under_cursor(hwnd, x, y)
+        if file_path and os.path.isfile(file_path):
+            return file_path
+        if file_path:
+            print(f"获取到路径，但不是有效文件: {file_path}")
+        return None
+
     def stop(self):
         """停止线程运行"""
         self.running = False
@@ -596,209 +698,150 @@ class MouseMonitorThread(QThread):
             if class_name in ['Progman', 'WorkerW']:
                 return self.get_desktop_file_under_cursor(x, y)
 
-            # 方法A：如果是 DirectUIHWND 类型，先尝试 Shell32 方法
-            if class_name == 'DirectUIHWND':
-                try:
-                    import win32com.client
-                    shell = win32com.client.Dispatch("Shell.Application")
-                    for window in shell.Windows():
-                        if window.HWND == hwnd:
-                            folder_path = window.Document.Folder.Self.Path
-                            print(f"Shell32获取到文件夹路径: {folder_path}")
-                            rect = win32gui.GetWindowRect(hwnd)
-                            rel_x = x - rect[0]
-                            rel_y = y - rect[1]
-                            items = window.Document.Items()
-                            for i in range(items.Count):
-                                item = items.Item(i)
-                                item_rect = item.GetRect()  # (left, top, right, bottom)
-                                if self.is_point_in_rect((rel_x, rel_y), item_rect):
-                                    file_path = item.Path
-                                    if os.path.exists(file_path) and os.path.isfile(file_path):
-                                        print(f"Shell32方法获取鼠标位置文件绝对路径: {file_path}")
-                                        return file_path
-                except Exception as e:
-                    print(f"Shell32方法错误: {str(e)}")
+            # 按该窗口类的历史命中率和耗时，从最划算的方法开始尝试
+            return self.resolvers.resolve(class_name, cursor_hwnd, x, y)
 
-            # 方法B：对于 SysTreeView32 或 SysListView32 类型，尝试通过窗口标题拼接
-            if class_name in ['SysTreeView32', 'SysListView32']:
-                try:
-                    explorer_path = self.get_explorer_path(hwnd)
-                    print(f"探测到的资源管理器路径: {explorer_path}")
-                    title = win32gui.GetWindowText(cursor_hwnd)
-                    if title and not title.startswith("地址:") and not title.startswith("Address:"):
-                        full_path = os.path.join(explorer_path, title) if explorer_path else title
-                        if os.path.exists(full_path) and os.path.isfile(full_path):
-                            print(f"标题栏方法获取鼠标位置文件绝对路径: {full_path}")
-                            return full_path
-                except Exception as e:
-                    print(f"标题栏解析错误: {str(e)}")
+        except Exception as e:
+            print(f"获取文件路径全局错误: {str(e)}")
+            return None
 
-            # 方法C：使用 pywinauto 获取鼠标下控件信息，再进行绝对路径拼接
-            try:
-                from pywinauto import Desktop
-                # 注意：from_point 分别传入 x 和 y 两个参数
-                element = Desktop(backend="uia").from_point(x, y)
-                if element:
-                    element_name = element.element_info.name  # 通常仅返回文件名，如 "数据结构.docx"
-                    print(f"pywinauto 获取到元素名称: {element_name}")
-                    # 如果获取到的是绝对路径，直接返回
-                    if os.path.isabs(element_name) and os.path.exists(element_name) and os.path.isfile(element_name):
-                        print(f"pywinauto方法直接获取到绝对路径: {element_name}")
-                        return element_name
-                    # 否则，尝试获取当前 Explorer 的目录，并拼接成完整绝对路径
-                    explorer_path = self.get_explorer_path(hwnd)
-                    if explorer_path:
-                        candidate = os.path.join(explorer_path, element_name)
-                        # 如果拼接后存在该文件，则返回
-                        if os.path.exists(candidate) and os.path.isfile(candidate):
-                            print(f"pywinauto方法返回绝对路径: {candidate}")
-                            return candidate
-                else:
-                    print("pywinauto未能获取到有效的控件")
-            except Exception as e:
-                print(f"pywinauto方法错误: {str(e)}")
+    def shell_provider(self):
+        """本线程的 Shell 文件项提供者"""
+        if self.item_provider is None:
+            self.item_provider = ShellWindowProvider()
+            self.item_index = ExplorerItemIndex(self.item_provider)
+        return self.item_provider
+
+    def resolve_by_shell_index(self, hwnd, x, y):
+        """方法A：DirectUIHWND 类型，通过 Shell32 文件项矩形命中测试"""
+        # 文件项矩形按窗口缓存在空间索引中，只在切换文件夹、滚动或切换视图时重新枚举
+        self.shell_provider()
+        top_hwnd = win32gui.GetAncestor(hwnd, 2)  # GA_ROOT，Shell窗口对应顶层窗口
+        rect = win32gui.GetWindowRect(hwnd)
+        file_path = self.item_index.hit(top_hwnd, x - rect[0], y - rect[1])
+        if file_path and os.path.isfile(file_path):
+            print(f"Shell32方法获取鼠标位置文件绝对路径: {file_path}")
+            return file_path
+        return None
 
-            return None
+    def resolve_by_title(self, hwnd, x, y):
+        """方法B：SysTreeView32 或 SysListView32 类型，通过窗口标题拼接"""
+        title = win32gui.GetWindowText(hwnd)
+        if title and not title.startswith("地址:") and not title.startswith("Address:"):
+            explorer_path = self.get_explorer_path(hwnd)
+            full_path = os.path.join(explorer_path, title) if explorer_path else title
+            if os.path.exists(full_path) and os.path.isfile(full_path):
+                print(f"标题栏方法获取鼠标位置文件绝对路径: {full_path}")
+                return full_path
+        return None
 
-        except Exception as e:
-            print(f"获取文件路径全局错误: {str(e)}")
+    def resolve_by_uia(self, hwnd, x, y):
+        """方法C：使用 pywinauto 获取鼠标下控件信息，再进行绝对路径拼接"""
+        # 注意：from_point 分别传入 x 和 y 两个参数
+        element = thread_uia_desktop().from_point(x, y)
+        if not element:
+            print("pywinauto未能获取到有效的控件")
             return None
+        element_name = element.element_info.name  # 通常仅返回文件名，如 "数据结构.docx"
+        if not element_name:
+            return None
+        # 如果获取到的是绝对路径，直接返回
+        if os.path.isabs(element_name) and os.path.exists(element_name) and os.path.isfile(element_name):
+            print(f"pywinauto方法直接获取到绝对路径: {element_name}")
+            return element_name
+        # 否则，尝试获取当前 Explorer 的目录，并拼接成完整绝对路径
+        explorer_path = self.get_explorer_path(hwnd)
+        if explorer_path:
+            candidate = os.path.join(explorer_path, element_name)
+            # 如果拼接后存在该文件，则返回
+            if os.path.exists(candidate) and os.path.isfile(candidate):
+                print(f"pywinauto方法返回绝对路径: {candidate}")
+                return candidate
+        return None
 
     def get_desktop_file_under_cursor(self, x, y):
-        """获取桌面上的文件路径"""
+        """
+        获取桌面上的文件路径
+        先在缓存的桌面文件项索引中命中测试（不调用UIA），索引未命中时才用 pywinauto 查询鼠标下的元素
+        """
         try:
-            # 获取桌面路径
-            desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-            if not os.path.exists(desktop_path):
-                # 尝试其他可能的桌面路径
-                desktop_path = os.path.join(os.environ.get("USERPROFILE", ""), "Desktop")
-            
-            if not os.path.exists(desktop_path):
+            desktop_path = self.get_desktop_path()
+            if not desktop_path:
                 print("无法找到桌面路径")
                 return None
-            
-            # 使用 pywinauto 获取桌面上的元素
-            try:
-                from pywinauto import Desktop
-                element = Desktop(backend="uia").from_point(x, y)
-                if element:
-                    element_name = element.element_info.name
-                    element_class = element.element_info.class_name
-                    print(f"桌面元素名称: {element_name}, 类名: {element_class}")
-                    
-                    # 过滤掉系统UI元素
-                    system_elements = [
-                        "NVIDIA GeForce Overlay", "NVIDIA GeForce Experience",
-                        "Windows Security", "Windows Defender",
-                        "System Tray", "Taskbar", "Start Menu",
-                        "Desktop", "Recycle Bin", "This PC",
-                        "Network", "Control Panel", "Settings"
-                    ]
-                    
-                    if element_name in system_elements:
-                        print(f"跳过系统元素: {element_name}")
-                        return None
-                    
-                    # 检查是否为文件
-                    if element_name and not element_name.startswith("地址:") and not element_name.startswith("Address:"):
-                        # 尝试拼接桌面路径
-                        candidate = os.path.join(desktop_path, element_name)
-                        if os.path.exists(candidate) and os.path.isfile(candidate):
-                            print(f"桌面文件路径: {candidate}")
-                            return candidate
-                        
-                        # 如果直接是绝对路径
-                        if os.path.isabs(element_name) and os.path.exists(element_name) and os.path.isfile(element_name):
-                            print(f"桌面绝对路径: {element_name}")
-                            return element_name
-                        
-                        # 尝试获取父元素，可能是桌面图标容器
-                        try:
-                            parent = element.parent()
-                            if parent:
-                                parent_name = parent.element_info.name
-                                print(f"父元素名称: {parent_name}")
-                                
-                                # 如果父元素是桌面，尝试直接拼接文件名
-                                if "Desktop" in parent_name or "桌面" in parent_name:
-                                    candidate = os.path.join(desktop_path, element_name)
-                                    if os.path.exists(candidate) and os.path.isfile(candidate):
-                                        print(f"通过父元素检测到桌面文件: {candidate}")
-                                        return candidate
-                        except Exception as e:
-                            print(f"获取父元素失败: {str(e)}")
-                            
-            except Exception as e:
-                print(f"桌面文件检测错误: {str(e)}")
-            
-            # 备用方法：直接扫描桌面文件
-            return self.scan_desktop_files(x, y, desktop_path)
-            
+
+            file_path = self.scan_desktop_files(x, y, desktop_path)
+            if file_path:
+                return file_path
+
+            # 备用方法：索引未命中（如图标位置刚变化、桌面目录之外的快捷项）时使用 pywinauto 获取桌面上的元素
+            return self.desktop_file_by_uia(x, y, desktop_path)
+
         except Exception as e:
             print(f"获取桌面文件路径错误: {str(e)}")
             return None
 
+    def get_desktop_path(self):
+        """桌面目录路径，找到后缓存，之后的悬停不再检查"""
+        if self.desktop_path is None:
+            for desktop_path in (os.path.join(os.path.expanduser("~"), "Desktop"),
+                                 # 尝试其他可能的桌面路径
+                                 os.path.join(os.environ.get("USERPROFILE", ""), "Desktop")):
+                if os.path.exists(desktop_path):
+                    self.desktop_path = desktop_path
+                    break
+        return self.desktop_path
+
     def scan_desktop_files(self, x, y, desktop_path):
-        """扫描桌面文件，通过坐标匹配"""
+        """通过坐标匹配桌面文件，桌面文件项的矩形缓存在空间索引中，桌面目录变化时才重新扫描"""
         try:
-            # 获取桌面窗口句柄
-            desktop_hwnd = win32gui.FindWindow("Progman", None)
-            if not desktop_hwnd:
-                desktop_hwnd = win32gui.FindWindow("WorkerW", None)
-            
-            if not desktop_hwnd:
-                print("无法找到桌面窗口")
-                return None
-            
-            # 获取桌面窗口矩形
-            desktop_rect = win32gui.GetWindowRect(desktop_hwnd)
-            print(f"桌面窗口矩形: {desktop_rect}")
-            
-            # 获取桌面上的所有文件
-            desktop_files = []
-            try:
-                for item in os.listdir(desktop_path):
-                    item_path = os.path.join(desktop_path, item)
-                    if os.path.isfile(item_path):
-                        desktop_files.append(item_path)
-            except Exception as e:
-                print(f"扫描桌面文件失败: {str(e)}")
-                return None
-            
-            print(f"桌面文件列表: {desktop_files}")
-            
-            # 使用Shell32获取文件位置信息
-            try:
-                import win32com.client
-                shell = win32com.client.Dispatch("Shell.Application")
-                desktop_folder = shell.NameSpace(desktop_path)
-                
-                for file_path in desktop_files:
-                    try:
-                        file_name = os.path.basename(file_path)
-                        file_item = desktop_folder.ParseName(file_name)
-                        if file_item:
-                            # 获取文件在桌面上的位置
-                            file_rect = file_item.GetRect()
-                            if file_rect:
-                                # 检查鼠标是否在文件区域内
-                                if self.is_point_in_rect((x, y), file_rect):
-                                    print(f"通过坐标匹配找到桌面文件: {file_path}")
-                                    return file_path
-                    except Exception as e:
-                        print(f"检查文件位置失败: {str(e)}")
-                        continue
-                        
-            except Exception as e:
-                print(f"Shell32获取文件位置失败: {str(e)}")
-            
+            if self.desktop_index is None or self.desktop_provider.desktop_path != desktop_path:
+                self.desktop_provider = DesktopFolderProvider(desktop_path)
+                self.desktop_index = ExplorerItemIndex(self.desktop_provider, max_windows=1)
+            file_path = self.desktop_index.hit(DesktopFolderProvider.VIEW_KEY, x, y)
+            if file_path and os.path.isfile(file_path):
+                print(f"通过坐标匹配找到桌面文件: {file_path}")
+                return file_path
             return None
-            
         except Exception as e:
             print(f"扫描桌面文件错误: {str(e)}")
             return None
 
+    def desktop_file_by_uia(self, x, y, desktop_path):
+        """使用 pywinauto 获取鼠标下的桌面元素，再拼接桌面路径"""
+        try:
+            element = thread_uia_desktop().from_point(x, y)
+            if not element:
+                return None
+            element_name = element.element_info.name
+
+            # 过滤掉系统UI元素
+            system_elements = [
+                "NVIDIA GeForce Overlay", "NVIDIA GeForce Experience",
+                "Windows Security", "Windows Defender",
+                "System Tray", "Taskbar", "Start Menu",
+                "Desktop", "Recycle Bin", "This PC",
+                "Network", "Control Panel", "Settings"
+            ]
+            if not element_name or element_name in system_elements:
+                return None
+            if element_name.startswith("地址:") or element_name.startswith("Address:"):
+                return None
+
+            # 尝试拼接桌面路径
+            candidate = os.path.join(desktop_path, element_name)
+            if os.path.isfile(candidate):
+                print(f"桌面文件路径: {candidate}")
+                return candidate
+
+            # 如果直接是绝对路径
+            if os.path.isabs(element_name) and os.path.isfile(element_name):
+                print(f"桌面绝对路径: {element_name}")
+                return element_name
+        except Exception as e:
+            print(f"桌面文件检测错误: {str(e)}")
+        return None
+
     def is_point_in_rect(self, point, rect):
         """检查点是否在矩形区域内"""
         try:
@@ -809,11 +852,25 @@ class MouseMonitorThread(QThread):
             return False
 
     def get_explorer_path(self, hwnd):
+        """获取资源管理器窗口的目录绝对路径，按顶层窗口缓存，窗口标题变化（切换文件夹）时重新获取"""
+        root_hwnd = win32gui.GetAncestor(hwnd, 2)  # GA_ROOT
+        title = win32gui.GetWindowText(root_hwnd)
+        folder_path = self.folder_paths.get(root_hwnd, title)
+        if folder_path is None:
+            folder_path = self.find_explorer_path(root_hwnd)
+            if folder_path:
+                self.folder_paths.put(root_hwnd, folder_path, title)
+        return folder_path
+
+    def find_explorer_path(self, hwnd):
         """使用多种方法尝试获取当前资源管理器窗口的目录绝对路径"""
         # 方法1：通过 Shell.Application 获取
         try:
-            import win32com.client
-            shell = win32com.client.Dispatch("Shell.Application")
+            folder_path = self.shell_provider().folder_path(hwnd)
+            if folder_path and os.path.isdir(folder_path):
+                print(f"Shell方法获取到文件夹路径: {folder_path}")
+                return folder_path
+            shell = thread_shell()
             for window in shell.Windows():
                 # 由于 hwnd 可能和 window.HWND 不完全一致，采用"接近匹配"策略
                 if abs(window.HWND - hwnd) < 100:
@@ -832,9 +889,7 @@ class MouseMonitorThread(QThread):
 
         # 方法2：利用当前选中的项目作为备选（例如在 Explorer 中当前选中项的路径）
         try:
-            import win32com.client
-            shell = win32com.client.Dispatch("Shell.Application")
-            for window in shell.Windows():
+            for window in thread_shell().Windows():
                 selected = window.Document.SelectedItems()
                 if selected.Count > 0:
                     candidate = selected.Item(0).Path
@@ -861,8 +916,12 @@ class MouseMonitorThread(QThread):
 
 # --- 修改 MainWindow 类 ---
 class MainWindow(QtWidgets.QMainWindow):
+    log_message = pyqtSignal(str)  # 供工作线程写日志，在GUI线程中追加到日志框
+    spare_session_ready = pyqtSignal()  # 会话池中有了备用会话（从会话池的后台线程发出）
+
     def __init__(self):
         super().__init__()
+        self.log_message.connect(self.add_log)
         self.setWindowTitle("文件自动加密系统")
         self.resize(800, 600)
 
@@ -878,6 +937,9 @@ class MainWindow(QtWidgets.QMainWindow):
         self.save_key_action.triggered.connect(self.save_rsa_key)
         self.load_key_action = self.key_menu.addAction("加载RSA密钥")
         self.load_key_action.triggered.connect(self.load_rsa_key)
+        self.key_menu.addSeparator()
+        self.forget_keys_action = self.key_menu.addAction("清除密钥缓存")
+        self.forget_keys_action.triggered.connect(self.forget_cached_keys)
 
         self.setMenuBar(self.menu_bar)
 
@@ -961,6 +1023,25 @@ class MainWindow(QtWidgets.QMainWindow):
         progress_group.setLayout(progress_layout)
         left_panel.addWidget(progress_group)
         
+        # 任务队列
+        job_group = QtWidgets.QGroupBox("任务队列")
+        job_layout = QtWidgets.QVBoxLayout()
+        
+        self.job_table = QtWidgets.QTableWidget(0, 4)
+        self.job_table.setHorizontalHeaderLabels(["文件", "类型", "状态", "进度"])
+        self.job_table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.Stretch)
+        self.job_table.verticalHeader().setVisible(False)
+        self.job_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.job_table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        job_layout.addWidget(self.job_table)
+        
+        self.cancel_job_button = QtWidgets.QPushButton("取消所选任务")
+        self.cancel_job_button.clicked.connect(self.cancel_selected_jobs)
+        job_layout.addWidget(self.cancel_job_button)
+        
+        job_group.setLayout(job_layout)
+        left_panel.addWidget(job_group)
+        
         # 右侧面板 - 二维码显示
         right_panel = QtWidgets.QVBoxLayout()
         
@@ -1028,16 +1109,32 @@ class MainWindow(QtWidgets.QMainWindow):
         self.encrypted_files = set()  # 用于记录已加密的文件
         self.acceleration_method = None
         self.thread_count = multiprocessing.cpu_count()
-        self.encryption_thread = None
-        self.decryption_thread = None  # 添加解密线程属性
+        # 加密/解密任务调度，所有任务共用 main.get_shared_pool() 进程池
+        self.job_manager = JobManager(parent=self)
+        self.job_manager.queue_changed.connect(self.refresh_job_table)
+        self.job_manager.job_changed.connect(self.on_job_changed)
+        self.job_manager.aggregate_progress.connect(self.update_progress)
+        self.job_manager.aggregate_stats.connect(self.update_throughput)
+        self.job_rows = {}  # job_id -> 任务表格中的行号
+        # 悬停计时期间的预取，悬停达到阈值时二维码、公钥和进程池已准备好
+        self.prefetcher = Prefetcher(processes=self.thread_count, qr_renderer=render_qr_image)
+        # 定期清除过期的已解密密钥，长时间没有解密操作时过期的密钥也会按时清零
+        self.key_purge_timer = QTimer(self)
+        self.key_purge_timer.setInterval(int(main.unwrapped_key_cache.purge_interval * 1000))
+        self.key_purge_timer.timeout.connect(main.unwrapped_key_cache.purge_expired)
+        self.key_purge_timer.start()
         self.rsa_private_key = None
         self.rsa_key = None  # 添加rsa_key属性初始化
         self.decrypted_files = set()  # 用于记录已解密的文件
         self.qr_popup = None  # 二维码弹窗
+        self.qr_render_threads = set()  # 正在渲染二维码的线程
+        self.qr_ready_files = set()  # 悬停弹窗已生成二维码、尚未开始加密的文件
         self.server_connected = False  # 服务器连接状态
-        self.session_id = load_session_id()
-        if not self.session_id:
-            self.register_session()
+        self.session_id = load_session_id()  # 没有保存的会话时使用会话池中预注册的会话
+        # 没有会话或保存的会话被服务器拒绝时，在后台预注册备用会话，需要新会话时直接取用，不在界面线程中等待注册请求
+        self.session_pool = SessionPool(main.register_server_session, on_available=self.spare_session_ready.emit)
+        self.spare_session_ready.connect(self.on_spare_session_ready)
+        self.server_check_thread = None  # 正在进行的HTTP连接检查
         
         # 初始化WebSocket管理器
         if HAS_WEBSOCKET:
@@ -1045,10 +1142,15 @@ class MainWindow(QtWidgets.QMainWindow):
             self.ws_manager.connected.connect(self.on_websocket_connected)
             self.ws_manager.disconnected.connect(self.on_websocket_disconnected)
             self.ws_manager.error_occurred.connect(self.on_websocket_error)
+            self.ws_manager.reconnecting.connect(self.on_websocket_reconnecting)
+            self.ws_manager.set_session_id(self.session_id)
+            # 连接后密钥、会话和通知请求通过WebSocket RPC发送
+            set_rpc_channel(self.ws_manager)
             
             # 注册消息处理器
             self.ws_manager.register_handler("encryption_approved", self.on_encryption_approved)
             self.ws_manager.register_handler("encryption_rejected", self.on_encryption_rejected)
+            self.ws_manager.register_handler("session_rejected", self.on_session_rejected, ui=True)
         else:
             self.ws_manager = None
         
@@ -1058,7 +1160,16 @@ class MainWindow(QtWidgets.QMainWindow):
         # 添加日志
         self.add_log("系统已启动，开始监控文件...")
         
-        # 自动连接服务器
+        # 窗口显示后再启动会话池和连接服务器
+        QTimer.singleShot(0, self.start_server_connection)
+    
+    def start_server_connection(self):
+        """连接服务器（没有会话时同时启动会话池），网络请求都在后台线程中执行，结果通过信号返回界面线程"""
+        # 启动通知发件箱，发送上次运行时未送达的通知
+        get_notification_outbox()
+        if not self.session_id:
+            self.add_log("正在后台注册会话...")
+            self.session_pool.start()
         self.connect_to_server()
     
     def connect_to_server(self):
@@ -1072,39 +1183,22 @@ class MainWindow(QtWidgets.QMainWindow):
             self.connect_to_server_http()
     
     def connect_to_server_http(self):
-        """使用HTTP连接服务器（备用方案）"""
-        try:
-            import requests
-            
-            # 尝试连接服务器（使用配置文件中的服务器地址）
-            test_url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['health']}"
-            
-            self.add_log("正在连接HTTP服务器...")
-            
-            # 设置超时时间为配置文件中的值
-            response = requests.get(test_url, timeout=SERVER_CONFIG['timeout'])
-            
-            if response.status_code == 200:
-                self.server_connected = True
-                self.add_log("HTTP连接成功")
-                self.update_server_status_indicator(True)
-            else:
-                self.server_connected = False
-                self.add_log(f"HTTP连接失败，状态码: {response.status_code}")
-                self.update_server_status_indicator(False)
-                
-        except requests.exceptions.Timeout:
-            self.server_connected = False
-            self.add_log("HTTP连接超时")
-            self.update_server_status_indicator(False)
-        except requests.exceptions.ConnectionError:
-            self.server_connected = False
-            self.add_log("HTTP连接错误：无法连接到服务器")
-            self.update_server_status_indicator(False)
-        except Exception as e:
-            self.server_connected = False
-            self.add_log(f"HTTP连接失败：{str(e)}")
-            self.update_server_status_indicator(False)
+        """使用HTTP连接服务器（备用方案），在工作线程中检查"""
+        if self.server_check_thread is not None and self.server_check_thread.isRunning():
+            return
+        self.add_log("正在连接HTTP服务器...")
+        self.server_check_thread = ServerCheckThread()
+        self.server_check_thread.server_checked.connect(self.on_server_checked)
+        self.server_check_thread.start()
+    
+    def on_server_checked(self, connected, message):
+        """HTTP连接检查完成"""
+        self.server_connected = connected
+        self.add_log(message)
+        self.update_server_status_indicator(connected)
+        if connected and not self.session_id:
+            # 服务器恢复可用，立即重试注册，不等待退避结束
+            self.session_pool.refill()
     
     def on_websocket_connected(self):
         """WebSocket连接成功回调"""
@@ -1118,13 +1212,17 @@ class MainWindow(QtWidgets.QMainWindow):
         self.add_log("WebSocket连接断开")
         self.update_server_status_indicator(False)
     
+    def on_websocket_reconnecting(self, delay: float):
+        """WebSocket即将重连回调"""
+        self.add_log(f"WebSocket将在 {delay:.1f} 秒后重连")
+    
     def on_websocket_error(self, error: str):
         """WebSocket错误回调"""
         self.add_log(f"WebSocket错误: {error}")
         self.update_server_status_indicator(False)
     
     def on_encryption_approved(self, data: dict):
-        """加密请求被批准"""
+        """加密请求被批准（在消息分发线程中执行）"""
         try:
             session_id = data.get("session_id")
             symmetric_key_hex = data.get("symmetric_key")
@@ -1134,23 +1232,23 @@ class MainWindow(QtWidgets.QMainWindow):
                 symmetric_key = bytes.fromhex(symmetric_key_hex)
                 salt = bytes.fromhex(salt_hex) if salt_hex else None
                 
-                self.add_log(f"加密请求已批准，会话ID: {session_id}")
+                self.log_message.emit(f"加密请求已批准，会话ID: {session_id}")
                 # 这里可以继续加密流程
             else:
-                self.add_log("加密请求批准但未收到密钥")
+                self.log_message.emit("加密请求批准但未收到密钥")
         except Exception as e:
             print(f"处理加密批准时出错: {str(e)}")
-            self.add_log(f"处理加密批准时出错: {str(e)}")
+            self.log_message.emit(f"处理加密批准时出错: {str(e)}")
     
     def on_encryption_rejected(self, data: dict):
-        """加密请求被拒绝"""
+        """加密请求被拒绝（在消息分发线程中执行）"""
         try:
             session_id = data.get("session_id")
             reason = data.get("reason", "未知原因")
-            self.add_log(f"加密请求被拒绝，会话ID: {session_id}，原因: {reason}")
+            self.log_message.emit(f"加密请求被拒绝，会话ID: {session_id}，原因: {reason}")
         except Exception as e:
             print(f"处理加密拒绝时出错: {str(e)}")
-            self.add_log(f"处理加密拒绝时出错: {str(e)}")
+            self.log_message.emit(f"处理加密拒绝时出错: {str(e)}")
 
     def update_server_status_indicator(self, connected):
         """更新服务器状态指示器"""
@@ -1188,6 +1286,8 @@ class MainWindow(QtWidgets.QMainWindow):
             self.mouse_monitor = MouseMonitorThread(self)
             self.mouse_monitor.file_detected.connect(self.on_file_detected)
             self.mouse_monitor.show_qr_popup.connect(self.show_qr_popup)
+            self.mouse_monitor.hover_candidate.connect(self.on_hover_candidate)
+            self.mouse_monitor.hover_candidate_lost.connect(self.prefetcher.cancel)
             self.mouse_monitor.start()
             self.monitoring_active = True
             self.toggle_button.setText("停止监控")
@@ -1198,6 +1298,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if self.mouse_monitor:
             self.mouse_monitor.stop()
             self.mouse_monitor = None
+            self.prefetcher.cancel()
             self.monitoring_active = False
             self.toggle_button.setText("开始监控")
             self.add_log("监控线程已停止")
@@ -1209,6 +1310,16 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             self.start_mouse_monitoring()
     
+    def on_hover_candidate(self, file_path):
+        """开始在文件上悬停计时：在计时期间预热进程池、获取公钥、渲染二维码并预读文件"""
+        try:
+            if file_path in self.encrypted_files or file_path in self.decrypted_files:
+                return
+            self.ensure_session()
+            self.prefetcher.start(file_path, self.session_id or "unknown-session")
+        except Exception as e:
+            print(f"启动预取时出错: {str(e)}")
+    
     def on_file_detected(self, file_path):
         """处理检测到的文件"""
         try:
@@ -1240,45 +1351,155 @@ class MainWindow(QtWidgets.QMainWindow):
             
             # 获取密码
             password = self.password_edit.text()
+            qr_ready = file_path in self.qr_ready_files
+            self.qr_ready_files.discard(file_path)
             
-            # 启动加密线程
-            self.encryption_thread = EncryptionThread(
-                file_path,
-                acceleration_method=self.acceleration_method,
-                thread_count=self.thread_count,
-                password=password,
-                session_id=self.session_id  # 传递已保存的session_id
+            # 加入任务队列，由任务调度器按并发上限和优先级启动
+            job, created = self.job_manager.submit(
+                "encrypt", file_path,
+                lambda job: self.create_encryption_thread(job, password, qr_ready)
             )
-            
-            # 连接信号
-            self.encryption_thread.encryption_done.connect(self.encryption_completed)
-            self.encryption_thread.encryption_failed.connect(self.encryption_failed)
-            self.encryption_thread.qr_generated.connect(self.update_qr_display)
-            self.encryption_thread.encryption_progress.connect(self.update_progress)
-            self.encryption_thread.encryption_status.connect(self.update_status)
-            
-            # 启动线程
-            self.encryption_thread.start()
+            if not created:
+                self.add_log(f"文件已在任务队列中: {file_path}")
+                return
             
             # 记录此文件已被加密
             self.encrypted_files.add(file_path)
             
             # 添加日志
-            self.add_log(f"开始加密文件: {file_path}")
+            self.add_log(f"加密任务已加入队列: {file_path}")
         except Exception as e:
             print(f"启动加密线程时出错: {str(e)}")
             self.add_log(f"启动加密失败: {str(e)}")
             self.status_label.setText(f"启动加密失败: {str(e)}")
     
+    def create_encryption_thread(self, job, password, qr_ready):
+        """任务开始时创建加密线程"""
+        thread = EncryptionThread(
+            job.file_path,
+            acceleration_method=self.acceleration_method,
+            thread_count=self.thread_count,
+            password=password,
+            session_id=self.session_id,  # 传递已保存的session_id
+            qr_ready=qr_ready,
+            cancel_token=job.cancel_token
+        )
+        
+        # 连接信号
+        thread.encryption_done.connect(self.encryption_completed)
+        thread.encryption_done.connect(lambda path: self.job_manager.finish(job, path))
+        thread.encryption_failed.connect(self.encryption_failed)
+        thread.encryption_failed.connect(lambda error: self.job_manager.finish(job, error=error))
+        thread.qr_generated.connect(self.update_qr_display)
+        thread.encryption_progress.connect(lambda progress: self.job_manager.set_progress(job, progress))
+        thread.encryption_stats.connect(lambda stats: self.job_manager.set_stats(job, stats))
+        thread.encryption_status.connect(self.update_status)
+        
+        self.add_log(f"开始加密文件: {job.file_path}")
+        return thread
+    
+    def create_decryption_thread(self, job):
+        """任务开始时创建解密线程"""
+        thread = DecryptionThread(job.file_path, rsa_private_key=self.rsa_key, cancel_token=job.cancel_token)
+        
+        # 连接信号
+        thread.decryption_done.connect(self.decryption_completed)
+        thread.decryption_done.connect(lambda path: self.job_manager.finish(job, path))
+        thread.decryption_failed.connect(self.decryption_failed)
+        thread.decryption_failed.connect(lambda error: self.job_manager.finish(job, error=error))
+        thread.decryption_progress.connect(lambda progress: self.job_manager.set_progress(job, progress))
+        thread.decryption_stats.connect(lambda stats: self.job_manager.set_stats(job, stats))
+        thread.decryption_status.connect(self.update_status)
+        
+        self.add_log(f"开始解密文件: {job.file_path}")
+        return thread
+    
+    def cancel_job(self, job):
+        """取消任务，取消后允许再次悬停该文件重新提交"""
+        if self.job_manager.cancel(job):
+            self.encrypted_files.discard(job.file_path)
+            self.decrypted_files.discard(job.file_path)
+            self.add_log(f"已请求取消任务: {job.file_path}")
+    
+    def cancel_job_for_file(self, file_path):
+        """取消某个文件排队或运行中的任务（二维码弹窗的取消按钮）"""
+        try:
+            job = self.job_manager.find(file_path)
+            if job is not None:
+                self.cancel_job(job)
+            else:
+                self.add_log(f"没有可取消的任务: {file_path}")
+        except Exception as e:
+            print(f"取消任务时出错: {str(e)}")
+    
+    def cancel_selected_jobs(self):
+        """取消任务表格中选中的任务"""
+        try:
+            rows = {index.row() for index in self.job_table.selectionModel().selectedRows()}
+            for row in rows:
+                item = self.job_table.item(row, 0)
+                job = self.job_manager.get(item.data(Qt.UserRole)) if item else None
+                if job is not None:
+                    self.cancel_job(job)
+        except Exception as e:
+            print(f"取消任务时出错: {str(e)}")
+    
     def update_progress(self, progress):
-        """更新进度条"""
+        """更新进度条（所有未完成任务的总进度）"""
         try:
             self.progress_bar.setValue(progress)
-            # 同时更新二维码弹窗的进度条
-            if hasattr(self, 'qr_popup') and self.qr_popup:
-                self.qr_popup.update_progress(progress)
         except Exception as e:
             print(f"更新进度条时出错: {str(e)}")
+    
+    def update_throughput(self, stats):
+        """在进度标签中显示总速度和预计剩余时间"""
+        try:
+            if stats["active"] and stats["speed"] > 0:
+                self.progress_label.setText(
+                    f"{stats['percent']}% · {format_speed(stats['speed'])} · 剩余 {format_eta(stats['eta'])}")
+        except Exception as e:
+            print(f"更新速度显示时出错: {str(e)}")
+    
+    def on_job_changed(self, job):
+        """任务状态或进度变化"""
+        try:
+            self.update_job_row(job)
+            # 二维码弹窗只显示其对应文件的进度
+            if self.qr_popup and self.qr_popup.file_path == job.file_path:
+                self.qr_popup.update_progress(job.progress)
+        except Exception as e:
+            print(f"更新任务状态时出错: {str(e)}")
+    
+    def refresh_job_table(self):
+        """按任务列表重建任务表格"""
+        try:
+            jobs = self.job_manager.jobs()
+            self.job_table.setRowCount(len(jobs))
+            self.job_rows = {}
+            for row, job in enumerate(jobs):
+                self.job_rows[job.job_id] = row
+                name_item = QtWidgets.QTableWidgetItem(os.path.basename(job.file_path))
+                name_item.setToolTip(job.file_path)
+                name_item.setData(Qt.UserRole, job.job_id)
+                self.job_table.setItem(row, 0, name_item)
+                self.job_table.setItem(row, 1, QtWidgets.QTableWidgetItem(JOB_KIND_NAMES.get(job.kind, job.kind)))
+                self.update_job_row(job)
+        except Exception as e:
+            print(f"刷新任务队列时出错: {str(e)}")
+    
+    def update_job_row(self, job):
+        """更新任务表格中一个任务的状态和进度"""
+        row = self.job_rows.get(job.job_id)
+        if row is None:
+            return
+        status_item = QtWidgets.QTableWidgetItem(job.status)
+        if job.error:
+            status_item.setToolTip(str(job.error))
+        self.job_table.setItem(row, 2, status_item)
+        progress_text = f"{job.progress}%"
+        if job.status == JOB_RUNNING and job.stats:
+            progress_text += f" · {format_speed(job.stats['speed'])} · {format_eta(job.stats['eta'])}"
+        self.job_table.setItem(row, 3, QtWidgets.QTableWidgetItem(progress_text))
 
     def update_status(self, status):
         """更新状态标签"""
@@ -1290,9 +1511,9 @@ class MainWindow(QtWidgets.QMainWindow):
         except Exception as e:
             print(f"更新状态标签时出错: {str(e)}")
 
-    def update_qr_display(self, qr_path):
+    def update_qr_display(self, qr_image):
         try:
-            qr_pixmap = QtGui.QPixmap(qr_path)
+            qr_pixmap = QtGui.QPixmap.fromImage(qr_image)
             self.qr_label.setPixmap(qr_pixmap.scaled(
                 self.qr_label.width(), self.qr_label.height(),
                 QtCore.Qt.KeepAspectRatio,  # 关键：保持原始比例
@@ -1405,26 +1626,17 @@ class MainWindow(QtWidgets.QMainWindow):
                     self.add_log("解密已取消：未加载RSA密钥")
                     return
             
-            # 启动解密线程
-            self.decryption_thread = DecryptionThread(
-                file_path,
-                rsa_private_key=self.rsa_key
-            )
-            
-            # 连接信号
-            self.decryption_thread.decryption_done.connect(self.decryption_completed)
-            self.decryption_thread.decryption_failed.connect(self.decryption_failed)
-            self.decryption_thread.decryption_progress.connect(self.update_progress)
-            self.decryption_thread.decryption_status.connect(self.update_status)
-            
-            # 启动线程
-            self.decryption_thread.start()
+            # 加入任务队列，由任务调度器按并发上限和优先级启动
+            job, created = self.job_manager.submit("decrypt", file_path, self.create_decryption_thread)
+            if not created:
+                self.add_log(f"文件已在任务队列中: {file_path}")
+                return
             
             # 记录此文件已被解密
             self.decrypted_files.add(file_path)
             
             # 添加日志
-            self.add_log(f"开始解密文件: {file_path}")
+            self.add_log(f"解密任务已加入队列: {file_path}")
         except Exception as e:
             print(f"启动解密线程时出错: {str(e)}")
             self.add_log(f"启动解密失败: {str(e)}")
@@ -1580,6 +1792,16 @@ class MainWindow(QtWidgets.QMainWindow):
             print(f"加载RSA密钥时出错: {str(e)}")
             QtWidgets.QMessageBox.critical(self, "错误", f"加载RSA密钥时出错:\n{str(e)}")
 
+    def forget_cached_keys(self):
+        """清零并清空内存中缓存的对称密钥"""
+        try:
+            count = main.unwrapped_key_cache.forget_all()
+            self.add_log(f"已清除 {count} 个缓存的密钥")
+            self.status_label.setText("密钥缓存已清除")
+        except Exception as e:
+            print(f"清除密钥缓存时出错: {str(e)}")
+            self.add_log(f"清除密钥缓存时出错: {str(e)}")
+
     def show_qr_popup(self, file_path, x, y):
         """显示二维码弹窗"""
         try:
@@ -1590,18 +1812,33 @@ class MainWindow(QtWidgets.QMainWindow):
                 operation_type = "加密"
             
             # 检查是否有已保存的session_id
-            if hasattr(self, 'session_id') and self.session_id:
-                # 使用已保存的session_id生成二维码
-                qr_path = main.generate_qr_code(file_path, self.session_id)
+            if self.ensure_session():
+                session_id = self.session_id
                 self.add_log(f"使用已保存的session_id生成二维码: {self.session_id}")
             else:
-                # 如果没有session_id，使用原来的方法生成二维码
-                qr_path = main.generate_qr_code(file_path, "unknown-session")
+                session_id = "unknown-session"
                 self.add_log("未找到session_id，使用默认二维码生成方法")
             
-            # 创建二维码弹窗并显示
-            self.qr_popup = QRCodePopupWindow(qr_path, file_path, operation_type, self)
+            # 先显示弹窗，二维码在工作线程中渲染完成后填入
+            self.qr_popup = QRCodePopupWindow(None, file_path, operation_type, self)
+            self.qr_popup.cancel_requested.connect(self.cancel_job_for_file)
             self.qr_popup.show_at_cursor(x, y)
+            if operation_type == "加密":
+                self.qr_ready_files.add(file_path)
+            
+            popup = self.qr_popup
+            prefetched = self.prefetcher.take(file_path, session_id)
+            if prefetched is not None and prefetched.qr_image is not None:
+                # 悬停计时期间已渲染好二维码
+                self.on_qr_rendered(popup, prefetched.qr_image)
+                self.add_log(f"显示文件二维码: {file_path} ({operation_type})")
+                return
+            render_thread = QRRenderThread(file_path, session_id)
+            render_thread.qr_rendered.connect(lambda payload, image: self.on_qr_rendered(popup, image))
+            render_thread.qr_failed.connect(lambda error: popup.update_status(f"生成二维码失败: {error}"))
+            render_thread.finished.connect(lambda: self.qr_render_threads.discard(render_thread))
+            self.qr_render_threads.add(render_thread)  # 保持引用直到线程结束
+            render_thread.start()
             
             # 添加日志
             self.add_log(f"显示文件二维码: {file_path} ({operation_type})")
@@ -1614,26 +1851,49 @@ class MainWindow(QtWidgets.QMainWindow):
             except:
                 pass
 
-    def register_session(self):
-        """注册新会话"""
+    def on_qr_rendered(self, popup, qr_image):
+        """二维码渲染完成，同时显示在弹窗和主窗口"""
         try:
-            import requests
-            url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['register_session']}"
-            response = requests.post(url, timeout=SERVER_CONFIG['timeout'])
-            if response.status_code == 200:
-                data = response.json()
-                session_id = data.get("session_id")
-                if session_id:
-                    save_session_id(session_id)
-                    self.session_id = session_id
-                    self.add_log(f"已注册新会话: {session_id}")
-                else:
-                    self.add_log("服务器未返回session_id")
-            else:
-                self.add_log(f"注册会话失败，状态码: {response.status_code}")
+            popup.set_qr_code(qr_image)
+            self.update_qr_display(qr_image)
         except Exception as e:
-            print(f"注册会话时出错: {e}")
-            self.add_log(f"注册会话时出错: {e}")
+            print(f"显示二维码时出错: {str(e)}")
+
+    def ensure_session(self):
+        """
+        没有会话时取用会话池中预注册的会话，不等待网络请求
+        返回: 是否有可用的会话
+        """
+        if self.session_id:
+            return True
+        session_id = self.session_pool.take()
+        if not session_id:
+            self.session_pool.start()
+            return False
+        # 已有会话，不再保持备用会话，直到会话被服务器拒绝
+        self.session_pool.stop(wait=False)
+        save_session_id(session_id)
+        self.session_id = session_id
+        if getattr(self, 'ws_manager', None):
+            self.ws_manager.set_session_id(session_id)
+        self.add_log(f"已使用预注册的会话: {session_id}")
+        return True
+
+    def on_session_rejected(self, data: dict):
+        """服务器拒绝了保存的会话（已过期或不存在），改用会话池中的新会话"""
+        if data.get("session_id") != self.session_id:
+            return
+        self.add_log(f"会话已失效: {self.session_id}，正在使用新会话")
+        self.session_id = None
+        save_session_id(None)
+        self.session_pool.start()
+        self.session_pool.refill()
+        self.ensure_session()
+
+    def on_spare_session_ready(self):
+        """会话池中有了备用会话，启动时没有会话的话立即使用"""
+        if not self.session_id:
+            self.ensure_session()
 
     def closeEvent(self, event):
         """重写关闭事件，防止主界面被意外关闭"""
@@ -1652,32 +1912,3 @@ class MainWindow(QtWidgets.QMainWindow):
             self.add_log("用户尝试关闭主界面，已阻止")
         except Exception as e:
             print(f"处理关闭事件时出错: {str(e)}")
-
-    def on_encryption_approved(self, data: dict):
-        """加密请求被批准"""
-        try:
-            session_id = data.get("session_id")
-            symmetric_key_hex = data.get("symmetric_key")
-            salt_hex = data.get("salt")
-            
-            if symmetric_key_hex:
-                symmetric_key = bytes.fromhex(symmetric_key_hex)
-                salt = bytes.fromhex(salt_hex) if salt_hex else None
-                
-                self.add_log(f"加密请求已批准，会话ID: {session_id}")
-                # 这里可以继续加密流程
-            else:
-                self.add_log("加密请求批准但未收到密钥")
-        except Exception as e:
-            print(f"处理加密批准时出错: {str(e)}")
-            self.add_log(f"处理加密批准时出错: {str(e)}")
-    
-    def on_encryption_rejected(self, data: dict):
-        """加密请求被拒绝"""
-        try:
-            session_id = data.get("session_id")
-            reason = data.get("reason", "未知原因")
-            self.add_log(f"加密请求被拒绝，会话ID: {session_id}，原因: {reason}")
-        except Exception as e:
-            print(f"处理加密拒绝时出错: {str(e)}")
-            self.add_log(f"处理加密拒绝时出错: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,277 @@
+import time
+
+try:
+    from config import HOVER_CONFIG
+except ImportError:
+    HOVER_CONFIG = {
+        "threshold": 3.0,
+        "cooldown": 10.0,
+        "move_tolerance": 4,
+        "fast_interval": 0.05,
+        "interval": 0.2,
+        "idle_interval": 0.5,
+        "settle_time": 0.5,
+    }
+
+# 悬停状态
+HOVER_IDLE = "idle"          # 鼠标不在文件资源管理器或桌面上
+HOVER_SEARCHING = "searching"  # 在资源管理器中，但鼠标下没有文件
+HOVER_DWELLING = "dwelling"  # 正在某个文件上计时
+HOVER_TRIGGERED = "triggered"  # 已对当前文件触发，离开该文件前不再触发
+
+
+class HoverTrigger:
+    """一次悬停触发：文件路径及触发时的鼠标坐标"""
+
+    def __init__(self, file_path, x, y, time):
+        self.file_path = file_path
+        self.x = x
+        self.y = y
+        self.time = time
+
+    def __repr__(self):
+        return f"HoverTrigger({self.file_path!r}, {self.x}, {self.y}, {self.time:.3f})"
+
+
+class HoverTracker:
+    """
+    悬停检测状态机，不依赖任何平台接口
+    由事件驱动：鼠标移动（on_cursor）、鼠标下窗口变化（on_window）、文件解析结果（on_file）；
+    调用方在 needs_resolve 为True时解析鼠标下的文件，再定期调用 poll 检查是否达到悬停阈值。
+    所有时间参数均为单调时钟秒数，由调用方传入，便于用合成事件测试
+    """
+
+    def __init__(self, threshold=None, cooldown=None, move_tolerance=None,
+                 fast_interval=None, interval=None, idle_interval=None, settle_time=None):
+        self.threshold = HOVER_CONFIG.get("threshold", 3.0) if threshold is None else threshold
+        # 同一文件两次触发的最小间隔，离开后很快回到同一文件时不重复触发
+        self.cooldown = HOVER_CONFIG.get("cooldown", 10.0) if cooldown is None else cooldown
+        # 移动距离不超过该像素数时视为未移动，不重新解析文件
+        self.move_tolerance = HOVER_CONFIG.get("move_tolerance", 4) if move_tolerance is None else move_tolerance
+        self.fast_interval = HOVER_CONFIG.get("fast_interval", 0.05) if fast_interval is None else fast_interval
+        self.interval = HOVER_CONFIG.get("interval", 0.2) if interval is None else interval
+        self.idle_interval = HOVER_CONFIG.get("idle_interval", 0.5) if idle_interval is None else idle_interval
+        # 最后一次移动后的这段时间内按 fast_interval 采样
+        self.settle_time = HOVER_CONFIG.get("settle_time", 0.5) if settle_time is None else settle_time
+        self.reset()
+
+    def reset(self):
+        """清除所有状态"""
+        self.state = HOVER_IDLE
+        self.x = None
+        self.y = None
+        self.window = None
+        self.in_explorer = False
+        self.current_file = None
+        self.dwell_start = None
+        self.last_move = None
+        self.needs_resolve = False
+        self._last_triggers = {}  # 文件路径 -> 最近一次触发时间
+
+    def on_cursor(self, x, y, now):
+        """
+        鼠标位置采样
+        返回: 是否视为移动（移动后如在资源管理器中需重新解析文件）
+        """
+        if self.x is not None and abs(x - self.x) <= self.move_tolerance and abs(y - self.y) <= self.move_tolerance:
+            return False
+        self.x, self.y = x, y
+        self.last_move = now
+        if self.in_explorer:
+            self.needs_resolve = True
+        return True
+
+    def on_window(self, window, in_explorer, now):
+        """鼠标下的窗口变化，in_explorer 表示该窗口是否为文件资源管理器或桌面"""
+        if window == self.window and in_explorer == self.in_explorer:
+            return
+        self.window = window
+        self.in_explorer = in_explorer
+        if in_explorer:
+            self.needs_resolve = True
+            if self.state == HOVER_IDLE:
+                self.state = HOVER_SEARCHING
+        else:
+            self.needs_resolve = False
+            self._leave_file()
+            self.state = HOVER_IDLE
+
+    def on_file(self, file_path, now):
+        """鼠标下文件的解析结果，没有文件时传入None"""
+        self.needs_resolve = False
+        if not self.in_explorer:
+            return
+        if file_path == self.current_file:
+            return
+        self._leave_file()
+        if file_path is None:
+            self.state = HOVER_SEARCHING
+            return
+        self.current_file = file_path
+        self.dwell_start = now
+        last = self._last_triggers.get(file_path)
+        if last is not None and now - last < self.cooldown:
+            self.state = HOVER_TRIGGERED
+        else:
+            self.state = HOVER_DWELLING
+
+    def poll(self, now):
+        """检查悬停是否达到阈值，达到时返回 HoverTrigger，否则返回None"""
+        if self.state != HOVER_DWELLING or now - self.dwell_start < self.threshold:
+            return None
+        self.state = HOVER_TRIGGERED
+        self._last_triggers[self.current_file] = now
+        self._prune_triggers(now)
+        return HoverTrigger(self.current_file, self.x, self.y, now)
+
+    def next_interval(self, now):
+        """
+        下一次采样前的等待时间（秒）
+        刚移动过时快速采样；在文件上计时时按常规间隔，不晚于阈值到达时刻；其余情况低频采样
+        """
+        if self.in_explorer and self.last_move is not None and now - self.last_move < self.settle_time:
+            return self.fast_interval
+        if self.state == HOVER_DWELLING:
+            remaining = self.dwell_start + self.threshold - now
+            return max(min(self.interval, remaining), 0.0)
+        if self.state == HOVER_SEARCHING:
+            return self.interval
+        return self.idle_interval
+
+    def dwell_remaining(self, now):
+        """当前文件距离触发的剩余时间，未在计时时返回None"""
+        if self.state != HOVER_DWELLING:
+            return None
+        return max(self.dwell_start + self.threshold - now, 0.0)
+
+    def _leave_file(self):
+        self.current_file = None
+        self.dwell_start = None
+
+    def _prune_triggers(self, now):
+        expired = [path for path, last in self._last_triggers.items() if now - last >= self.cooldown]
+        for path in expired:
+            del self._last_triggers[path]
+
+
+class HoverLoop:
+    """
+    悬停检测循环，连接平台相关的事件源和 HoverTracker
+    source 需提供:
+        cursor_position() -> (x, y)
+        window_at(x, y) -> 窗口标识（可比较相等），每次采样调用，应为低开销操作
+        is_explorer(window) -> bool，只在窗口变化时调用
+        file_at(window, x, y) -> 文件路径或None，只在需要重新解析时调用
+    on_trigger(trigger) 在悬停达到阈值时调用；
+    on_candidate(file_path) 在开始对某个文件计时时调用，可用于提前准备资源，
+    on_candidate_lost(file_path) 在计时未达到阈值就离开该文件时调用
+    """
+
+    def __init__(self, source, on_trigger, tracker=None, clock=time.monotonic, sleep=time.sleep,
+                 on_candidate=None, on_candidate_lost=None):
+        self.source = source
+        self.on_trigger = on_trigger
+        self.on_candidate = on_candidate
+        self.on_candidate_lost = on_candidate_lost
+        self.tracker = tracker or HoverTracker()
+        self.clock = clock
+        self.sleep = sleep
+        self.running = False
+        self.samples = 0   # 采样次数
+        self.resolves = 0  # 文件解析次数
+
+    def step(self):
+        """
+        采样一次并处理事件
+        返回: 建议的下一次采样等待时间（秒）
+        """
+        now = self.clock()
+        tracker = self.tracker
+        self.samples += 1
+        candidate = tracker.current_file if tracker.state == HOVER_DWELLING else None
+        x, y = self.source.cursor_position()
+        tracker.on_cursor(x, y, now)
+        window = self.source.window_at(x, y)
+        if window != tracker.window:
+            tracker.on_window(window, bool(self.source.is_explorer(window)), now)
+        if tracker.needs_resolve:
+            self.resolves += 1
+            tracker.on_file(self.source.file_at(tracker.window, x, y), now)
+        new_candidate = tracker.current_file if tracker.state == HOVER_DWELLING else None
+        if new_candidate != candidate:
+            if candidate is not None and self.on_candidate_lost:
+                self.on_candidate_lost(candidate)
+            if new_candidate is not None and self.on_candidate:
+                self.on_candidate(new_candidate)
+        trigger = tracker.poll(now)
+        if trigger is not None:
+            self.on_trigger(trigger)
+        return tracker.next_interval(now)
+
+    def run(self):
+        """循环采样直到 stop 被调用，单次采样出错时等待 idle_interval 后继续"""
+        self.running = True
+        while self.running:
+            try:
+                delay = self.step()
+            except Exception as e:
+                print(f"悬停检测出错: {str(e)}")
+                delay = self.tracker.idle_interval
+            self.sleep(delay)
+
+    def stop(self):
+        self.running = False
+
+
+class ScriptedHoverSource:
+    """
+    合成事件源，用于在任意平台上测试和基准测试悬停检测
+    events: 按时间排序的 (时间, x, y, 窗口) 列表，每个事件表示从该时刻起鼠标所在位置；
+    explorer_windows: 视为资源管理器的窗口集合；
+    files: 函数 (窗口, x, y) -> 文件路径或None
+    配合 ScriptedHoverSource.clock 和 ScriptedHoverSource.sleep 使用时不实际等待
+    """
+
+    def __init__(self, events, explorer_windows, files):
+        self.events = list(events)
+        self.explorer_windows = set(explorer_windows)
+        self.files = files
+        self.now = self.events[0][0] if self.events else 0.0
+        self._index = 0
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def _current(self):
+        while self._index + 1 < len(self.events) and self.events[self._index + 1][0] <= self.now:
+            self._index += 1
+        return self.events[self._index]
+
+    def cursor_position(self):
+        _, x, y, _ = self._current()
+        return x, y
+
+    def window_at(self, x, y):
+        return self._current()[3]
+
+    def is_explorer(self, window):
+        return window in self.explorer_windows
+
+    def file_at(self, window, x, y):
+        return self.files(window, x, y)
+
+
+def replay(source, tracker=None, until=None):
+    """
+    用合成事件源驱动 HoverLoop 直到事件结束（或到达 until 时刻）
+    返回: (触发列表, HoverLoop)，HoverLoop 的 samples/resolves 可用于比较采样开销
+    """
+    triggers = []
+    loop = HoverLoop(source, triggers.append, tracker=tracker, clock=source.clock, sleep=source.sleep)
+    end = until if until is not None else source.events[-1][0]
+    while source.now <= end:
+        source.sleep(max(loop.step(), 1e-3))
+    return triggers, loop
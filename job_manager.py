@@ -0,0 +1,263 @@
+import os
+import heapq
+import itertools
+from collections import OrderedDict
+from PyQt5.QtCore import QObject, pyqtSignal, QTimer
+from cancellation import CancellationToken
+
+try:
+    from config import UI_CONFIG
+except ImportError:
+    UI_CONFIG = {
+        "max_concurrent_jobs": 2,
+        "job_history": 20,
+        "progress_refresh_ms": 200,
+    }
+
+# 任务状态
+JOB_QUEUED = "排队中"
+JOB_RUNNING = "运行中"
+JOB_DONE = "已完成"
+JOB_FAILED = "失败"
+JOB_CANCELLING = "正在取消"
+JOB_CANCELLED = "已取消"
+
+# 任务通道，数值小的优先：解密通常是用户在等待打开文件，排在加密之前
+JOB_LANES = {"decrypt": 0, "encrypt": 1}
+JOB_KIND_NAMES = {"decrypt": "解密", "encrypt": "加密"}
+
+
+class Job:
+    """一个加密或解密任务"""
+
+    def __init__(self, job_id, kind, file_path, thread_factory):
+        self.job_id = job_id
+        self.kind = kind
+        self.file_path = file_path
+        self.thread_factory = thread_factory
+        try:
+            self.size = os.path.getsize(file_path)
+        except OSError:
+            self.size = 0
+        self.status = JOB_QUEUED
+        self.progress = 0
+        self.stats = None  # 最近一次的进度统计（速度、剩余时间），见 progress_reporter.ProgressReporter
+        self.result = None
+        self.error = None
+        self.thread = None
+        self.cancel_token = CancellationToken()  # 由 thread_factory 传给工作线程
+
+    @property
+    def key(self):
+        """去重键：同一文件的同类任务只保留一个"""
+        return self.kind, os.path.normcase(os.path.abspath(self.file_path))
+
+    @property
+    def priority(self):
+        """调度优先级：先按通道，再按文件大小的数量级（小文件优先），同级按提交顺序"""
+        return JOB_LANES.get(self.kind, len(JOB_LANES)), self.size.bit_length(), self.job_id
+
+    @property
+    def finished(self):
+        return self.status in (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+    def __lt__(self, other):
+        return self.priority < other.priority
+
+
+class JobManager(QObject):
+    """
+    加密/解密任务调度器（在GUI线程中使用）
+    限制同时运行的任务数，按优先级从队列中启动任务，合并重复提交，
+    并汇总所有未完成任务的进度
+    """
+
+    job_changed = pyqtSignal(object)      # 任务状态或进度变化
+    queue_changed = pyqtSignal()          # 任务被加入或移出列表
+    aggregate_progress = pyqtSignal(int)  # 所有未完成任务按文件大小加权的总进度
+    aggregate_stats = pyqtSignal(object)  # 总进度统计，见 aggregate()
+
+    def __init__(self, max_concurrent=None, history=None, parent=None):
+        super().__init__(parent)
+        self.max_concurrent = max_concurrent or UI_CONFIG.get("max_concurrent_jobs", 2)
+        self.history = history if history is not None else UI_CONFIG.get("job_history", 20)
+        self._ids = itertools.count(1)
+        self._queue = []  # 排队任务的优先级堆
+        self._running = set()
+        self._active = {}  # 去重键 -> 排队或运行中的任务
+        self._jobs = OrderedDict()  # job_id -> 任务，包括最近完成的任务
+        # 进度更新先记录下来，由定时器按固定频率合并通知界面
+        self._dirty = set()
+        self._refresh_timer = QTimer(self)
+        self._refresh_timer.setInterval(UI_CONFIG.get("progress_refresh_ms", 200))
+        self._refresh_timer.timeout.connect(self._flush_updates)
+
+    def submit(self, kind, file_path, thread_factory):
+        """
+        提交任务
+        thread_factory(job) 在任务开始时调用，返回已连接好信号、尚未启动的QThread；
+        线程结束前应调用 finish 报告结果
+        返回: (任务, 是否为新任务)，同一文件的同类任务已在排队或运行时返回已有任务
+        """
+        job = Job(next(self._ids), kind, file_path, thread_factory)
+        existing = self._active.get(job.key)
+        if existing is not None:
+            return existing, False
+        self._active[job.key] = job
+        self._jobs[job.job_id] = job
+        heapq.heappush(self._queue, job)
+        self.queue_changed.emit()
+        self._schedule()
+        self._emit_aggregate()
+        return job, True
+
+    def set_progress(self, job, progress):
+        """更新任务进度（0-100），界面在下一个刷新周期更新"""
+        if job.finished or progress == job.progress:
+            return
+        job.progress = progress
+        self._mark_dirty(job)
+
+    def set_stats(self, job, stats):
+        """更新任务的进度统计（ProgressReporter 的 stats 字典），界面在下一个刷新周期更新"""
+        if job.finished:
+            return
+        job.stats = stats
+        job.progress = stats["percent"]
+        self._mark_dirty(job)
+
+    def aggregate(self):
+        """
+        所有排队和运行中任务的总进度统计
+        返回: 包含 percent、bytes_done、bytes_total、speed（字节/秒，运行中任务之和）、
+              eta（剩余秒数，未知时为None）、active 的字典
+        """
+        active = list(self._active.values())
+        bytes_total = sum(max(job.size, 1) for job in active)
+        bytes_done = sum(max(job.size, 1) * job.progress / 100 for job in active)
+        speed = sum(job.stats["speed"] for job in active if job.stats and job.status != JOB_QUEUED)
+        remaining = bytes_total - bytes_done
+        return {
+            "percent": int(bytes_done * 100 / bytes_total) if bytes_total else 0,
+            "bytes_done": int(bytes_done),
+            "bytes_total": bytes_total,
+            "speed": speed,
+            "eta": remaining / speed if speed > 0 else None,
+            "active": len(active),
+        }
+
+    def finish(self, job, result=None, error=None):
+        """报告任务结果，result为空时视为失败（已请求取消时视为已取消）"""
+        if job.finished:
+            return
+        job.result = result
+        job.error = error
+        if result:
+            job.status = JOB_DONE
+            job.progress = 100
+        else:
+            job.status = JOB_CANCELLED if job.cancel_token.cancelled else JOB_FAILED
+        self._release(job)
+
+    def cancel(self, job):
+        """
+        取消任务：排队中的任务直接移出队列，运行中的任务通知其工作线程停止，
+        线程结束后通过 finish 报告为已取消
+        返回: 是否发出了取消请求
+        """
+        if job.finished or job.cancel_token.cancelled:
+            return False
+        job.cancel_token.cancel()
+        if job.status == JOB_QUEUED:
+            self._queue.remove(job)
+            heapq.heapify(self._queue)
+            job.status = JOB_CANCELLED
+            self._release(job)
+        else:
+            job.status = JOB_CANCELLING
+            self.job_changed.emit(job)
+        return True
+
+    def get(self, job_id):
+        """按ID查找任务"""
+        return self._jobs.get(job_id)
+
+    def find(self, file_path):
+        """查找某个文件排队或运行中的任务"""
+        path = os.path.normcase(os.path.abspath(file_path))
+        for (kind, job_path), job in self._active.items():
+            if job_path == path:
+                return job
+        return None
+
+    def jobs(self):
+        """列表中的任务（排队、运行中以及最近完成的），按提交顺序"""
+        return list(self._jobs.values())
+
+    def pending_count(self):
+        """排队和运行中的任务数"""
+        return len(self._active)
+
+    def _mark_dirty(self, job):
+        self._dirty.add(job)
+        if not self._refresh_timer.isActive():
+            self._refresh_timer.start()
+
+    def _flush_updates(self):
+        """定时器回调：合并通知本周期内进度有变化的任务"""
+        dirty, self._dirty = self._dirty, set()
+        if not dirty:
+            self._refresh_timer.stop()
+            return
+        for job in dirty:
+            if not job.finished:
+                self.job_changed.emit(job)
+        self._emit_aggregate()
+
+    def _release(self, job):
+        self._running.discard(job)
+        self._dirty.discard(job)
+        if self._active.get(job.key) is job:
+            del self._active[job.key]
+        self.job_changed.emit(job)
+        self._prune_history()
+        self._schedule()
+        self._emit_aggregate()
+
+    def _on_thread_finished(self, job):
+        # 不清除 job.thread：finished 信号仍在投递时释放最后一个引用会销毁QThread对象，
+        # 线程对象随任务记录一起在 _prune_history 中释放
+        if not job.finished:
+            # 线程未报告结果就结束了
+            self.finish(job, error="任务异常结束")
+
+    def _schedule(self):
+        """在并发上限内按优先级启动排队的任务"""
+        while self._queue and len(self._running) < self.max_concurrent:
+            job = heapq.heappop(self._queue)
+            job.status = JOB_RUNNING
+            self._running.add(job)
+            try:
+                job.thread = job.thread_factory(job)
+                job.thread.finished.connect(lambda job=job: self._on_thread_finished(job))
+                job.thread.start()
+            except Exception as e:
+                print(f"启动任务失败 {job.file_path}: {e}")
+                job.thread = None
+                self.finish(job, error=str(e))
+                continue
+            self.job_changed.emit(job)
+
+    def _prune_history(self):
+        # 线程仍在运行的任务（已报告结果但run尚未返回）暂不移除，避免销毁运行中的QThread
+        finished = [job_id for job_id, job in self._jobs.items()
+                    if job.finished and (job.thread is None or job.thread.isFinished())]
+        if len(finished) > self.history:
+            for job_id in finished[:len(finished) - self.history]:
+                del self._jobs[job_id]
+            self.queue_changed.emit()
+
+    def _emit_aggregate(self):
+        stats = self.aggregate()
+        self.aggregate_progress.emit(stats["percent"])
+        self.aggregate_stats.emit(stats)
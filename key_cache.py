@@ -0,0 +1,167 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    from config import KEY_CACHE_CONFIG
+except ImportError:
+    KEY_CACHE_CONFIG = {
+        "enabled": True,
+        "max_entries": 256,
+        "ttl": 600,
+        "purge_interval": 30,
+        "public_key_ttl": 600,
+    }
+
+
+def _zeroize(buffer):
+    """将可变缓冲区的内容清零"""
+    if buffer is not None:
+        buffer[:] = bytes(len(buffer))
+
+
+class UnwrappedKeyCache:
+    """
+    服务器解密后的对称密钥的进程内LRU缓存
+    以 (user_id, 密钥密文) 的哈希为键，密钥保存在可变缓冲区中，
+    过期、淘汰或清空时将缓冲区清零。每次 get/put 时如距上次清理超过 purge_interval 秒，
+    先清除所有已过期的条目，过期的密钥不必等到再次被查询才清零；
+    长时间没有查询时由调用方定期调用 purge_expired()（如主窗口的定时器）
+
+    注意：清零只覆盖缓存自身持有的缓冲区。get() 返回的是不可变 bytes 副本，
+    调用方拿到的副本以及由它派生的对象（AES 上下文、进程池参数等）不受清零影响，
+    只能随垃圾回收释放
+    """
+
+    def __init__(self, max_entries=256, ttl=600, purge_interval=30, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self.clock = clock
+        # cache_key -> (key_buffer, salt_buffer, expires_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._next_purge = clock() + purge_interval
+
+    @staticmethod
+    def make_cache_key(user_id, encrypted_key):
+        """根据user_id和密钥密文生成缓存键"""
+        digest = hashlib.sha256()
+        digest.update(str(user_id).encode('utf-8'))
+        digest.update(b"\x00")
+        digest.update(encrypted_key)
+        return digest.digest()
+
+    def get(self, user_id, encrypted_key):
+        """
+        查询缓存
+        返回: (symmetric_key, salt) 元组，未命中或已过期时返回 (None, None)
+        返回值是缓冲区的 bytes 副本，之后的过期、淘汰或 forget_all() 无法将其清零
+        """
+        cache_key = self.make_cache_key(user_id, encrypted_key)
+        with self._lock:
+            now = self.clock()
+            self._maybe_purge(now)
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None, None
+            key_buffer, salt_buffer, expires_at = entry
+            if now >= expires_at:
+                self._evict(cache_key)
+                return None, None
+            self._entries.move_to_end(cache_key)
+            return bytes(key_buffer), bytes(salt_buffer) if salt_buffer is not None else None
+
+    def put(self, user_id, encrypted_key, symmetric_key, salt=None):
+        """写入缓存，超过容量时淘汰最久未使用的密钥"""
+        if self.max_entries <= 0:
+            return
+        cache_key = self.make_cache_key(user_id, encrypted_key)
+        with self._lock:
+            now = self.clock()
+            self._maybe_purge(now)
+            if cache_key in self._entries:
+                self._evict(cache_key)
+            self._entries[cache_key] = (
+                bytearray(symmetric_key),
+                bytearray(salt) if salt is not None else None,
+                now + self.ttl,
+            )
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def purge_expired(self):
+        """清除所有已过期的密钥，返回清除的条目数"""
+        with self._lock:
+            return self._purge(self.clock())
+
+    def forget_all(self):
+        """清零并清空所有缓存的密钥，返回清除的条目数"""
+        with self._lock:
+            count = len(self._entries)
+            for cache_key in list(self._entries):
+                self._evict(cache_key)
+            return count
+
+    def _maybe_purge(self, now):
+        """距上次清理超过 purge_interval 秒时清除已过期的条目（调用方需持有锁）"""
+        if now >= self._next_purge:
+            self._purge(now)
+
+    def _purge(self, now):
+        """清除已过期的条目（调用方需持有锁）"""
+        self._next_purge = now + self.purge_interval
+        expired = [cache_key for cache_key, entry in self._entries.items() if entry[2] <= now]
+        for cache_key in expired:
+            self._evict(cache_key)
+        return len(expired)
+
+    def _evict(self, cache_key):
+        """移除一个条目并清零其缓冲区（调用方需持有锁）"""
+        key_buffer, salt_buffer, _ = self._entries.pop(cache_key)
+        _zeroize(key_buffer)
+        _zeroize(salt_buffer)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class PublicKeyCache:
+    """服务器RSA公钥的进程内缓存，按user_id缓存，超过ttl秒后重新获取"""
+
+    def __init__(self, ttl=600):
+        self.ttl = ttl
+        self._entries = {}  # user_id -> (公钥, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """返回缓存的公钥，未命中或已过期时返回None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[1]:
+                del self._entries[user_id]
+                return None
+            return entry[0]
+
+    def put(self, user_id, public_key):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (public_key, time.monotonic() + self.ttl)
+
+    def forget_all(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# 全局密钥缓存实例
+unwrapped_key_cache = UnwrappedKeyCache(
+    max_entries=KEY_CACHE_CONFIG["max_entries"] if KEY_CACHE_CONFIG.get("enabled", True) else 0,
+    ttl=KEY_CACHE_CONFIG["ttl"],
+    purge_interval=KEY_CACHE_CONFIG.get("purge_interval", 30),
+)
+public_key_cache = PublicKeyCache(ttl=KEY_CACHE_CONFIG.get("public_key_ttl", 600))
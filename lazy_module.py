@@ -0,0 +1,37 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    延迟导入的模块代理
+    首次访问属性时才导入模块，之后直接转发到已导入的模块；用于 numpy、requests、加密库等
+    导入较慢、但不是每次运行都会用到的依赖，缩短程序启动时间
+    依赖未安装时在首次使用时（而不是导入本模块时）抛出 ImportError
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+                module = self._module
+        return module
+
+    @property
+    def loaded(self):
+        """模块是否已导入"""
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "已导入" if self._module is not None else "未导入"
+        return f"<LazyModule {self._name} ({state})>"
@@ -1,23 +1,40 @@
 import os
 import json
 import time
-import qrcode
-import requests
-import multiprocessing
-import concurrent.futures
-import numpy as np
-from Crypto.Cipher import AES, PKCS1_OAEP
-from Crypto.PublicKey import RSA
-from Crypto.Util.Padding import pad, unpad
+import atexit
+import contextlib
+import threading
+import importlib
 import uuid
 import base64
-import ctypes
+import hashlib
 import pickle
+import struct
 from functools import partial
+from collections import deque
+from key_cache import unwrapped_key_cache, public_key_cache
+from notification_outbox import get_notification_outbox
+from rpc_channel import call_server_rpc
+from cancellation import OperationCancelled
+from progress_reporter import ProgressReporter
+from prescan import PreApprovalScan, PRESCAN_CONFIG
+from enc_format import read_encrypted_file_info
+from lazy_module import LazyModule
+
+# 导入较慢的依赖在首次使用时才导入，导入 main 本身只加载标准库和本项目的小模块
+qrcode = LazyModule("qrcode")
+requests = LazyModule("requests")
+np = LazyModule("numpy")
+AES = LazyModule("Crypto.Cipher.AES")
+PKCS1_OAEP = LazyModule("Crypto.Cipher.PKCS1_OAEP")
+RSA = LazyModule("Crypto.PublicKey.RSA")
+Padding = LazyModule("Crypto.Util.Padding")
+multiprocessing = LazyModule("multiprocessing")
+concurrent_futures = LazyModule("concurrent.futures")
 
 # 导入配置文件
 try:
-    from config import SERVER_CONFIG, ENCRYPTION_CONFIG
+    from config import SERVER_CONFIG, ENCRYPTION_CONFIG, QR_CONFIG
 except ImportError:
     # 如果配置文件不存在，使用默认配置
     SERVER_CONFIG = {
@@ -28,9 +45,12 @@ except ImportError:
             "register_session": "/api/session/register",
             "check_approval": "/api/session/check/{session_id}",
             "encryption_completed": "/api/encryption/completed",
+            "encryption_completed_batch": "/api/encryption/completed_batch",
             "get_key": "/api/key/get",
             "decrypt_key": "/api/key/decrypt/{user_id}",
+            "decrypt_key_batch": "/api/key/decrypt_batch/{user_id}",
             "get_public_key": "/api/key/public/{user_id}",
+            "qr_token": "/api/qr/token",
             "websocket": "/ws",
         },
         "timeout": 5,
@@ -44,83 +64,224 @@ except ImportError:
         "rsa_key_size": 2048,
         "max_workers": None,
         "process_timeout": 300,
+        "unwrap_batch_size": 256,
+        "footer_read_workers": 16,
+        "inflight_per_worker": 2,
+        "progress_interval": 0.1,
+    }
+    QR_CONFIG = {
+        "payload_mode": "compact",
+        "compact_version": 5,
+        "max_name_bytes": 32,
     }
 
-try:
-    import aesni
-    HAS_AESNI = True
-except ImportError:
-    HAS_AESNI = False
-
-try:
-    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-    from cryptography.hazmat.backends import default_backend
-    from cryptography.hazmat.primitives import padding
-    HAS_CRYPTOGRAPHY = True
-except ImportError:
-    HAS_CRYPTOGRAPHY = False
-
-# 检测并加载加速库
+# --- 加密后端检测 ---
+# 加速库路径；是否可用在首次加密时检测（probe_backends），不在导入时加载DLL
 ACCEL_LIB_DIR = os.path.join(os.path.dirname(__file__), 'accel_libs')
 CUDA_DLL = os.path.join(ACCEL_LIB_DIR, 'cuda', 'aes_cuda.dll')
 OPENCL_DLL = os.path.join(ACCEL_LIB_DIR, 'opencl', 'aes_opencl.dll')
 
-HAS_CUDA_LIB = os.path.exists(CUDA_DLL)
-HAS_OPENCL_LIB = os.path.exists(OPENCL_DLL)
-
-if HAS_CUDA_LIB:
-    cuda_lib = ctypes.CDLL(CUDA_DLL)
-    def encrypt_chunk_cuda(chunk_data, key, iv):
-        in_buf = (ctypes.c_ubyte * len(chunk_data)).from_buffer_copy(chunk_data)
-        out_buf = (ctypes.c_ubyte * len(chunk_data))()
-        key_buf = (ctypes.c_ubyte * 16).from_buffer_copy(key)
-        iv_buf = (ctypes.c_ubyte * 16).from_buffer_copy(iv)
-        cuda_lib.aes_encrypt_cbc(in_buf, out_buf, ctypes.c_int(len(chunk_data)), key_buf, iv_buf)
-        return bytes(out_buf)
-else:
-    def encrypt_chunk_cuda(chunk_data, key, iv):
-        return None
+_backends = None
+_backends_lock = threading.Lock()
 
-if HAS_OPENCL_LIB:
-    opencl_lib = ctypes.CDLL(OPENCL_DLL)
-    def encrypt_chunk_opencl(chunk_data, key, iv):
-        in_buf = (ctypes.c_ubyte * len(chunk_data)).from_buffer_copy(chunk_data)
-        out_buf = (ctypes.c_ubyte * len(chunk_data))()
-        key_buf = (ctypes.c_ubyte * 16).from_buffer_copy(key)
-        iv_buf = (ctypes.c_ubyte * 16).from_buffer_copy(iv)
-        opencl_lib.aes_encrypt_cbc(in_buf, out_buf, ctypes.c_int(len(chunk_data)), key_buf, iv_buf)
-        return bytes(out_buf)
-else:
-    def encrypt_chunk_opencl(chunk_data, key, iv):
-        return None
+def probe_backends():
+    """
+    检测可用的加密后端，首次调用时检测并缓存结果（每个进程一次）
+    返回: {"aesni": aesni模块或None, "cryptography": 是否安装了cryptography,
+           "cuda": CUDA加速库或None, "opencl": OpenCL加速库或None}
+    """
+    global _backends
+    if _backends is not None:
+        return _backends
+    with _backends_lock:
+        if _backends is None:
+            backends = {"aesni": None, "cryptography": False, "cuda": None, "opencl": None}
+            try:
+                backends["aesni"] = importlib.import_module("aesni")
+            except ImportError:
+                pass
+            try:
+                importlib.import_module("cryptography.hazmat.primitives.ciphers")
+                backends["cryptography"] = True
+            except ImportError:
+                pass
+            for name, dll_path in (("cuda", CUDA_DLL), ("opencl", OPENCL_DLL)):
+                if os.path.exists(dll_path):
+                    try:
+                        import ctypes
+                        backends[name] = ctypes.CDLL(dll_path)
+                    except OSError as e:
+                        print(f"加载加速库失败 {dll_path}: {e}")
+            _backends = backends
+    return _backends
 
 # --- 生成二维码（唯一保留） ---
+# 紧凑二维码内容: 前缀 + base45(二进制)，只含QR字母数字模式的字符
+COMPACT_QR_PREFIX = "SD:"
+TOKEN_QR_PREFIX = "SDT:"
+COMPACT_QR_FORMAT = 1
+BASE45_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+
+def base45_encode(data):
+    """base45编码（RFC 9285）"""
+    chars = []
+    for i in range(0, len(data) - 1, 2):
+        value = data[i] * 256 + data[i + 1]
+        value, c = divmod(value, 45)
+        e, d = divmod(value, 45)
+        chars.extend((BASE45_ALPHABET[c], BASE45_ALPHABET[d], BASE45_ALPHABET[e]))
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        chars.extend((BASE45_ALPHABET[c], BASE45_ALPHABET[d]))
+    return "".join(chars)
+
+def base45_decode(text):
+    """base45解码（RFC 9285）"""
+    values = [BASE45_ALPHABET.index(ch) for ch in text]
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        group = values[i:i + 3]
+        if len(group) == 3:
+            out.extend(divmod(group[0] + group[1] * 45 + group[2] * 2025, 256))
+        else:
+            out.append(group[0] + group[1] * 45)
+    return bytes(out)
+
+def _qr_file_info(file_path, session_id, timestamp):
+    return {
+        "file_path": file_path,
+        "file_name": os.path.basename(file_path),
+        "file_size": os.path.getsize(file_path),
+        "session_id": session_id,
+        "timestamp": int(time.time()) if timestamp is None else timestamp
+    }
+
+def encode_compact_qr_payload(qr_info):
+    """
+    将文件信息编码为长度有上限的紧凑二维码内容，与路径长度无关
+    二进制结构: 格式版本(1) 标志(1) session_id(UUID 16字节，或 长度1+UTF-8)
+    时间戳(4) 文件大小(8) 完整路径SHA-256前8字节 文件名长度(1)+截断的UTF-8文件名
+    """
+    flags = 0
+    try:
+        session_bytes = uuid.UUID(str(qr_info["session_id"])).bytes
+        flags |= 0x01
+    except ValueError:
+        raw = str(qr_info["session_id"]).encode("utf-8")[:36]
+        session_bytes = bytes([len(raw)]) + raw
+    # 按字节截断文件名，丢弃被截断的不完整字符
+    name = qr_info["file_name"].encode("utf-8")[:QR_CONFIG["max_name_bytes"]]
+    name = name.decode("utf-8", "ignore").encode("utf-8")
+    path_digest = hashlib.sha256(qr_info["file_path"].encode("utf-8")).digest()[:8]
+    data = (
+        bytes([COMPACT_QR_FORMAT, flags]) + session_bytes
+        + struct.pack(">IQ", qr_info["timestamp"] & 0xFFFFFFFF, qr_info["file_size"])
+        + path_digest + bytes([len(name)]) + name
+    )
+    return COMPACT_QR_PREFIX + base45_encode(data)
+
+def decode_compact_qr_payload(payload):
+    """
+    解析紧凑二维码内容
+    返回: 包含 session_id、timestamp、file_size、path_digest(hex)、file_name 的字典，格式不符时返回None
+    """
+    try:
+        if not payload.startswith(COMPACT_QR_PREFIX):
+            return None
+        data = base45_decode(payload[len(COMPACT_QR_PREFIX):])
+        if data[0] != COMPACT_QR_FORMAT:
+            return None
+        flags, pos = data[1], 2
+        if flags & 0x01:
+            session_id = str(uuid.UUID(bytes=data[pos:pos + 16]))
+            pos += 16
+        else:
+            session_id = data[pos + 1:pos + 1 + data[pos]].decode("utf-8")
+            pos += 1 + data[pos]
+        timestamp, file_size = struct.unpack_from(">IQ", data, pos)
+        pos += 12
+        path_digest = data[pos:pos + 8].hex()
+        pos += 8
+        file_name = data[pos + 1:pos + 1 + data[pos]].decode("utf-8")
+        return {
+            "session_id": session_id,
+            "timestamp": timestamp,
+            "file_size": file_size,
+            "path_digest": path_digest,
+            "file_name": file_name,
+        }
+    except Exception as e:
+        print(f"解析二维码内容时出错: {e}")
+        return None
+
+def request_qr_token(qr_info):
+    """向服务器登记二维码对应的完整文件信息，返回短令牌，失败时返回None"""
+    data = call_server_rpc("qr.token", qr_info)
+    if data is None:
+        try:
+            response = requests.post(
+                f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['qr_token']}",
+                json=qr_info,
+                timeout=SERVER_CONFIG["timeout"]
+            )
+            if response.status_code != 200:
+                print(f"获取二维码令牌失败，状态码: {response.status_code}")
+                return None
+            data = response.json()
+        except Exception as e:
+            print(f"获取二维码令牌时出错: {e}")
+            return None
+    return data.get("token") if isinstance(data, dict) else None
+
+def build_qr_payload(file_path, session_id, timestamp=None, mode=None):
+    """
+    生成二维码内容
+    mode: "token" 服务器短令牌，失败时回退到compact；"compact" 紧凑二进制+base45；
+          "json" 完整JSON字符串。默认使用 QR_CONFIG["payload_mode"]
+    timestamp: 生成时间，默认为当前时间
+    """
+    qr_info = _qr_file_info(file_path, session_id, timestamp)
+    mode = mode or QR_CONFIG.get("payload_mode", "compact")
+    if mode == "json":
+        return json.dumps(qr_info, ensure_ascii=False)
+    if mode == "token":
+        token = request_qr_token(qr_info)
+        if token:
+            return TOKEN_QR_PREFIX + token
+    return encode_compact_qr_payload(qr_info)
+
+def make_qr_matrix(payload, border=4):
+    """
+    将二维码内容编码为模块矩阵（不生成图像）
+    紧凑格式使用固定版本，二维码尺寸不随文件路径变化
+    返回: 二维列表，True表示黑色模块，包含 border 宽的空白边框
+    """
+    compact = payload.startswith(COMPACT_QR_PREFIX)
+    qr = qrcode.QRCode(
+        version=QR_CONFIG.get("compact_version", 5) if compact else 1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        border=border,
+    )
+    qr.add_data(payload)
+    qr.make(fit=not compact)
+    return qr.get_matrix()
+
 def generate_qr_code(file_path, session_id):
     """
-    生成包含文件信息和session_id的二维码
+    生成包含文件信息和session_id的二维码并保存为PNG
+    界面显示请使用 gui.render_qr_image 在内存中渲染，不经过磁盘
     file_path: 文件路径
     session_id: 会话ID
     返回: 生成的二维码图片路径
     """
     try:
-        import os, time, json, qrcode
-        file_name = os.path.basename(file_path)
-        file_size = os.path.getsize(file_path)
-        qr_info = {
-            "file_path": file_path,
-            "file_name": file_name,
-            "file_size": file_size,
-            "session_id": session_id,
-            "timestamp": int(time.time())
-        }
-        data = json.dumps(qr_info, ensure_ascii=False)
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
             box_size=10,
             border=4,
         )
-        qr.add_data(data)
+        qr.add_data(build_qr_payload(file_path, session_id))
         qr.make(fit=True)
         img = qr.make_image(fill_color="black", back_color="white")
         qr_path = f"qr_session_{session_id}.png"
@@ -166,6 +327,16 @@ def poll_server_for_approval(session_id, timeout=60, interval=2):
     
     while time.time() - start_time < timeout:
         try:
+            # 优先通过WebSocket RPC查询，未连接时使用HTTP
+            rpc_result = call_server_rpc("session.check", {"session_id": session_id})
+            if rpc_result is not None:
+                if rpc_result.get("approved", False):
+                    symmetric_key = bytes.fromhex(rpc_result.get("symmetric_key", ""))
+                    salt = bytes.fromhex(rpc_result["salt"]) if rpc_result.get("salt") else None
+                    return True, symmetric_key, salt
+                time.sleep(interval)
+                continue
+            
             url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['check_approval']}/{session_id}"
             response = requests.get(url, timeout=SERVER_CONFIG['timeout'])
             
@@ -187,18 +358,67 @@ def poll_server_for_approval(session_id, timeout=60, interval=2):
     # 超时返回未确认
     return False, None, None
 
+# --- 会话注册与服务器检查（在工作线程中调用） ---
+def register_server_session(client_id="pc_client"):
+    """
+    在服务器注册新会话
+    返回: session_id，失败时返回None
+    """
+    try:
+        # 优先通过WebSocket RPC注册，未连接时使用HTTP
+        data = call_server_rpc("session.register", {"client_id": client_id})
+        if data is None:
+            url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['register_session']}"
+            response = requests.post(url, timeout=SERVER_CONFIG['timeout'])
+            if response.status_code != 200:
+                print(f"注册会话失败，状态码: {response.status_code}")
+                return None
+            data = response.json()
+        session_id = data.get("session_id") if data else None
+        if not session_id:
+            print("服务器未返回session_id")
+        return session_id
+    except Exception as e:
+        print(f"注册会话时出错: {e}")
+        return None
+
+def check_server_health():
+    """
+    通过HTTP健康检查接口检查服务器是否可用
+    返回: (是否可用, 说明信息)
+    """
+    test_url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['health']}"
+    try:
+        response = requests.get(test_url, timeout=SERVER_CONFIG['timeout'])
+        if response.status_code == 200:
+            return True, "HTTP连接成功"
+        return False, f"HTTP连接失败，状态码: {response.status_code}"
+    except requests.exceptions.Timeout:
+        return False, "HTTP连接超时"
+    except requests.exceptions.ConnectionError:
+        return False, "HTTP连接错误：无法连接到服务器"
+    except Exception as e:
+        return False, f"HTTP连接失败：{str(e)}"
+
 # --- 改进加密流程，配合移动端确认 ---
-def aes_encrypt_file_with_mobile_confirmation(file_path, progress_callback=None, acceleration_method=None, thread_count=None):
+def aes_encrypt_file_with_mobile_confirmation(file_path, progress_callback=None, acceleration_method=None, thread_count=None,
+                                              user_id="default_user", session_id=None):
     """
     通过移动端确认后对文件进行加密，密钥只从服务器获取
     file_path: 要加密的文件路径
     progress_callback: 进度回调函数
     acceleration_method: 加速方式
     thread_count: 线程数
+    session_id: 会话ID，默认生成新的UUID
+    等待确认期间在后台预扫描文件（见 prescan.PreApprovalScan），并提前获取公钥、创建进程池，
+    确认后只需进行AES加密
     """
+    scan = None
     try:
+        session_id = session_id or str(uuid.uuid4())
+        
         # 生成带会话ID的二维码
-        qr_path = generate_qr_code(file_path, 3344)#session_id
+        qr_path = generate_qr_code(file_path, session_id)
         
         # 提示用户扫描二维码
         print(f"请使用移动端扫描二维码确认加密操作: {qr_path}")
@@ -206,6 +426,15 @@ def aes_encrypt_file_with_mobile_confirmation(file_path, progress_callback=None,
         if progress_callback:
             progress_callback(5)  # 生成二维码完成，进度5%
         
+        # 等待确认期间预扫描文件、获取公钥并创建进程池
+        if PRESCAN_CONFIG.get("enabled", True):
+            scan = PreApprovalScan(file_path).start()
+        rsa_public_key = get_user_public_key_from_server(user_id)
+        if rsa_public_key is None:
+            print("无法获取服务器公钥，无法保存服务器提供的密钥，操作已取消")
+            return None
+        pool = get_shared_pool(thread_count)
+        
         # 轮询服务器等待用户确认
         confirmed, symmetric_key, salt = poll_server_for_approval(session_id)
         
@@ -218,16 +447,27 @@ def aes_encrypt_file_with_mobile_confirmation(file_path, progress_callback=None,
         if progress_callback:
             progress_callback(10)  # 用户确认完成，进度10%
         
+        if scan is not None:
+            # 确认后停止继续预扫描，已缓存的数据块直接用于加密
+            scan.stop()
+            scan.wait()
+            print(f"预扫描统计: {scan.stats()}")
+        
         # 如果用户已确认且获取了对称密钥，进行加密
         print("用户已确认加密操作，服务器已提供加密密钥，开始加密...")
         
         # 调用原有的加密函数完成加密，不允许生成随机密钥
         encrypted_file_path = aes_encrypt_file(
-            file_path, 
+            file_path,
+            user_id,
             symmetric_key=symmetric_key,  # 只使用从服务器获取的密钥
+            salt=salt,
             progress_callback=lambda p: progress_callback(10 + int(p * 0.9)) if progress_callback else None,  # 调整进度比例
             acceleration_method=acceleration_method,
-            thread_count=thread_count
+            thread_count=thread_count,
+            rsa_public_key=rsa_public_key,
+            pool=pool,
+            prescan=scan
             # 明确不传递password参数，确保只使用服务器提供的密钥
         )
         
@@ -248,35 +488,30 @@ def aes_encrypt_file_with_mobile_confirmation(file_path, progress_callback=None,
         if progress_callback:
             progress_callback(0)  # 重置进度条
         return None
+    finally:
+        if scan is not None:
+            scan.cancel()
 
 # --- 通知服务器加密已完成 ---
 def notify_encryption_completed(session_id, encrypted_file_path):
-    """通知服务器加密已完成"""
+    """
+    通知服务器加密已完成
+    通知写入本地发件箱后立即返回，由后台线程批量发送，服务器不可用时自动重试
+    """
     try:
         file_name = os.path.basename(encrypted_file_path)
         file_size = os.path.getsize(encrypted_file_path)
         
-        url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['encryption_completed']}"
-        response = requests.post(
-            url,
-            json={
-                "session_id": session_id,
-                "encrypted_file_name": file_name,
-                "encrypted_file_size": file_size,
-                "status": "completed",
-                "timestamp": int(time.time())
-            },
-            timeout=SERVER_CONFIG['timeout']
-        )
-        
-        if response.status_code == 200:
-            print("已通知服务器加密完成")
-            return True
-        else:
-            print(f"通知服务器失败，状态码: {response.status_code}")
-            return False
+        get_notification_outbox().enqueue({
+            "session_id": session_id,
+            "encrypted_file_name": file_name,
+            "encrypted_file_size": file_size,
+            "status": "completed",
+            "timestamp": int(time.time())
+        })
+        return True
     except Exception as e:
-        print(f"通知服务器时出错: {e}")
+        print(f"写入加密完成通知时出错: {e}")
         return False
 
 # --- 模拟与服务器通信，获取对称密钥 ---
@@ -305,12 +540,14 @@ def get_symmetric_key_from_server(file_info, rsa_public_key):
 # --- 使用CUDA加速加密数据块 ---
 def encrypt_chunk_cuda(chunk_data, key, iv):
     """使用CUDA加速加密数据块"""
-    if not HAS_CUDA_LIB:
+    cuda_lib = probe_backends()["cuda"]
+    if cuda_lib is None:
         return None
     
     try:
+        import ctypes
         # 确保数据长度是16的倍数（AES块大小）
-        padded_data = pad(chunk_data, AES.block_size)
+        padded_data = Padding.pad(chunk_data, AES.block_size)
         data_len = len(padded_data)
         
         # 创建输入和输出缓冲区
@@ -349,12 +586,14 @@ def encrypt_chunk_cuda(chunk_data, key, iv):
 # --- 使用OpenCL加速加密数据块 ---
 def encrypt_chunk_opencl(chunk_data, key, iv):
     """使用OpenCL加速加密数据块"""
-    if not HAS_OPENCL_LIB:
+    opencl_lib = probe_backends()["opencl"]
+    if opencl_lib is None:
         return None
     
     try:
+        import ctypes
         # 确保数据长度是16的倍数（AES块大小）
-        padded_data = pad(chunk_data, AES.block_size)
+        padded_data = Padding.pad(chunk_data, AES.block_size)
         data_len = len(padded_data)
         
         # 创建输入和输出缓冲区
@@ -393,27 +632,32 @@ def encrypt_chunk_opencl(chunk_data, key, iv):
 def encrypt_chunk_aesni(chunk, key, iv):
     """使用AES-NI指令集加密数据块"""
     try:
-        if HAS_AESNI:
+        aesni = probe_backends()["aesni"]
+        if aesni is not None:
             # 使用aesni库进行加密
+            from cryptography.hazmat.primitives import padding
             padder = padding.PKCS7(128).padder()
             padded_data = padder.update(chunk) + padder.finalize()
             return aesni.encrypt(padded_data, key, iv)
         else:
             # 回退到PyCryptodome
             cipher = AES.new(key, AES.MODE_CBC, iv)
-            return cipher.encrypt(pad(chunk, AES.block_size))
+            return cipher.encrypt(Padding.pad(chunk, AES.block_size))
     except Exception as e:
         print(f"AES-NI加密出错: {e}")
         # 回退到PyCryptodome
         cipher = AES.new(key, AES.MODE_CBC, iv)
-        return cipher.encrypt(pad(chunk, AES.block_size))
+        return cipher.encrypt(Padding.pad(chunk, AES.block_size))
 
 # --- 使用cryptography库的硬件加速加密块数据 ---
 def encrypt_chunk_cryptography(chunk, key, iv):
     """使用cryptography库加密数据块,可能会利用OpenSSL的硬件加速"""
     try:
-        if HAS_CRYPTOGRAPHY:
+        if probe_backends()["cryptography"]:
             # 使用cryptography库进行加密
+            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+            from cryptography.hazmat.backends import default_backend
+            from cryptography.hazmat.primitives import padding
             padder = padding.PKCS7(128).padder()
             padded_data = padder.update(chunk) + padder.finalize()
             encryptor = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend()).encryptor()
@@ -421,12 +665,12 @@ def encrypt_chunk_cryptography(chunk, key, iv):
         else:
             # 回退到PyCryptodome
             cipher = AES.new(key, AES.MODE_CBC, iv)
-            return cipher.encrypt(pad(chunk, AES.block_size))
+            return cipher.encrypt(Padding.pad(chunk, AES.block_size))
     except Exception as e:
         print(f"cryptography加密出错: {e}")
         # 回退到PyCryptodome
         cipher = AES.new(key, AES.MODE_CBC, iv)
-        return cipher.encrypt(pad(chunk, AES.block_size))
+        return cipher.encrypt(Padding.pad(chunk, AES.block_size))
 
 # --- 加密单个数据块 ---
 def encrypt_chunk(chunk_data, key, iv, chunk_index):
@@ -434,27 +678,28 @@ def encrypt_chunk(chunk_data, key, iv, chunk_index):
     try:
         # 为每个块使用不同的IV（通过XOR操作原始IV和块索引）
         block_iv = bytes(x ^ y for x, y in zip(iv, chunk_index.to_bytes(16, byteorder='big')))
+        backends = probe_backends()
         
         # 尝试使用GPU加速
-        if HAS_CUDA_LIB:
+        if backends["cuda"] is not None:
             encrypted_chunk = encrypt_chunk_cuda(chunk_data, key, block_iv)
             if encrypted_chunk:
                 return (chunk_index, encrypted_chunk, block_iv)
         
-        if HAS_OPENCL_LIB:
+        if backends["opencl"] is not None:
             encrypted_chunk = encrypt_chunk_opencl(chunk_data, key, block_iv)
             if encrypted_chunk:
                 return (chunk_index, encrypted_chunk, block_iv)
         
         # 尝试使用CPU硬件加速
-        if HAS_AESNI:
+        if backends["aesni"] is not None:
             encrypted_chunk = encrypt_chunk_aesni(chunk_data, key, block_iv)
-        elif HAS_CRYPTOGRAPHY:
+        elif backends["cryptography"]:
             encrypted_chunk = encrypt_chunk_cryptography(chunk_data, key, block_iv)
         else:
             # 使用PyCryptodome
             cipher = AES.new(key, AES.MODE_CBC, block_iv)
-            encrypted_chunk = cipher.encrypt(pad(chunk_data, AES.block_size))
+            encrypted_chunk = cipher.encrypt(Padding.pad(chunk_data, AES.block_size))
         
         return (chunk_index, encrypted_chunk, block_iv)
     except Exception as e:
@@ -462,10 +707,42 @@ def encrypt_chunk(chunk_data, key, iv, chunk_index):
         return None
 
 # --- 使用AES对文件进行加密（带硬件加速和多进程）---
-def aes_encrypt_file(file_path, user_id, progress_callback=None, acceleration_method=None, thread_count=None, password=None):
+def _remove_partial_file(path):
+    """删除未完成的输出文件"""
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        print(f"删除未完成的文件失败 {path}: {e}")
+
+def _wait_for_task(task, cancel_token=None, timeout=None):
+    """
+    等待进程池任务完成，期间定期检查取消标记
+    已取消时抛出 OperationCancelled，超时抛出 multiprocessing.TimeoutError
+    """
+    deadline = time.monotonic() + timeout if timeout else None
+    while not task.ready():
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        if deadline is not None and time.monotonic() >= deadline:
+            raise multiprocessing.TimeoutError("进程池任务超时")
+        task.wait(0.1)
+    return task.get()
+
+def aes_encrypt_file(file_path, user_id, progress_callback=None, acceleration_method=None, thread_count=None, password=None, session=None, rsa_public_key=None, pool=None, cancel_token=None, stats_callback=None,
+                     symmetric_key=None, salt=None, prescan=None):
     """
     对指定文件使用AES CBC模式进行加密，并保存为 .enc 文件
     支持多进程并行加密
+    session: 可选的 EncryptionSession，指定时文件密钥由会话主密钥派生，不再单独进行RSA包装
+    rsa_public_key: 可选的已获取的服务器公钥，指定时不再请求服务器
+    pool: 可选的进程池（如 get_shared_pool()），指定时不再单独创建进程池，thread_count 不再生效
+    cancel_token: 可选的 CancellationToken，取消后停止读取和提交数据块，删除未完成的 .enc 文件并返回None；
+                  进程池中最多还有一个窗口的数据块会执行完毕
+    progress_callback / stats_callback: 按数据块完成（不论顺序）统计进度，最多每 progress_interval 秒调用一次，
+                  stats_callback 额外提供速度和剩余时间，见 progress_reporter.ProgressReporter
+    symmetric_key / salt: 可选的服务器提供的对称密钥，指定时不在本地生成密钥，也不回退到本地加密模式
+    prescan: 可选的 PreApprovalScan，文件未被修改时直接使用其缓存的数据块，不再读取文件
     """
     try:
         # 检查文件是否存在
@@ -473,28 +750,39 @@ def aes_encrypt_file(file_path, user_id, progress_callback=None, acceleration_me
             print(f"文件不存在: {file_path}")
             return None
         
-        # 1. 获取服务器公钥
-        try:
-            rsa_public_key = get_user_public_key_from_server(user_id)
-            if rsa_public_key is None:
-                print("无法获取服务器公钥，使用本地加密模式")
-                # 如果无法获取服务器公钥，使用本地加密模式
+        if session is not None:
+            # 会话模式：IV同时作为文件随机数，用HKDF从会话主密钥派生文件密钥
+            iv = os.urandom(16)
+            symmetric_key = session.derive_file_key(iv)
+            encrypted_key = None
+        else:
+            # 1. 获取服务器公钥
+            try:
+                if rsa_public_key is None:
+                    rsa_public_key = get_user_public_key_from_server(user_id)
+                if rsa_public_key is None and symmetric_key is not None:
+                    print("无法获取服务器公钥，无法保存服务器提供的密钥")
+                    return None
+                if rsa_public_key is None:
+                    print("无法获取服务器公钥，使用本地加密模式")
+                    # 如果无法获取服务器公钥，使用本地加密模式
+                    return encrypt_locally(file_path, password, progress_callback)
+            except Exception as e:
+                print(f"获取服务器公钥失败: {e}，使用本地加密模式")
                 return encrypt_locally(file_path, password, progress_callback)
-        except Exception as e:
-            print(f"获取服务器公钥失败: {e}，使用本地加密模式")
-            return encrypt_locally(file_path, password, progress_callback)
-        
-        # 2. 本地生成对称密钥
-        symmetric_key, salt = generate_custom_symmetric_key(password)
-        
-        # 3. 用公钥加密对称密钥
-        encrypted_key = encrypt_symmetric_key(symmetric_key, salt, rsa_public_key)
-        if encrypted_key is None:
-            print("加密对称密钥失败")
-            return None
-        
-        # 4. 生成随机IV
-        iv = os.urandom(16)
+            
+            # 2. 本地生成对称密钥（未由服务器提供时）
+            if symmetric_key is None:
+                symmetric_key, salt = generate_custom_symmetric_key(password)
+            
+            # 3. 用公钥加密对称密钥
+            encrypted_key = encrypt_symmetric_key(symmetric_key, salt, rsa_public_key)
+            if encrypted_key is None:
+                print("加密对称密钥失败")
+                return None
+            
+            # 4. 生成随机IV
+            iv = os.urandom(16)
         
         # 5. 获取文件大小
         file_size = os.path.getsize(file_path)
@@ -509,89 +797,167 @@ def aes_encrypt_file(file_path, user_id, progress_callback=None, acceleration_me
         
         print(f"使用 {max_workers} 个进程进行加密")
         
-        # 7. 读取文件分块
-        chunks = []
-        try:
-            with open(file_path, 'rb') as in_file:
-                chunk_index = 0
-                while True:
-                    chunk = in_file.read(chunk_size)
-                    if not chunk:
-                        break
-                    chunks.append((chunk, chunk_index))
-                    chunk_index += 1
-        except Exception as e:
-            print(f"读取文件失败: {e}")
-            return None
-        
-        total_chunks = len(chunks)
-        
-        # 8. 使用多进程并行加密
+        # 7. 流式并行加密：边读边提交，在途数据块不超过窗口大小，按顺序写出，
+        # 内存占用与文件大小无关，取消时只需等待窗口内的数据块
+        window = max_workers * ENCRYPTION_CONFIG.get("inflight_per_worker", 2)
+        total_chunks = (file_size + chunk_size - 1) // chunk_size
         encrypted_file_path = file_path + ".enc"
+        reporter = ProgressReporter(file_size, progress_callback, stats_callback)
+        if prescan is not None and (prescan.chunk_size != chunk_size or not prescan.is_valid()):
+            print("预扫描后文件已被修改，忽略预扫描结果")
+            prescan.release()
+            prescan = None
         
         try:
-            with open(encrypted_file_path, 'wb') as out_file:
+            with open(file_path, 'rb') as in_file, open(encrypted_file_path, 'wb') as out_file:
                 # 写入文件头
                 out_file.write(iv)
                 out_file.write(file_size.to_bytes(8, byteorder='big'))
                 
-                # 使用进程池进行并行加密
-                with multiprocessing.Pool(processes=max_workers) as pool:
-                    # 准备加密任务
-                    encrypt_tasks = []
-                    for chunk, index in chunks:
-                        task = pool.apply_async(
-                            encrypt_chunk_process, 
-                            (chunk, symmetric_key, iv, index, acceleration_method)
-                        )
-                        encrypt_tasks.append((index, task))
-                    
-                    # 收集加密结果
-                    encrypted_chunks = {}
-                    completed_chunks = 0
-                    
-                    for index, task in encrypt_tasks:
-                        try:
-                            result = task.get(timeout=ENCRYPTION_CONFIG["process_timeout"])
-                            if result:
-                                chunk_index, encrypted_chunk, _ = result
-                                encrypted_chunks[chunk_index] = encrypted_chunk
-                            completed_chunks += 1
-                            
-                            if progress_callback:
-                                progress_percent = int(completed_chunks * 100 / total_chunks)
-                                progress_callback(progress_percent)
-                                
-                        except Exception as e:
-                            print(f"加密块 {index} 失败: {e}")
-                            return None
-                    
-                    # 按顺序写入加密数据
-                    for i in range(len(chunks)):
-                        if i in encrypted_chunks:
-                            out_file.write(encrypted_chunks[i])
-                        else:
-                            print(f"缺少加密块 {i}")
-                            return None
+                # 使用进程池进行并行加密，传入共享进程池时不在结束时关闭它
+                pool_context = multiprocessing.Pool(processes=max_workers) if pool is None else contextlib.nullcontext(pool)
+                with pool_context as pool:
+                    in_flight = deque()
+                    next_index = 0
+                    while True:
+                        # 补充在途任务
+                        while len(in_flight) < window and next_index < total_chunks:
+                            if cancel_token is not None:
+                                cancel_token.raise_if_cancelled()
+                            chunk = prescan.take_chunk(next_index) if prescan is not None else None
+                            if chunk is None:
+                                chunk = in_file.read(chunk_size)
+                            else:
+                                in_file.seek(len(chunk), os.SEEK_CUR)
+                            # 进度在数据块完成时（进程池结果线程中）统计，不受按顺序写出的影响
+                            task = pool.apply_async(
+                                encrypt_chunk_process,
+                                (chunk, symmetric_key, iv, next_index, acceleration_method),
+                                callback=lambda result, nbytes=len(chunk): _advance_progress(reporter, nbytes)
+                            )
+                            in_flight.append((next_index, task))
+                            next_index += 1
+                        if not in_flight:
+                            break
+                        
+                        # 按顺序写入最早提交的数据块
+                        index, task = in_flight.popleft()
+                        result = _wait_for_task(task, cancel_token, ENCRYPTION_CONFIG["process_timeout"])
+                        if not result:
+                            raise ValueError(f"加密块 {index} 失败")
+                        out_file.write(result[1])
                 
-                # 写入加密后的对称密钥长度
-                out_file.write(len(encrypted_key).to_bytes(4, byteorder='big'))
-                # 写入加密后的对称密钥
-                out_file.write(encrypted_key)
-                # 写入标记
-                out_file.write(b"ENCRYPTED")
+                if session is not None:
+                    # 写入会话主密钥密文、会话密钥ID及密文长度
+                    out_file.write(session.wrapped_key)
+                    out_file.write(session.key_id)
+                    out_file.write(len(session.wrapped_key).to_bytes(4, byteorder='big'))
+                    out_file.write(b"SESSION_ENCRYPTED")
+                else:
+                    # 写入加密后的对称密钥及其长度（读取时从标记向前定位长度字段）
+                    out_file.write(encrypted_key)
+                    out_file.write(len(encrypted_key).to_bytes(4, byteorder='big'))
+                    # 写入标记
+                    out_file.write(b"ENCRYPTED")
             
+            reporter.finish()
             print(f"文件已加密，保存为: {encrypted_file_path}")
             return encrypted_file_path
             
+        except OperationCancelled:
+            print(f"加密已取消: {file_path}")
+            _remove_partial_file(encrypted_file_path)
+            return None
         except Exception as e:
             print(f"写入加密文件失败: {e}")
+            _remove_partial_file(encrypted_file_path)
             return None
         
     except Exception as e:
         print("加密过程中出错:", e)
         return None
 
+# --- 共享进程池 ---
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_shared_pool(processes=None):
+    """
+    获取全局共享的加密进程池，首次调用时创建
+    多个并发任务提交到同一个进程池，总进程数不随任务数增加；
+    processes 只在首次创建时生效，默认为 ENCRYPTION_CONFIG["max_workers"] 或CPU核心数
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            processes = processes or ENCRYPTION_CONFIG["max_workers"] or multiprocessing.cpu_count()
+            _shared_pool = multiprocessing.Pool(processes=processes)
+            print(f"已创建共享进程池，{processes} 个进程")
+        return _shared_pool
+
+def shutdown_shared_pool():
+    """关闭共享进程池"""
+    global _shared_pool
+    with _shared_pool_lock:
+        pool, _shared_pool = _shared_pool, None
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+
+atexit.register(shutdown_shared_pool)
+
+# --- 会话数据密钥 ---
+class EncryptionSession:
+    """
+    批量加密会话
+    整个会话只生成一个主密钥并用RSA公钥包装一次，每个文件的密钥由主密钥和
+    文件头中的IV通过HKDF派生，解密时每个会话只需向服务器请求一次解密
+    """
+    
+    def __init__(self, master_key, wrapped_key):
+        self.master_key = master_key
+        self.wrapped_key = wrapped_key
+        # 会话密钥ID，写入每个文件尾部用于引用主密钥
+        self.key_id = hashlib.sha256(wrapped_key).digest()[:16]
+    
+    def derive_file_key(self, file_nonce):
+        """根据文件随机数派生该文件的对称密钥"""
+        return derive_file_key(self.master_key, file_nonce, self.key_id)
+
+def derive_file_key(master_key, file_nonce, key_id):
+    """使用HKDF-SHA256从会话主密钥派生单个文件的密钥"""
+    from Crypto.Protocol.KDF import HKDF
+    from Crypto.Hash import SHA256
+    return HKDF(master_key, ENCRYPTION_CONFIG["key_size"], salt=file_nonce, hashmod=SHA256,
+                context=b"file-key" + key_id)
+
+def create_encryption_session(user_id, password=None):
+    """
+    创建批量加密会话：获取服务器公钥，生成并包装会话主密钥
+    返回: EncryptionSession，失败时返回None
+    """
+    try:
+        rsa_public_key = get_user_public_key_from_server(user_id)
+        if rsa_public_key is None:
+            print("无法获取服务器公钥，无法创建加密会话")
+            return None
+        
+        master_key, salt = generate_custom_symmetric_key(password, ENCRYPTION_CONFIG["key_size"])
+        if master_key is None:
+            return None
+        
+        wrapped_key = encrypt_symmetric_key(master_key, salt, rsa_public_key)
+        if wrapped_key is None:
+            print("包装会话主密钥失败")
+            return None
+        
+        session = EncryptionSession(master_key, wrapped_key)
+        print(f"已创建加密会话，密钥ID: {session.key_id.hex()}")
+        return session
+    except Exception as e:
+        print(f"创建加密会话失败: {e}")
+        return None
+
 def encrypt_locally(file_path, password, progress_callback=None):
     """本地加密模式，不依赖服务器"""
     try:
@@ -643,12 +1009,13 @@ def generate_rsa_key_pair():
 # 获取可用的加速方式
 def get_available_acceleration_methods():
     try:
+        backends = probe_backends()
         methods = []
-        if HAS_CUDA_LIB:
+        if backends["cuda"] is not None:
             methods.append("CUDA GPU加速")
-        if HAS_OPENCL_LIB:
+        if backends["opencl"] is not None:
             methods.append("OpenCL GPU加速")
-        if HAS_CRYPTOGRAPHY:
+        if backends["cryptography"]:
             methods.append("OpenSSL加速")
         if not methods:
             methods.append("标准加密（无硬件加速）")
@@ -705,11 +1072,13 @@ def encrypt_symmetric_key(symmetric_key, salt, rsa_public_key):
         return None
 
 # --- 解密文件 ---
-def aes_decrypt_file(encrypted_file_path, user_id, progress_callback=None):
+def aes_decrypt_file(encrypted_file_path, user_id, progress_callback=None, cancel_token=None, stats_callback=None):
     """
     解密使用AES CBC模式加密的文件
     1. 读取文件尾部的加密密钥密文，发送给服务器，服务器用私钥解密后返回对称密钥
     2. 用该密钥解密文件内容
+    cancel_token: 可选的 CancellationToken，取消后停止解密、删除未完成的输出文件并返回None
+    stats_callback: 可选的统计回调，提供速度和剩余时间，见 progress_reporter.ProgressReporter
     """
     try:
         # 检查文件是否存在
@@ -717,40 +1086,22 @@ def aes_decrypt_file(encrypted_file_path, user_id, progress_callback=None):
             print(f"加密文件不存在: {encrypted_file_path}")
             return None
         
-        # 检查是否为本地加密文件
-        try:
-            with open(encrypted_file_path, 'rb') as in_file:
-                in_file.seek(0, os.SEEK_END)
-                file_size = in_file.tell()
-                in_file.seek(file_size - 15)
-                if in_file.read(15) == b"LOCAL_ENCRYPTED":
-                    # 本地加密文件
-                    return decrypt_locally(encrypted_file_path, progress_callback)
-        except:
-            pass
-        
-        # 服务器加密文件
-        try:
-            with open(encrypted_file_path, 'rb') as in_file:
-                iv = in_file.read(16)
-                original_size = int.from_bytes(in_file.read(8), byteorder='big')
-                in_file.seek(0, os.SEEK_END)
-                file_size = in_file.tell()
-                in_file.seek(file_size - 9)
-                if in_file.read(9) != b"ENCRYPTED":
-                    raise ValueError("文件不是有效的加密文件")
-                in_file.seek(file_size - 13)
-                key_length = int.from_bytes(in_file.read(4), byteorder='big')
-                in_file.seek(file_size - 13 - key_length)
-                encrypted_key = in_file.read(key_length)
-                encrypted_data_size = file_size - 24 - key_length - 9
-        except Exception as e:
-            print(f"读取加密文件头失败: {e}")
+        # 读取文件头尾信息
+        file_info = read_encrypted_file_info(encrypted_file_path)
+        if file_info is None:
+            print(f"读取加密文件头失败: {encrypted_file_path}")
+            return None
+        if file_info["mode"] == "local":
+            # 本地加密文件
+            return decrypt_locally(encrypted_file_path, progress_callback)
+            
+        if cancel_token is not None and cancel_token.cancelled:
+            print(f"解密已取消: {encrypted_file_path}")
             return None
             
         # 1. 发送密钥密文到服务器，获取对称密钥
         try:
-            symmetric_key, salt = get_symmetric_key_from_server_v2(user_id, encrypted_key)
+            symmetric_key, salt = get_symmetric_key_from_server_v2(user_id, file_info["encrypted_key"])
             if symmetric_key is None:
                 print("无法从服务器获取对称密钥，解密失败")
                 return None
@@ -758,56 +1109,84 @@ def aes_decrypt_file(encrypted_file_path, user_id, progress_callback=None):
             print(f"获取对称密钥失败: {e}")
             return None
             
-        # 2. 解密文件内容
-        decrypted_file_path = encrypted_file_path[:-4] if encrypted_file_path.endswith('.enc') else encrypted_file_path + '.dec'
-        
-        try:
-            with open(encrypted_file_path, 'rb') as in_file, open(decrypted_file_path, 'wb') as out_file:
-                in_file.seek(24)
-                chunk_size = 1024 * 1024
-                total_chunks = (encrypted_data_size + chunk_size - 1) // chunk_size
-                completed_chunks = 0
-                for chunk_index in range(total_chunks):
-                    current_chunk_size = min(chunk_size, encrypted_data_size - chunk_index * chunk_size)
-                    encrypted_chunk = in_file.read(current_chunk_size)
-                    block_iv = bytes(x ^ y for x, y in zip(iv, chunk_index.to_bytes(16, byteorder='big')))
-                    cipher = AES.new(symmetric_key, AES.MODE_CBC, block_iv)
-                    decrypted_chunk = unpad(cipher.decrypt(encrypted_chunk), AES.block_size) if chunk_index == total_chunks - 1 else cipher.decrypt(encrypted_chunk)
-                    out_file.write(decrypted_chunk)
-                    completed_chunks += 1
-                    if progress_callback:
-                        progress_percent = int(completed_chunks * 100 / total_chunks)
-                        progress_callback(progress_percent)
-        except Exception as e:
-            print(f"解密文件内容失败: {e}")
-            return None
+        # 会话加密文件使用主密钥派生文件密钥
+        if file_info["mode"] == "session":
+            symmetric_key = derive_file_key(symmetric_key, file_info["iv"], file_info["key_id"])
             
-        print(f"文件已解密，保存为: {decrypted_file_path}")
-        return decrypted_file_path
+        # 2. 解密文件内容
+        return decrypt_file_with_key(encrypted_file_path, symmetric_key, file_info, progress_callback, cancel_token,
+                                     stats_callback)
         
     except Exception as e:
         print(f"解密过程中出错: {e}")
         return None
 
+# --- 使用已获得的对称密钥解密文件内容 ---
+def decrypt_file_with_key(encrypted_file_path, symmetric_key, file_info, progress_callback=None, cancel_token=None,
+                          stats_callback=None):
+    """
+    使用对称密钥解密文件内容并保存为原文件
+    加密时每个数据块单独填充，因此按加密后的块长度读取并逐块去除填充
+    cancel_token: 可选的 CancellationToken，取消后删除未完成的输出文件并返回None
+    progress_callback / stats_callback: 最多每 progress_interval 秒调用一次，见 progress_reporter.ProgressReporter
+    """
+    decrypted_file_path = encrypted_file_path[:-4] if encrypted_file_path.endswith('.enc') else encrypted_file_path + '.dec'
+    
+    try:
+        iv = file_info["iv"]
+        encrypted_data_size = file_info["encrypted_data_size"]
+        chunk_size = ENCRYPTION_CONFIG["chunk_size"]
+        encrypted_chunk_size = (chunk_size // AES.block_size + 1) * AES.block_size
+        total_chunks = (encrypted_data_size + encrypted_chunk_size - 1) // encrypted_chunk_size
+        reporter = ProgressReporter(encrypted_data_size, progress_callback, stats_callback)
+        
+        with open(encrypted_file_path, 'rb') as in_file, open(decrypted_file_path, 'wb') as out_file:
+            in_file.seek(24)
+            for chunk_index in range(total_chunks):
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()
+                current_chunk_size = min(encrypted_chunk_size, encrypted_data_size - chunk_index * encrypted_chunk_size)
+                encrypted_chunk = in_file.read(current_chunk_size)
+                block_iv = bytes(x ^ y for x, y in zip(iv, chunk_index.to_bytes(16, byteorder='big')))
+                cipher = AES.new(symmetric_key, AES.MODE_CBC, block_iv)
+                out_file.write(Padding.unpad(cipher.decrypt(encrypted_chunk), AES.block_size))
+                reporter.advance(current_chunk_size)
+        reporter.finish()
+    except OperationCancelled:
+        print(f"解密已取消: {encrypted_file_path}")
+        _remove_partial_file(decrypted_file_path)
+        return None
+    except Exception as e:
+        print(f"解密文件内容失败: {e}")
+        _remove_partial_file(decrypted_file_path)
+        return None
+        
+    print(f"文件已解密，保存为: {decrypted_file_path}")
+    return decrypted_file_path
+
 def decrypt_locally(encrypted_file_path, progress_callback=None):
     """本地解密模式"""
     try:
         from Crypto.Cipher import AES
         from Crypto.Util.Padding import unpad
         
+        # 文件格式: IV(16) | 原始大小(8) | 密文 | 密钥(32) | "LOCAL_ENCRYPTED"(15)
+        file_size = os.path.getsize(encrypted_file_path)
+        if file_size < 24 + 47:
+            raise ValueError("不是有效的本地加密文件")
         with open(encrypted_file_path, 'rb') as f:
             iv = f.read(16)
             original_size = int.from_bytes(f.read(8), byteorder='big')
-            encrypted_data = f.read(-15)  # 读取到LOCAL_ENCRYPTED标记之前
-            f.seek(-15, os.SEEK_END)
+            encrypted_data = f.read(file_size - 24 - 47)  # 读取到密钥之前
+            key = f.read(32)
             if f.read(15) != b"LOCAL_ENCRYPTED":
                 raise ValueError("不是有效的本地加密文件")
-            f.seek(-47, os.SEEK_END)  # 回到密钥位置
-            key = f.read(32)
         
         # 解密数据
         cipher = AES.new(key, AES.MODE_CBC, iv)
         decrypted_data = unpad(cipher.decrypt(encrypted_data), AES.block_size)
+        if len(decrypted_data) != original_size:
+            raise ValueError("解密后的大小与文件头中的原始大小不一致")
         
         # 保存解密文件
         decrypted_file_path = encrypted_file_path[:-4] if encrypted_file_path.endswith('.enc') else encrypted_file_path + '.dec'
@@ -829,11 +1208,25 @@ def decrypt_locally(encrypted_file_path, progress_callback=None):
 def get_symmetric_key_from_server_v2(user_id, encrypted_key):
     """
     发送加密密钥密文到服务器，服务器用私钥解密后返回对称密钥
+    已解密过的密钥直接从本地缓存返回，不再访问服务器
     """
+    symmetric_key, salt = unwrapped_key_cache.get(user_id, encrypted_key)
+    if symmetric_key is not None:
+        return symmetric_key, salt
+    
     try:
         # base64编码密钥密文
         encrypted_key_b64 = base64.b64encode(encrypted_key).decode()
-        url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['decrypt_key']}/{user_id}"
+        
+        # 优先通过WebSocket RPC解密，未连接时使用HTTP
+        rpc_result = call_server_rpc("key.decrypt", {"user_id": user_id, "encrypted_key": encrypted_key_b64})
+        if rpc_result and rpc_result.get("symmetric_key"):
+            symmetric_key = bytes.fromhex(rpc_result["symmetric_key"])
+            salt = bytes.fromhex(rpc_result["salt"]) if rpc_result.get("salt") else None
+            unwrapped_key_cache.put(user_id, encrypted_key, symmetric_key, salt)
+            return symmetric_key, salt
+        
+        url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['decrypt_key'].format(user_id=user_id)}"
         response = requests.post(
             url,
             json={"encrypted_key": encrypted_key_b64},
@@ -844,6 +1237,7 @@ def get_symmetric_key_from_server_v2(user_id, encrypted_key):
             data = response.json()
             symmetric_key = bytes.fromhex(data["symmetric_key"])
             salt = bytes.fromhex(data["salt"]) if data.get("salt") else None
+            unwrapped_key_cache.put(user_id, encrypted_key, symmetric_key, salt)
             return symmetric_key, salt
         else:
             print(f"服务器返回错误: {response.status_code}")
@@ -852,16 +1246,94 @@ def get_symmetric_key_from_server_v2(user_id, encrypted_key):
         print(f"获取对称密钥时出错: {e}")
         return None, None
 
+# --- 批量发送密钥密文到服务器解密 ---
+def get_symmetric_keys_from_server_batch(user_id, encrypted_keys, batch_size=None):
+    """
+    批量发送密钥密文到服务器解密，相同的密钥密文只发送一次
+    user_id: 用户ID
+    encrypted_keys: 密钥密文列表
+    batch_size: 每次请求包含的密钥数
+    返回: {密钥密文: (symmetric_key, salt)} 字典，未能解密的密钥不包含在内
+    """
+    if batch_size is None:
+        batch_size = ENCRYPTION_CONFIG.get("unwrap_batch_size", 256)
+    
+    results = {}
+    unique_keys = []
+    for encrypted_key in dict.fromkeys(encrypted_keys):
+        symmetric_key, salt = unwrapped_key_cache.get(user_id, encrypted_key)
+        if symmetric_key is not None:
+            results[encrypted_key] = (symmetric_key, salt)
+        else:
+            unique_keys.append(encrypted_key)
+    cache_hits = len(results)
+    total_keys = cache_hits + len(unique_keys)
+    url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['decrypt_key_batch'].format(user_id=user_id)}"
+    
+    with requests.Session() as http:
+        for start in range(0, len(unique_keys), batch_size):
+            batch = unique_keys[start:start + batch_size]
+            encoded_keys = [base64.b64encode(k).decode() for k in batch]
+            
+            # 优先通过WebSocket RPC批量解密，未连接时使用HTTP
+            rpc_result = call_server_rpc("key.decrypt_batch", {"user_id": user_id, "encrypted_keys": encoded_keys})
+            if rpc_result is not None:
+                items = rpc_result.get("keys", [])
+            else:
+                try:
+                    response = http.post(url, json={"encrypted_keys": encoded_keys}, timeout=SERVER_CONFIG['timeout'])
+                except Exception as e:
+                    print(f"批量解密密钥时出错: {e}")
+                    continue
+                
+                if response.status_code in (404, 405):
+                    # 服务器不支持批量接口，回退到逐个请求
+                    print("服务器不支持批量解密密钥，回退到逐个请求")
+                    for encrypted_key in batch:
+                        symmetric_key, salt = get_symmetric_key_from_server_v2(user_id, encrypted_key)
+                        if symmetric_key is not None:
+                            results[encrypted_key] = (symmetric_key, salt)
+                    continue
+                if response.status_code != 200:
+                    print(f"批量解密密钥失败，状态码: {response.status_code}")
+                    continue
+                items = response.json().get("keys", [])
+            
+            # 服务器按请求顺序返回，无法解密的位置为null
+            for encrypted_key, item in zip(batch, items):
+                if item and item.get("symmetric_key"):
+                    symmetric_key = bytes.fromhex(item["symmetric_key"])
+                    salt = bytes.fromhex(item["salt"]) if item.get("salt") else None
+                    unwrapped_key_cache.put(user_id, encrypted_key, symmetric_key, salt)
+                    results[encrypted_key] = (symmetric_key, salt)
+    
+    print(f"批量解密密钥完成: {len(results)}/{total_keys}，其中缓存命中 {cache_hits}")
+    return results
+
 # 新增：获取服务器公钥
 
-def get_user_public_key_from_server(user_id):
-    """从服务器获取用户RSA公钥（PEM格式）"""
+def get_user_public_key_from_server(user_id, use_cache=True):
+    """从服务器获取用户RSA公钥（PEM格式），结果缓存 KEY_CACHE_CONFIG["public_key_ttl"] 秒"""
     try:
-        url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['get_public_key']}/{user_id}"
+        if use_cache:
+            cached = public_key_cache.get(user_id)
+            if cached is not None:
+                return cached
+        
+        # 优先通过WebSocket RPC获取，未连接时使用HTTP
+        rpc_result = call_server_rpc("key.get_public", {"user_id": user_id})
+        if rpc_result and rpc_result.get("public_key"):
+            public_key = RSA.import_key(rpc_result["public_key"])
+            public_key_cache.put(user_id, public_key)
+            return public_key
+        
+        url = f"{SERVER_CONFIG['base_url']}{SERVER_CONFIG['endpoints']['get_public_key'].format(user_id=user_id)}"
         response = requests.get(url, timeout=SERVER_CONFIG['timeout'])
         if response.status_code == 200:
             pubkey_pem = response.json()["public_key"]
-            return RSA.import_key(pubkey_pem)
+            public_key = RSA.import_key(pubkey_pem)
+            public_key_cache.put(user_id, public_key)
+            return public_key
         else:
             print(f"获取公钥失败，状态码: {response.status_code}")
             return None
@@ -869,6 +1341,16 @@ def get_user_public_key_from_server(user_id):
         print(f"获取公钥时出错: {e}")
         return None
 
+def _advance_progress(reporter, nbytes):
+    """
+    在进程池的结果线程中更新进度
+    回调抛出的异常会终止结果线程，之后所有任务都无法返回结果，因此在这里捕获
+    """
+    try:
+        reporter.advance(nbytes)
+    except Exception as e:
+        print(f"更新加密进度时出错: {e}")
+
 # 多进程加密函数
 def encrypt_chunk_process(chunk_data, key, iv, chunk_index, acceleration_method=None):
     """在独立进程中加密数据块"""
@@ -877,18 +1359,19 @@ def encrypt_chunk_process(chunk_data, key, iv, chunk_index, acceleration_method=
         block_iv = bytes(x ^ y for x, y in zip(iv, chunk_index.to_bytes(16, byteorder='big')))
         
         # 根据加速方式选择加密方法
-        if acceleration_method == "CUDA GPU加速" and HAS_CUDA_LIB:
+        backends = probe_backends() if acceleration_method else None
+        if acceleration_method == "CUDA GPU加速" and backends["cuda"] is not None:
             encrypted_chunk = encrypt_chunk_cuda(chunk_data, key, block_iv)
-        elif acceleration_method == "OpenCL GPU加速" and HAS_OPENCL_LIB:
+        elif acceleration_method == "OpenCL GPU加速" and backends["opencl"] is not None:
             encrypted_chunk = encrypt_chunk_opencl(chunk_data, key, block_iv)
-        elif acceleration_method == "OpenSSL加速" and HAS_CRYPTOGRAPHY:
+        elif acceleration_method == "OpenSSL加速" and backends["cryptography"]:
             encrypted_chunk = encrypt_chunk_cryptography(chunk_data, key, block_iv)
-        elif acceleration_method == "AES-NI加速" and HAS_AESNI:
+        elif acceleration_method == "AES-NI加速" and backends["aesni"] is not None:
             encrypted_chunk = encrypt_chunk_aesni(chunk_data, key, block_iv)
         else:
             # 使用PyCryptodome
             cipher = AES.new(key, AES.MODE_CBC, block_iv)
-            encrypted_chunk = cipher.encrypt(pad(chunk_data, AES.block_size))
+            encrypted_chunk = cipher.encrypt(Padding.pad(chunk_data, AES.block_size))
         
         return (chunk_index, encrypted_chunk, block_iv)
     except Exception as e:
@@ -906,9 +1389,72 @@ def decrypt_chunk_process(encrypted_chunk, key, iv, chunk_index, is_last_chunk=F
         
         # 只有最后一个块需要去除填充
         if is_last_chunk:
-            decrypted_chunk = unpad(decrypted_chunk, AES.block_size)
+            decrypted_chunk = Padding.unpad(decrypted_chunk, AES.block_size)
         
         return (chunk_index, decrypted_chunk)
     except Exception as e:
         print(f"进程解密块 {chunk_index} 时出错: {e}")
         return None
+
+def _batch_decrypt_task(task):
+    """批量解密的进程池任务"""
+    encrypted_file_path, symmetric_key, file_info = task
+    if file_info["mode"] == "local":
+        return encrypted_file_path, decrypt_locally(encrypted_file_path)
+    if file_info["mode"] == "session":
+        symmetric_key = derive_file_key(symmetric_key, file_info["iv"], file_info["key_id"])
+    return encrypted_file_path, decrypt_file_with_key(encrypted_file_path, symmetric_key, file_info)
+
+# --- 批量解密文件 ---
+def batch_decrypt_files(encrypted_file_paths, user_id, progress_callback=None, thread_count=None, pool=None):
+    """
+    批量解密多个加密文件
+    1. 并行读取所有文件尾部的密钥密文
+    2. 去重后分批发送到服务器解密
+    3. 使用进程池并行解密文件内容
+    pool: 可选的进程池（如 get_shared_pool()），指定时不再单独创建进程池
+    返回: {加密文件路径: 解密后的文件路径或None} 字典
+    """
+    results = {}
+    
+    # 1. 并行读取文件头尾信息
+    read_workers = ENCRYPTION_CONFIG.get("footer_read_workers", 16)
+    with concurrent_futures.ThreadPoolExecutor(max_workers=read_workers) as executor:
+        file_infos = dict(zip(encrypted_file_paths, executor.map(read_encrypted_file_info, encrypted_file_paths)))
+    
+    # 2. 批量获取对称密钥
+    # 会话加密文件共享同一个主密钥密文，去重后每个会话只需解密一次
+    server_keys = [info["encrypted_key"] for info in file_infos.values() if info and info["mode"] != "local"]
+    unwrapped_keys = get_symmetric_keys_from_server_batch(user_id, server_keys) if server_keys else {}
+    
+    tasks = []
+    for encrypted_file_path, file_info in file_infos.items():
+        if file_info is None:
+            results[encrypted_file_path] = None
+        elif file_info["mode"] == "local":
+            tasks.append((encrypted_file_path, None, file_info))
+        elif file_info["encrypted_key"] in unwrapped_keys:
+            symmetric_key, _ = unwrapped_keys[file_info["encrypted_key"]]
+            tasks.append((encrypted_file_path, symmetric_key, file_info))
+        else:
+            print(f"未获取到对称密钥，跳过: {encrypted_file_path}")
+            results[encrypted_file_path] = None
+    
+    # 3. 并行解密
+    max_workers = ENCRYPTION_CONFIG["max_workers"] or multiprocessing.cpu_count()
+    if thread_count:
+        max_workers = min(max_workers, thread_count)
+    
+    if tasks:
+        pool_context = multiprocessing.Pool(processes=max_workers) if pool is None else contextlib.nullcontext(pool)
+        with pool_context as pool:
+            for encrypted_file_path, decrypted_file_path in pool.imap_unordered(_batch_decrypt_task, tasks):
+                results[encrypted_file_path] = decrypted_file_path
+                if progress_callback:
+                    progress_callback(int(len(results) * 100 / len(encrypted_file_paths)))
+    elif progress_callback:
+        progress_callback(100)
+    
+    succeeded = sum(1 for path in results.values() if path)
+    print(f"批量解密完成: {succeeded}/{len(encrypted_file_paths)}")
+    return results
@@ -0,0 +1,133 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from config import SERVER_CONFIG
+except ImportError:
+    SERVER_CONFIG = {
+        "dispatch_workers": 4,
+        "dispatch_queue_size": 256,
+    }
+
+
+class MessageDispatcher:
+    """
+    WebSocket消息分发器
+    处理函数在线程池中执行，不占用GUI线程和WebSocket事件循环；
+    同一消息类型的消息按接收顺序逐条处理，不同类型之间并行处理。
+    待处理的消息总数达到上限时 dispatch 阻塞，调用方停止读取连接，
+    由TCP流控对服务器形成背压
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, ui_invoker=None):
+        self.max_workers = max_workers or SERVER_CONFIG.get("dispatch_workers", 4)
+        self.max_pending = max_pending or SERVER_CONFIG.get("dispatch_queue_size", 256)
+        # ui_invoker(handler, data) 将处理函数转到GUI线程执行，未设置时直接在工作线程中调用
+        self.ui_invoker = ui_invoker
+        self.handlers = {}  # message_type -> (handler, ui)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._queues = {}  # message_type -> deque，仅包含尚未开始处理的消息
+        self._active = set()  # 正在线程池中处理的消息类型
+
+    def register(self, message_type, handler, ui=False):
+        """
+        注册消息处理函数
+        ui为True时处理函数通过 ui_invoker 在GUI线程中执行，只应用于更新界面
+        """
+        self.handlers[message_type] = (handler, ui)
+
+    def has_handler(self, message_type):
+        return message_type in self.handlers
+
+    def try_dispatch(self, message):
+        """不阻塞地分发消息，队列已满时返回False"""
+        if not self._slots.acquire(blocking=False):
+            return False
+        self._submit(message)
+        return True
+
+    def dispatch(self, message, timeout=None):
+        """分发消息，队列已满时阻塞等待，超时返回False"""
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        self._submit(message)
+        return True
+
+    def pending_count(self):
+        """尚未处理完的消息数"""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values()) + len(self._active)
+
+    def shutdown(self, wait=True):
+        """
+        停止线程池
+        wait为True时等待已分发的消息（包括排队中的）处理完毕；
+        为False时丢弃尚未开始处理的消息并释放其占用的队列名额，只有正在处理的消息会继续完成
+        """
+        dropped = 0
+        with self._lock:
+            executor, self._executor = self._executor, None
+            if not wait:
+                for queue in self._queues.values():
+                    dropped += len(queue)
+                    queue.clear()
+        for _ in range(dropped):
+            self._slots.release()
+        if executor:
+            executor.shutdown(wait=wait)
+
+    def _submit(self, message):
+        message_type = message.get("type")
+        if message_type not in self.handlers:
+            print(f"未处理的消息类型: {message_type}")
+            self._slots.release()
+            return
+        with self._lock:
+            self._queues.setdefault(message_type, deque()).append(message)
+            if message_type in self._active:
+                # 该类型已有消息在处理，由处理线程按顺序接续
+                return
+            self._active.add(message_type)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="MessageDispatcher")
+            self._executor.submit(self._drain, message_type)
+
+    def _drain(self, message_type):
+        """
+        顺序处理某一类型的消息，每次处理一条后重新提交，避免单一类型长期占用工作线程；
+        线程池已停止时在当前线程中处理完剩余的消息
+        """
+        while True:
+            with self._lock:
+                queue = self._queues[message_type]
+                if not queue:
+                    # 排队的消息已在 shutdown 中丢弃
+                    self._active.discard(message_type)
+                    return
+                message = queue.popleft()
+            try:
+                self._handle(message)
+            finally:
+                self._slots.release()
+            with self._lock:
+                if not queue:
+                    self._active.discard(message_type)
+                    return
+                if self._executor is not None:
+                    self._executor.submit(self._drain, message_type)
+                    return
+
+    def _handle(self, message):
+        handler, ui = self.handlers[message.get("type")]
+        data = message.get("data", {})
+        try:
+            if ui and self.ui_invoker:
+                self.ui_invoker(handler, data)
+            else:
+                handler(data)
+        except Exception as e:
+            print(f"处理消息 {message.get('type')} 时出错: {e}")
@@ -0,0 +1,180 @@
+import json
+import time
+import uuid
+import random
+import threading
+from rpc_channel import call_server_rpc
+from lazy_module import LazyModule
+
+# 发件箱首次创建或发送时才导入
+sqlite3 = LazyModule("sqlite3")
+requests = LazyModule("requests")
+
+try:
+    from config import SERVER_CONFIG, NOTIFICATION_CONFIG
+except ImportError:
+    SERVER_CONFIG = {
+        "base_url": "https://yourserver.com",
+        "endpoints": {
+            "encryption_completed": "/api/encryption/completed",
+            "encryption_completed_batch": "/api/encryption/completed_batch",
+        },
+        "timeout": 5,
+    }
+    NOTIFICATION_CONFIG = {
+        "outbox_path": "notification_outbox.db",
+        "batch_size": 100,
+        "flush_interval": 2,
+        "retry_base_delay": 1,
+        "retry_max_delay": 300,
+    }
+
+
+class NotificationOutbox:
+    """
+    加密完成通知的本地持久化发件箱
+    通知先写入SQLite，由后台线程批量发送到服务器，失败时按指数退避重试，
+    服务器不可用期间通知不会丢失，加密流程也不必等待网络请求
+    """
+
+    def __init__(self, db_path=None, batch_size=None, flush_interval=None):
+        self.db_path = db_path or NOTIFICATION_CONFIG["outbox_path"]
+        self.batch_size = batch_size or NOTIFICATION_CONFIG["batch_size"]
+        self.flush_interval = flush_interval or NOTIFICATION_CONFIG["flush_interval"]
+        self.retry_base_delay = NOTIFICATION_CONFIG["retry_base_delay"]
+        self.retry_max_delay = NOTIFICATION_CONFIG["retry_max_delay"]
+        self.failures = 0  # 连续发送失败次数
+        self.next_attempt = 0.0
+        self.running = False
+        self.thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "payload TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def enqueue(self, event):
+        """将通知写入发件箱，由后台线程在下一个发送周期批量发送"""
+        event = dict(event)
+        event.setdefault("event_id", str(uuid.uuid4()))  # 供服务器对重试的通知去重
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO outbox (payload, created_at) VALUES (?, ?)",
+                (json.dumps(event, ensure_ascii=False), time.time())
+            )
+            self._conn.commit()
+        return event["event_id"]
+
+    def pending_count(self):
+        """尚未发送成功的通知数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def start(self):
+        """启动后台发送线程"""
+        if self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="NotificationOutbox", daemon=True)
+            self.thread.start()
+
+    def stop(self, flush=True):
+        """停止后台发送线程，flush为True时先尝试发送剩余通知"""
+        self.running = False
+        self._wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """发送发件箱中的通知直到为空或发送失败，返回是否全部发送成功"""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, payload FROM outbox ORDER BY id LIMIT ?", (self.batch_size,)
+                ).fetchall()
+            if not rows:
+                return True
+            if not self._send_batch([json.loads(payload) for _, payload in rows]):
+                return False
+            with self._lock:
+                self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id, _ in rows])
+                self._conn.commit()
+
+    def _run(self):
+        """后台发送循环"""
+        while self.running:
+            # 按固定周期发送，期间写入的通知合并为一批
+            self._wakeup.wait(max(self.next_attempt - time.time(), self.flush_interval))
+            if not self.running:
+                break
+            try:
+                succeeded = self.flush()
+            except Exception as e:
+                print(f"发送通知时出错: {e}")
+                succeeded = False
+            if succeeded:
+                self.failures = 0
+                self.next_attempt = 0.0
+            else:
+                # 指数退避并加入随机抖动，避免服务器恢复时所有客户端同时重试
+                self.failures += 1
+                delay = min(self.retry_base_delay * (2 ** (self.failures - 1)), self.retry_max_delay)
+                self.next_attempt = time.time() + delay * random.uniform(0.5, 1.0)
+                print(f"通知发送失败，{delay:.0f} 秒内重试，待发送 {self.pending_count()} 条")
+
+    def _send_batch(self, events):
+        """批量发送通知，服务器不支持批量接口时逐条发送"""
+        # 优先通过WebSocket RPC发送，未连接时使用HTTP
+        if call_server_rpc("encryption.completed_batch", {"events": events}) is not None:
+            print(f"已通知服务器 {len(events)} 个文件加密完成")
+            return True
+        
+        base_url = SERVER_CONFIG["base_url"]
+        try:
+            response = requests.post(
+                f"{base_url}{SERVER_CONFIG['endpoints']['encryption_completed_batch']}",
+                json={"events": events},
+                timeout=SERVER_CONFIG["timeout"]
+            )
+            if response.status_code == 200:
+                print(f"已通知服务器 {len(events)} 个文件加密完成")
+                return True
+            if response.status_code not in (404, 405):
+                print(f"批量通知服务器失败，状态码: {response.status_code}")
+                return False
+
+            for event in events:
+                response = requests.post(
+                    f"{base_url}{SERVER_CONFIG['endpoints']['encryption_completed']}",
+                    json=event,
+                    timeout=SERVER_CONFIG["timeout"]
+                )
+                if response.status_code != 200:
+                    print(f"通知服务器失败，状态码: {response.status_code}")
+                    return False
+            return True
+        except Exception as e:
+            print(f"通知服务器时出错: {e}")
+            return False
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_notification_outbox():
+    """获取全局发件箱实例，首次调用时创建并启动后台发送线程"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = NotificationOutbox()
+            _outbox.start()
+        return _outbox
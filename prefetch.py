@@ -0,0 +1,148 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from cancellation import CancellationToken, OperationCancelled
+
+try:
+    from config import PREFETCH_CONFIG
+except ImportError:
+    PREFETCH_CONFIG = {
+        "enabled": True,
+        "warm_pool": True,
+        "public_key": True,
+        "qr": True,
+        "read_ahead_bytes": 64 * 1024 * 1024,
+    }
+
+READ_AHEAD_BLOCK = 1024 * 1024
+
+
+def read_ahead(file_path, limit=None, cancel_token=None):
+    """
+    提示系统预读文件开头 limit 字节（None表示整个文件）到文件缓存
+    支持 posix_fadvise 的系统只发出预读提示，不占用本线程；否则（Windows）顺序读取一遍，
+    每读一块检查一次取消标记
+    返回: 预读的字节数
+    """
+    with open(file_path, 'rb') as f:
+        length = os.fstat(f.fileno()).st_size
+        if limit is not None:
+            length = min(length, limit)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(f.fileno(), 0, length, os.POSIX_FADV_WILLNEED)
+            return length
+        done = 0
+        while done < length:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            data = f.read(min(READ_AHEAD_BLOCK, length - done))
+            if not data:
+                break
+            done += len(data)
+        return done
+
+
+class PrefetchEntry:
+    """一个候选文件的预取结果"""
+
+    def __init__(self, file_path, session_id):
+        self.file_path = file_path
+        self.session_id = session_id
+        self.cancel_token = CancellationToken()
+        self.qr_payload = None
+        self.qr_image = None
+        self.public_key_ready = False
+        self.read_ahead_bytes = 0
+        self.done = threading.Event()
+
+
+class Prefetcher:
+    """
+    悬停计时期间的预取
+    鼠标停在某个文件上开始计时时调用 start，在后台依次预热共享进程池、获取并缓存服务器公钥、
+    生成并渲染二维码、预读文件内容；鼠标离开时调用 cancel 停止。
+    悬停达到阈值后调用 take 取出已准备好的二维码，公钥和进程池通过 main 中的全局缓存直接生效
+    qr_renderer(payload) 将二维码内容渲染为图像（如 gui.render_qr_image），为None时只生成内容
+    """
+
+    def __init__(self, user_id="default_user", processes=None, qr_renderer=None, max_workers=2):
+        self.user_id = user_id
+        self.processes = processes
+        self.qr_renderer = qr_renderer
+        self.enabled = PREFETCH_CONFIG.get("enabled", True)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Prefetch")
+        self._lock = threading.Lock()
+        self._entries = {}  # 文件路径 -> PrefetchEntry
+
+    def start(self, file_path, session_id):
+        """开始预取候选文件，同时取消其他候选文件的预取"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is not None and entry.session_id == session_id and not entry.cancel_token.cancelled:
+                return entry
+            for other in self._entries.values():
+                other.cancel_token.cancel()
+            entry = PrefetchEntry(file_path, session_id)
+            self._entries = {file_path: entry}
+        try:
+            self._executor.submit(self._run, entry)
+        except RuntimeError:
+            # 已调用 shutdown
+            return None
+        return entry
+
+    def cancel(self, file_path=None):
+        """取消某个文件（file_path为None时所有文件）的预取"""
+        with self._lock:
+            if file_path is None:
+                entries, self._entries = list(self._entries.values()), {}
+            else:
+                entry = self._entries.pop(file_path, None)
+                entries = [entry] if entry is not None else []
+        for entry in entries:
+            entry.cancel_token.cancel()
+
+    def take(self, file_path, session_id):
+        """取出文件的预取结果，不存在或会话不一致时返回None；未完成的预读继续在后台执行"""
+        with self._lock:
+            entry = self._entries.get(file_path)
+            if entry is None or entry.session_id != session_id:
+                return None
+            del self._entries[file_path]
+        return entry
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
+
+    def _run(self, entry):
+        token = entry.cancel_token
+        encrypt = not entry.file_path.endswith('.enc')
+        try:
+            if PREFETCH_CONFIG.get("warm_pool", True):
+                token.raise_if_cancelled()
+                main.get_shared_pool(self.processes)
+                main.probe_backends()
+            if PREFETCH_CONFIG.get("qr", True):
+                token.raise_if_cancelled()
+                entry.qr_payload = main.build_qr_payload(entry.file_path, entry.session_id or "unknown-session")
+                if self.qr_renderer is not None:
+                    token.raise_if_cancelled()
+                    entry.qr_image = self.qr_renderer(entry.qr_payload)
+            if encrypt and PREFETCH_CONFIG.get("public_key", True):
+                token.raise_if_cancelled()
+                entry.public_key_ready = main.get_user_public_key_from_server(self.user_id) is not None
+            read_bytes = PREFETCH_CONFIG.get("read_ahead_bytes", 0)
+            if read_bytes:
+                token.raise_if_cancelled()
+                entry.read_ahead_bytes = read_ahead(entry.file_path, read_bytes, token)
+        except OperationCancelled:
+            pass
+        except Exception as e:
+            print(f"预取 {entry.file_path} 时出错: {e}")
+        finally:
+            entry.done.set()
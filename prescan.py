@@ -0,0 +1,146 @@
+import os
+import time
+import zlib
+import hashlib
+import threading
+
+from cancellation import CancellationToken, OperationCancelled
+
+try:
+    from config import ENCRYPTION_CONFIG, PRESCAN_CONFIG
+except ImportError:
+    ENCRYPTION_CONFIG = {
+        "chunk_size": 1024 * 1024,
+    }
+    PRESCAN_CONFIG = {
+        "enabled": True,
+        "max_bytes": 4 * 1024 * 1024 * 1024,
+        "memory_bytes": 256 * 1024 * 1024,
+        "read_rate": 0,
+        "sample_bytes": 64 * 1024,
+    }
+
+
+def file_signature(file_path):
+    """文件的 (大小, 修改时间) 签名，用于判断预扫描后文件是否被修改"""
+    st = os.stat(file_path)
+    return st.st_size, st.st_mtime_ns
+
+
+class PreApprovalScan:
+    """
+    等待移动端确认期间的文件预扫描
+    在后台线程中按加密的数据块大小顺序读取文件一遍：预热系统文件缓存，计算每块的SHA-256和可压缩率，
+    并在内存预算（memory_bytes）内保留数据块，确认后加密直接使用内存中的数据块，不再读取文件。
+    读取总量不超过 max_bytes，读取速度不超过 read_rate 字节/秒（0表示不限），避免影响前台程序。
+    预扫描是可选的优化：未完成、被取消或文件已被修改时，加密照常读取文件
+    """
+
+    def __init__(self, file_path, chunk_size=None, max_bytes=None, memory_bytes=None, read_rate=None,
+                 sample_bytes=None, cancel_token=None):
+        self.file_path = file_path
+        self.chunk_size = chunk_size or ENCRYPTION_CONFIG["chunk_size"]
+        self.max_bytes = PRESCAN_CONFIG.get("max_bytes", 0) if max_bytes is None else max_bytes
+        self.memory_bytes = PRESCAN_CONFIG.get("memory_bytes", 0) if memory_bytes is None else memory_bytes
+        self.read_rate = PRESCAN_CONFIG.get("read_rate", 0) if read_rate is None else read_rate
+        self.sample_bytes = PRESCAN_CONFIG.get("sample_bytes", 64 * 1024) if sample_bytes is None else sample_bytes
+        self.cancel_token = cancel_token or CancellationToken()
+        self.signature = None
+        self.chunk_hashes = []  # 每个数据块的SHA-256摘要，按顺序
+        self.compress_ratios = []  # 每个数据块抽样的压缩率（压缩后大小 / 原大小），越小越容易压缩
+        self.bytes_scanned = 0
+        self.complete = False  # 是否已扫描整个文件
+        self.error = None
+        self._chunks = {}  # 数据块序号 -> 数据，总大小不超过 memory_bytes
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._done = threading.Event()
+
+    def start(self):
+        """在后台线程中开始扫描"""
+        self._thread = threading.Thread(target=self.run, name="PreApprovalScan", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止继续读取，保留已缓存的数据块和已计算的摘要"""
+        self.cancel_token.cancel()
+
+    def cancel(self):
+        """停止扫描并释放缓存的数据块"""
+        self.stop()
+        self.release()
+
+    def wait(self, timeout=None):
+        """等待扫描结束，返回是否已结束"""
+        return self._done.wait(timeout)
+
+    def run(self):
+        try:
+            self.signature = file_signature(self.file_path)
+            file_size = self.signature[0]
+            limit = min(file_size, self.max_bytes) if self.max_bytes else file_size
+            started = time.monotonic()
+            with open(self.file_path, 'rb') as f:
+                while self.bytes_scanned < limit:
+                    self.cancel_token.raise_if_cancelled()
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    self._scan_chunk(len(self.chunk_hashes), chunk)
+                    self.bytes_scanned += len(chunk)
+                    if self.read_rate:
+                        # 按预算限速：提前于预定进度时休眠，期间仍响应取消
+                        ahead = self.bytes_scanned / self.read_rate - (time.monotonic() - started)
+                        if ahead > 0 and self.cancel_token.wait(ahead):
+                            raise OperationCancelled("预扫描已取消")
+            self.complete = self.bytes_scanned >= file_size
+        except OperationCancelled:
+            pass
+        except Exception as e:
+            self.error = str(e)
+            print(f"预扫描 {self.file_path} 时出错: {e}")
+        finally:
+            self._done.set()
+
+    def _scan_chunk(self, index, chunk):
+        self.chunk_hashes.append(hashlib.sha256(chunk).digest())
+        sample = chunk[:self.sample_bytes]
+        self.compress_ratios.append(len(zlib.compress(sample, 1)) / len(sample))
+        with self._lock:
+            if self._cached_bytes + len(chunk) <= self.memory_bytes:
+                self._chunks[index] = chunk
+                self._cached_bytes += len(chunk)
+
+    def is_valid(self):
+        """扫描结果是否仍与文件一致（文件大小和修改时间未变）"""
+        try:
+            return self.signature is not None and file_signature(self.file_path) == self.signature
+        except OSError:
+            return False
+
+    def take_chunk(self, index):
+        """取出并释放缓存的数据块，未缓存时返回None"""
+        with self._lock:
+            chunk = self._chunks.pop(index, None)
+            if chunk is not None:
+                self._cached_bytes -= len(chunk)
+            return chunk
+
+    def release(self):
+        """释放所有缓存的数据块"""
+        with self._lock:
+            self._chunks.clear()
+            self._cached_bytes = 0
+
+    def stats(self):
+        """扫描统计：已扫描字节数、是否完成、缓存的数据块数、平均可压缩率"""
+        ratios = self.compress_ratios
+        return {
+            "bytes_scanned": self.bytes_scanned,
+            "complete": self.complete,
+            "chunks": len(self.chunk_hashes),
+            "cached_chunks": len(self._chunks),
+            "compress_ratio": sum(ratios) / len(ratios) if ratios else None,
+        }
@@ -0,0 +1,113 @@
+import time
+import threading
+from collections import deque
+
+try:
+    from config import ENCRYPTION_CONFIG
+except ImportError:
+    ENCRYPTION_CONFIG = {
+        "progress_interval": 0.1,
+    }
+
+
+def format_speed(speed):
+    """格式化速度（字节/秒）为 MB/s"""
+    return f"{(speed or 0) / (1024 * 1024):.1f} MB/s"
+
+
+def format_eta(eta):
+    """格式化剩余时间（秒），未知时返回 --:--"""
+    if eta is None:
+        return "--:--"
+    minutes, seconds = divmod(int(eta + 0.5), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class ProgressReporter:
+    """
+    线程安全的进度统计与节流上报
+    工作线程（或进程池的结果回调线程）在每个数据块完成时调用 advance，完成顺序不限；
+    回调最多每 interval 秒调用一次，完成时一定调用一次
+    progress_callback(percent): 百分比（0-100），只在数值变化时调用
+    stats_callback(stats): 统计字典，包含 percent、bytes_done、bytes_total、speed（字节/秒）、
+                           eta（剩余秒数，未知时为None）、elapsed（已用秒数）
+    """
+
+    def __init__(self, total_bytes, progress_callback=None, stats_callback=None, interval=None, window=5.0):
+        self.total_bytes = max(int(total_bytes), 0)
+        self.progress_callback = progress_callback
+        self.stats_callback = stats_callback
+        self.interval = ENCRYPTION_CONFIG.get("progress_interval", 0.1) if interval is None else interval
+        self.window = window  # 计算速度使用的时间窗口（秒）
+        self.bytes_done = 0
+        self.started_at = time.monotonic()
+        self._samples = deque([(self.started_at, 0)])
+        self._last_emit = 0.0
+        self._last_percent = None
+        self._last_emitted_bytes = -1
+        self._lock = threading.Lock()
+        self._emit_lock = threading.Lock()
+
+    def advance(self, nbytes):
+        """记录已完成的字节数"""
+        with self._lock:
+            self.bytes_done = min(self.bytes_done + nbytes, self.total_bytes)
+            now = time.monotonic()
+            if now - self._last_emit < self.interval:
+                return
+            self._last_emit = now
+            stats = self._snapshot(now)
+        self._emit(stats)
+
+    def finish(self):
+        """标记完成并立即上报100%"""
+        with self._lock:
+            self.bytes_done = self.total_bytes
+            stats = self._snapshot(time.monotonic())
+        self._emit(stats)
+
+    def stats(self):
+        """当前统计"""
+        with self._lock:
+            return self._snapshot(time.monotonic())
+
+    def _snapshot(self, now):
+        """生成统计字典（调用方需持有锁）"""
+        self._samples.append((now, self.bytes_done))
+        while len(self._samples) > 2 and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+        first_time, first_bytes = self._samples[0]
+        elapsed = now - self.started_at
+        speed = (self.bytes_done - first_bytes) / (now - first_time) if now > first_time else 0.0
+        remaining = self.total_bytes - self.bytes_done
+        if remaining <= 0:
+            eta = 0.0
+        elif speed > 0:
+            eta = remaining / speed
+        else:
+            eta = None
+        percent = int(self.bytes_done * 100 / self.total_bytes) if self.total_bytes else 100
+        return {
+            "percent": percent,
+            "bytes_done": self.bytes_done,
+            "bytes_total": self.total_bytes,
+            "speed": speed,
+            "eta": eta,
+            "elapsed": elapsed,
+        }
+
+    def _emit(self, stats):
+        # 回调不在统计锁内调用，避免回调中的耗时操作阻塞其他工作线程；
+        # 多个线程同时上报时丢弃比已上报数据更旧的统计
+        with self._emit_lock:
+            if stats["bytes_done"] < self._last_emitted_bytes:
+                return
+            self._last_emitted_bytes = stats["bytes_done"]
+            if self.progress_callback and stats["percent"] != self._last_percent:
+                self._last_percent = stats["percent"]
+                self.progress_callback(stats["percent"])
+            if self.stats_callback:
+                self.stats_callback(stats)
@@ -0,0 +1,30 @@
+try:
+    from config import SERVER_CONFIG
+except ImportError:
+    SERVER_CONFIG = {
+        "timeout": 5,
+    }
+
+# 当前可用的WebSocket RPC通道（WebSocketManager 或 ws_client.WebSocketClient），未设置时所有调用走HTTP
+_rpc_channel = None
+
+
+def set_rpc_channel(channel):
+    """设置WebSocket RPC通道，传入None时取消"""
+    global _rpc_channel
+    _rpc_channel = channel
+
+
+def call_server_rpc(method, params=None, timeout=None):
+    """
+    通过WebSocket RPC调用服务器方法
+    返回: 服务器返回的结果；通道未连接或调用失败时返回None，调用方应回退到HTTP
+    """
+    channel = _rpc_channel
+    if channel is None or not channel.rpc_available:
+        return None
+    try:
+        return channel.call(method, params, timeout=timeout or SERVER_CONFIG["timeout"])
+    except Exception as e:
+        print(f"WebSocket RPC调用 {method} 失败，回退到HTTP: {e}")
+        return None
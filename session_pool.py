@@ -0,0 +1,111 @@
+import time
+import random
+import threading
+from collections import deque
+
+try:
+    from config import SESSION_POOL_CONFIG
+except ImportError:
+    SESSION_POOL_CONFIG = {
+        "size": 2,
+        "max_age": 3600,
+        "retry_base_delay": 2,
+        "retry_max_delay": 120,
+    }
+
+
+class SessionPool:
+    """
+    预先注册的备用会话池
+    后台线程保持 size 个已在服务器注册的会话ID，take() 不访问网络，立即返回一个备用会话（没有时返回None）
+    并唤醒后台线程补充，需要会话时（如启动后首次悬停）不必等待注册请求。
+    备用会话超过 max_age 秒后丢弃重新注册（服务器端可能已过期）；注册失败时按指数退避重试
+    register(): 注册一个新会话，返回session_id，失败时返回None（如 main.register_server_session）
+    on_available(): 可选回调，备用会话从无到有时在后台线程中调用
+    """
+
+    def __init__(self, register, size=None, max_age=None, on_available=None, clock=time.monotonic):
+        self.register = register
+        self.size = SESSION_POOL_CONFIG.get("size", 2) if size is None else size
+        self.max_age = SESSION_POOL_CONFIG.get("max_age", 3600) if max_age is None else max_age
+        self.retry_base_delay = SESSION_POOL_CONFIG.get("retry_base_delay", 2)
+        self.retry_max_delay = SESSION_POOL_CONFIG.get("retry_max_delay", 120)
+        self.on_available = on_available
+        self.clock = clock
+        self.failures = 0  # 连续注册失败次数
+        self.running = False
+        self.thread = None
+        self._spares = deque()  # (session_id, 注册时间)，最早注册的在左侧
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动后台注册线程（已停止但仍在完成注册请求的旧线程随后自行退出）"""
+        if not self.running or self.thread is None or not self.thread.is_alive():
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="SessionPool", daemon=True)
+            self.thread.start()
+
+    def stop(self, wait=True):
+        """停止后台注册线程；wait为False时不等待正在进行的注册请求，可在界面线程中调用"""
+        self.running = False
+        self._wakeup.set()
+        if self.thread and wait:
+            self.thread.join()
+            self.thread = None
+
+    def take(self):
+        """取出一个备用会话ID（最早注册的），没有时返回None；不等待网络请求"""
+        with self._lock:
+            self._drop_expired()
+            session_id = self._spares.popleft()[0] if self._spares else None
+        self.refill()
+        return session_id
+
+    def available(self):
+        """当前可用的备用会话数"""
+        with self._lock:
+            self._drop_expired()
+            return len(self._spares)
+
+    def refill(self):
+        """唤醒后台线程立即补充备用会话（并重置退避）"""
+        self.failures = 0
+        self._wakeup.set()
+
+    def _drop_expired(self):
+        now = self.clock()
+        while self._spares and now - self._spares[0][1] >= self.max_age:
+            self._spares.popleft()
+
+    def _run(self):
+        """后台注册循环"""
+        while self.running and self.thread is threading.current_thread():
+            self._wakeup.clear()
+            with self._lock:
+                self._drop_expired()
+                missing = self.size - len(self._spares)
+            delay = None
+            if missing > 0:
+                session_id = None
+                try:
+                    session_id = self.register()
+                except Exception as e:
+                    print(f"预注册会话时出错: {e}")
+                if session_id:
+                    self.failures = 0
+                    with self._lock:
+                        self._spares.append((session_id, self.clock()))
+                        became_available = len(self._spares) == 1
+                    if became_available and self.on_available is not None:
+                        self.on_available()
+                    continue
+                # 指数退避并加入随机抖动，服务器恢复前不持续发送注册请求
+                self.failures += 1
+                delay = min(self.retry_base_delay * (2 ** (self.failures - 1)), self.retry_max_delay)
+                delay *= random.uniform(0.5, 1.0)
+            else:
+                with self._lock:
+                    # 池已满，等到最早的备用会话过期时再补充
+                    delay = self.max_age - (self.clock() - self._spares[0][1]) if self._spares else None
+            self._wakeup.wait(delay)
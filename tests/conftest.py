@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import base64
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 模拟服务器只接受该用户的请求路径
+USER_ID = "test_user"
+
+
+class MockKeyServer:
+    """
+    本地模拟的密钥服务器：提供公钥、逐个解密和批量解密接口，并记录收到的请求
+    只响应 config 中端点模板按 USER_ID 格式化后的精确路径，其他路径返回404并记录在 unexpected 中
+    """
+
+    def __init__(self, batch_supported=True):
+        from Crypto.PublicKey import RSA
+
+        self.rsa_key = RSA.generate(2048)
+        self.batch_supported = batch_supported
+        self.requests = []  # (路径, 请求中的密钥数)
+        self.unexpected = []  # 不存在的路径
+        self.paths = {
+            "public": f"/api/key/public/{USER_ID}",
+            "decrypt": f"/api/key/decrypt/{USER_ID}",
+            "decrypt_batch": f"/api/key/decrypt_batch/{USER_ID}",
+        }
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, data=None):
+                body = json.dumps(data or {}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == server.paths["public"]:
+                    server.requests.append((self.path, 0))
+                    self._reply(200, {"public_key": server.rsa_key.publickey().export_key().decode()})
+                else:
+                    server.unexpected.append(("GET", self.path))
+                    self._reply(404)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+                if self.path == server.paths["decrypt_batch"] and server.batch_supported:
+                    keys = payload["encrypted_keys"]
+                    server.requests.append((self.path, len(keys)))
+                    self._reply(200, {"keys": [server.unwrap(k) for k in keys]})
+                elif self.path == server.paths["decrypt"]:
+                    server.requests.append((self.path, 1))
+                    self._reply(200, server.unwrap(payload["encrypted_key"]))
+                else:
+                    if self.path != server.paths["decrypt_batch"]:
+                        server.unexpected.append(("POST", self.path))
+                    self._reply(404)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def unwrap(self, encrypted_key_b64):
+        from Crypto.Cipher import PKCS1_OAEP
+
+        data = json.loads(PKCS1_OAEP.new(self.rsa_key).decrypt(base64.b64decode(encrypted_key_b64)))
+        return {"symmetric_key": data["key"], "salt": data["salt"]}
+
+    def unwrap_requests(self, kind):
+        return [count for path, count in self.requests if path == self.paths[kind]]
+
+
+@pytest.fixture
+def key_server(request, monkeypatch):
+    """启动模拟密钥服务器并将 main 的服务器地址指向它；参数为False时不支持批量解密接口"""
+    pytest.importorskip("Crypto")
+    pytest.importorskip("requests")
+    import main
+    from key_cache import unwrapped_key_cache, public_key_cache
+
+    server = MockKeyServer(batch_supported=getattr(request, "param", True))
+    server.thread.start()
+    monkeypatch.setitem(main.SERVER_CONFIG, "base_url", server.base_url)
+    unwrapped_key_cache.forget_all()
+    public_key_cache.forget_all()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
+    unwrapped_key_cache.forget_all()
+    public_key_cache.forget_all()
+    assert server.unexpected == []
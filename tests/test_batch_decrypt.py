@@ -0,0 +1,113 @@
+import os
+import base64
+
+import pytest
+
+pytest.importorskip("Crypto")
+pytest.importorskip("requests")
+
+import main
+
+USER_ID = "test_user"
+
+
+@pytest.fixture(scope="module")
+def pool():
+    import multiprocessing
+    with multiprocessing.Pool(2) as pool:
+        yield pool
+
+
+def _make_files(tmp_path, count):
+    contents = {}
+    for i in range(count):
+        path = tmp_path / f"file{i}.bin"
+        data = os.urandom(1000 + i * 997)
+        path.write_bytes(data)
+        contents[str(path)] = data
+    return contents
+
+
+def _encrypt_all(contents, pool, session=None):
+    encrypted = []
+    for path in contents:
+        encrypted_path = main.aes_encrypt_file(path, USER_ID, session=session, pool=pool)
+        assert encrypted_path == path + ".enc"
+        os.remove(path)
+        encrypted.append(encrypted_path)
+    return encrypted
+
+
+def test_server_footer_round_trip(tmp_path, key_server, pool):
+    contents = _make_files(tmp_path, 1)
+    (encrypted_path,) = _encrypt_all(contents, pool)
+
+    info = main.read_encrypted_file_info(encrypted_path)
+    assert info["mode"] == "server"
+    assert info["original_size"] == len(next(iter(contents.values())))
+    # 尾部读出的密钥密文可以被服务器私钥解开
+    assert key_server.unwrap(base64.b64encode(info["encrypted_key"]).decode())["symmetric_key"]
+
+
+def test_batch_decrypt_uses_one_request_per_batch(tmp_path, key_server, pool, monkeypatch):
+    monkeypatch.setitem(main.ENCRYPTION_CONFIG, "unwrap_batch_size", 4)
+    contents = _make_files(tmp_path, 10)
+    encrypted = _encrypt_all(contents, pool)
+    key_server.requests.clear()
+
+    results = main.batch_decrypt_files(encrypted, USER_ID, pool=pool)
+
+    assert sorted(results) == sorted(encrypted)
+    for path, data in contents.items():
+        assert results[path + ".enc"] == path
+        with open(path, "rb") as f:
+            assert f.read() == data
+    assert key_server.unwrap_requests("decrypt_batch") == [4, 4, 2]
+    assert key_server.unwrap_requests("decrypt") == []
+
+
+def test_batch_decrypt_deduplicates_session_keys(tmp_path, key_server, pool):
+    contents = _make_files(tmp_path, 6)
+    session = main.create_encryption_session(USER_ID)
+    encrypted = _encrypt_all(contents, pool, session=session)
+    key_server.requests.clear()
+
+    results = main.batch_decrypt_files(encrypted, USER_ID, pool=pool)
+
+    assert all(results[path + ".enc"] == path for path in contents)
+    # 同一会话的文件共享一个主密钥密文，只需解密一次
+    assert key_server.unwrap_requests("decrypt_batch") == [1]
+
+
+def test_batch_decrypt_caches_unwrapped_keys(tmp_path, key_server, pool):
+    contents = _make_files(tmp_path, 3)
+    encrypted = _encrypt_all(contents, pool)
+    key_server.requests.clear()
+
+    main.batch_decrypt_files(encrypted, USER_ID, pool=pool)
+    main.batch_decrypt_files(encrypted, USER_ID, pool=pool)
+
+    assert key_server.unwrap_requests("decrypt_batch") == [3]
+
+
+@pytest.mark.parametrize("key_server", [False], indirect=True)
+def test_batch_decrypt_falls_back_to_single_requests(tmp_path, key_server, pool):
+    contents = _make_files(tmp_path, 3)
+    encrypted = _encrypt_all(contents, pool)
+    key_server.requests.clear()
+
+    results = main.batch_decrypt_files(encrypted, USER_ID, pool=pool)
+
+    assert all(results[path + ".enc"] == path for path in contents)
+    assert key_server.unwrap_requests("decrypt_batch") == []
+    assert key_server.unwrap_requests("decrypt") == [1, 1, 1]
+
+
+def test_batch_decrypt_reports_unreadable_files(tmp_path, key_server, pool):
+    bogus = tmp_path / "bogus.enc"
+    bogus.write_bytes(os.urandom(100))
+
+    results = main.batch_decrypt_files([str(bogus)], USER_ID, pool=pool)
+
+    assert results == {str(bogus): None}
+    assert key_server.unwrap_requests("decrypt_batch") == []
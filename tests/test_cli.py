@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cli.py")
+
+
+def _run_cli(*args, cwd):
+    # 在临时目录中运行，通知发件箱数据库等运行时文件不写入仓库目录
+    return subprocess.run([sys.executable, CLI, *args], cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          text=True, timeout=120)
+
+
+@pytest.mark.parametrize("size", [0, 15, 16, 100000])
+def test_local_encrypt_decrypt_round_trip(tmp_path, size):
+    original = os.urandom(size)
+    path = tmp_path / "data.bin"
+    path.write_bytes(original)
+
+    result = _run_cli("encrypt", "--local", str(path), cwd=tmp_path)
+    assert result.returncode == 0, result.stdout
+    encrypted = tmp_path / "data.bin.enc"
+    assert encrypted.read_bytes().endswith(b"LOCAL_ENCRYPTED")
+
+    path.unlink()
+    result = _run_cli("decrypt", str(encrypted), cwd=tmp_path)
+    assert result.returncode == 0, result.stdout
+    assert path.read_bytes() == original
+
+
+def test_inspect_local_file(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(b"hello")
+    assert _run_cli("encrypt", "--local", str(path), cwd=tmp_path).returncode == 0
+
+    result = _run_cli("inspect", "--json", str(tmp_path / "data.bin.enc"), cwd=tmp_path)
+    assert result.returncode == 0, result.stdout
+    assert '"local"' in result.stdout
+
+
+def test_decrypt_truncated_local_file_fails(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(os.urandom(64))
+    assert _run_cli("encrypt", "--local", str(path), cwd=tmp_path).returncode == 0
+    encrypted = tmp_path / "data.bin.enc"
+    data = encrypted.read_bytes()
+    # 截掉一个密文块，保留密钥和标记
+    encrypted.write_bytes(data[:24] + data[40:])
+    path.unlink()
+
+    result = _run_cli("decrypt", str(encrypted), cwd=tmp_path)
+    assert result.returncode == 1
+    assert not path.exists()
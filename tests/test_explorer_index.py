@@ -0,0 +1,121 @@
+import os
+
+from explorer_index import ExplorerItemIndex, GridIndex
+from explorer_providers import StaticItemProvider
+
+HWND = 1001
+FOLDER = os.path.join("C:", "Users", "test", "Documents")
+
+
+def _grid_items(columns, rows, width=80, height=90, gap=10):
+    """按图标视图排列的文件项：(文件名, 矩形)"""
+    items = []
+    for row in range(rows):
+        for column in range(columns):
+            left = column * (width + gap)
+            top = row * (height + gap)
+            items.append((f"file_{row}_{column}.txt", (left, top, left + width, top + height)))
+    return items
+
+
+def _provider(**view):
+    view.setdefault("folder", FOLDER)
+    view.setdefault("mode", "icons")
+    view.setdefault("items", _grid_items(5, 20))
+    return StaticItemProvider({HWND: view})
+
+
+def test_hit_returns_item_under_point():
+    index = ExplorerItemIndex(_provider())
+
+    assert index.hit(HWND, 5, 5) == os.path.join(FOLDER, "file_0_0.txt")
+    assert index.hit(HWND, 2 * 90 + 40, 3 * 100 + 45) == os.path.join(FOLDER, "file_3_2.txt")
+    # 文件项之间的间隙
+    assert index.hit(HWND, 85, 5) is None
+
+
+def test_index_reused_while_view_state_unchanged():
+    provider = _provider()
+    index = ExplorerItemIndex(provider)
+
+    for y in range(0, 2000, 37):
+        index.hit(HWND, 40, y)
+
+    assert index.builds == 1
+    assert provider.enumerations == 1
+
+
+def test_hit_after_scroll_uses_new_positions():
+    provider = _provider()
+    index = ExplorerItemIndex(provider)
+    assert index.hit(HWND, 40, 45) == os.path.join(FOLDER, "file_0_0.txt")
+
+    # 向下滚动三行：同一视图坐标处显示的是第四行的文件
+    provider.views[HWND]["scroll"] = (0, 300)
+    assert index.hit(HWND, 40, 45) == os.path.join(FOLDER, "file_3_0.txt")
+    assert index.builds == 2
+
+    # 滚动到第一行上方的位置不再有文件项
+    provider.views[HWND]["scroll"] = (0, -200)
+    assert index.hit(HWND, 40, 45) is None
+    assert index.hit(HWND, 40, 245) == os.path.join(FOLDER, "file_0_0.txt")
+    assert index.builds == 3
+
+
+def test_rebuild_on_folder_and_mode_change():
+    provider = _provider()
+    index = ExplorerItemIndex(provider)
+    index.hit(HWND, 5, 5)
+
+    other = os.path.join("D:", "Downloads")
+    provider.views[HWND]["folder"] = other
+    assert index.hit(HWND, 5, 5) == os.path.join(other, "file_0_0.txt")
+    assert index.builds == 2
+
+    # 切换为列表视图：文件项变为单列的窄行
+    provider.views[HWND]["mode"] = "list"
+    provider.views[HWND]["items"] = [(f"row_{i}.txt", (0, i * 20, 300, i * 20 + 18)) for i in range(50)]
+    assert index.hit(HWND, 150, 205) == os.path.join(other, "row_10.txt")
+    assert index.builds == 3
+
+
+def test_window_without_folder_view_returns_none():
+    provider = _provider()
+    index = ExplorerItemIndex(provider)
+    index.hit(HWND, 5, 5)
+
+    del provider.views[HWND]
+    assert index.hit(HWND, 5, 5) is None
+    assert index.index_for(HWND) is None
+    assert provider.enumerations == 1
+
+
+def test_least_recently_used_windows_evicted():
+    provider = StaticItemProvider({hwnd: {"folder": f"folder{hwnd}", "items": _grid_items(2, 2)}
+                                   for hwnd in range(4)})
+    index = ExplorerItemIndex(provider, max_windows=2)
+
+    for hwnd in (0, 1, 0, 2):
+        index.hit(hwnd, 5, 5)
+    assert index.builds == 3
+
+    # 窗口1最久未使用，已被淘汰；窗口0仍在缓存中
+    index.hit(0, 5, 5)
+    assert index.builds == 3
+    index.hit(1, 5, 5)
+    assert index.builds == 4
+
+
+def test_grid_index_matches_linear_scan():
+    items = [(name, rect) for name, rect in _grid_items(7, 9, width=64, height=72, gap=6)]
+    grid = GridIndex(items)
+
+    def linear_hit(x, y):
+        for name, (left, top, right, bottom) in items:
+            if left <= x <= right and top <= y <= bottom:
+                return name
+        return None
+
+    for x in range(-10, 7 * 70 + 10, 7):
+        for y in range(-10, 9 * 78 + 10, 11):
+            assert grid.hit(x, y) == linear_hit(x, y)
@@ -0,0 +1,212 @@
+import json
+
+import pytest
+
+import cli
+from hover_core import (HOVER_DWELLING, HOVER_IDLE, HOVER_SEARCHING, HOVER_TRIGGERED, HoverLoop, HoverTracker,
+                        ScriptedHoverSource, replay)
+
+EXPLORER = "explorer"
+EDITOR = "editor"
+# 采样时刻的误差：replay 每次至少等待1ms，浮点累加也会带来微小误差
+SLACK = 2e-3
+
+
+def _tracker():
+    return HoverTracker(threshold=1.0, cooldown=5.0, move_tolerance=4, fast_interval=0.05, interval=0.2,
+                        idle_interval=0.5, settle_time=0.5)
+
+
+def _files(window, x, y):
+    # x < 100 为 a.txt，100 <= x < 200 为 b.txt，其余为空白处
+    if x < 100:
+        return "a.txt"
+    if x < 200:
+        return "b.txt"
+    return None
+
+
+def _source(events):
+    return ScriptedHoverSource(events, {EXPLORER}, _files)
+
+
+class RecordingSource(ScriptedHoverSource):
+    """记录每次 sleep 的 (时刻, 等待时间)"""
+
+    def __init__(self, events):
+        super().__init__(events, {EXPLORER}, _files)
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append((self.now, seconds))
+        super().sleep(seconds)
+
+
+def _step_until(loop, source, end):
+    while source.now <= end:
+        source.sleep(max(loop.step(), 1e-3))
+
+
+def test_dwell_triggers_after_threshold():
+    source = _source([(0.0, 50, 50, EXPLORER), (10.0, 50, 50, EXPLORER)])
+    triggers, loop = replay(source, tracker=_tracker())
+
+    # 停留期间只触发一次，触发时刻为开始计时后 threshold 秒
+    assert len(triggers) == 1
+    assert triggers[0].file_path == "a.txt"
+    assert triggers[0].time == pytest.approx(1.0, abs=SLACK)
+    assert (triggers[0].x, triggers[0].y) == (50, 50)
+    assert loop.tracker.state == HOVER_TRIGGERED
+
+
+def test_leaving_before_threshold_does_not_trigger():
+    source = _source([(0.0, 50, 50, EXPLORER), (0.8, 300, 50, EXPLORER), (5.0, 300, 50, EXPLORER)])
+    triggers, _ = replay(source, tracker=_tracker())
+
+    assert triggers == []
+
+
+def test_cooldown_suppresses_retrigger_on_same_file():
+    source = _source([
+        (0.0, 50, 50, EXPLORER),    # a.txt，1.0 秒时触发
+        (2.0, 150, 50, EXPLORER),   # 短暂移到 b.txt，未达到阈值
+        (2.5, 50, 50, EXPLORER),    # 回到 a.txt，仍在冷却时间内
+        (6.0, 150, 50, EXPLORER),
+        (6.5, 50, 50, EXPLORER),    # 冷却结束后再回到 a.txt，重新计时
+        (10.0, 50, 50, EXPLORER),
+    ])
+    triggers, _ = replay(source, tracker=_tracker())
+
+    assert [trigger.file_path for trigger in triggers] == ["a.txt", "a.txt"]
+    assert triggers[0].time == pytest.approx(1.0, abs=SLACK)
+    assert triggers[1].time == pytest.approx(7.5, abs=0.05 + SLACK)
+
+
+def test_cooldown_is_per_file():
+    tracker = _tracker()
+    tracker.on_window(EXPLORER, True, 0.0)
+    tracker.on_cursor(50, 50, 0.0)
+    tracker.on_file("a.txt", 0.0)
+    assert tracker.poll(1.0).file_path == "a.txt"
+
+    tracker.on_cursor(150, 50, 1.5)
+    tracker.on_file("b.txt", 1.5)
+    assert tracker.state == HOVER_DWELLING
+    assert tracker.poll(2.5).file_path == "b.txt"
+
+    tracker.on_cursor(50, 50, 3.0)
+    tracker.on_file("a.txt", 3.0)
+    assert tracker.state == HOVER_TRIGGERED
+    assert tracker.poll(10.0) is None
+
+
+def test_window_change_resets_dwell():
+    tracker = _tracker()
+    tracker.on_window(EXPLORER, True, 0.0)
+    tracker.on_cursor(50, 50, 0.0)
+    tracker.on_file("a.txt", 0.0)
+    assert tracker.dwell_remaining(0.6) == pytest.approx(0.4)
+
+    # 鼠标位置不变，但鼠标下的窗口切换为其他程序再切回
+    tracker.on_window(EDITOR, False, 0.6)
+    assert tracker.state == HOVER_IDLE
+    assert tracker.current_file is None
+    assert tracker.poll(1.0) is None
+
+    tracker.on_window(EXPLORER, True, 0.9)
+    assert tracker.state == HOVER_SEARCHING
+    assert tracker.needs_resolve
+    tracker.on_file("a.txt", 0.9)
+    assert tracker.poll(1.5) is None
+    assert tracker.poll(2.0).file_path == "a.txt"
+
+
+def test_window_change_resets_dwell_in_replay():
+    source = _source([(0.0, 50, 50, EXPLORER), (0.6, 50, 50, EDITOR), (0.9, 50, 50, EXPLORER),
+                      (6.0, 50, 50, EXPLORER)])
+    triggers, _ = replay(source, tracker=_tracker())
+
+    # 计时从检测到切回资源管理器时重新开始（最多晚一个 idle_interval）
+    assert len(triggers) == 1
+    assert 1.9 - SLACK <= triggers[0].time <= 1.9 + 0.5 + SLACK
+
+
+def test_interval_fast_while_moving_over_explorer_and_idle_otherwise():
+    events = [(round(i * 0.05, 2), 300 + 10 * i, 50, EXPLORER) for i in range(20)]  # 空白处移动1秒
+    events += [(1.0, 300, 50, EDITOR),     # 其他窗口中静止
+               (3.0, 50, 50, EXPLORER),    # 移到 a.txt 上静止，4.0 秒时触发
+               (8.0, 50, 50, EXPLORER)]
+    source = RecordingSource(events)
+    triggers, _ = replay(source, tracker=_tracker())
+    assert len(triggers) == 1
+
+    def intervals(start, end):
+        return {round(seconds, 6) for now, seconds in source.sleeps if start <= now < end}
+
+    assert intervals(0.0, 1.0) == {0.05}
+    assert intervals(1.6, 3.0) == {0.5}
+    # 触发后鼠标静止：低频采样
+    assert intervals(4.0 + SLACK, 8.0) == {0.5}
+
+
+def test_interval_while_still_in_explorer():
+    tracker = _tracker()
+    tracker.on_window(EXPLORER, True, 0.0)
+    tracker.on_cursor(300, 50, 0.0)
+    tracker.on_file(None, 0.0)
+    assert tracker.next_interval(0.1) == 0.05
+    # 静止超过 settle_time 后在空白处按 interval 采样
+    assert tracker.next_interval(0.6) == 0.2
+
+    tracker.on_cursor(50, 50, 1.0)
+    tracker.on_file("a.txt", 1.0)
+    assert tracker.next_interval(1.6) == pytest.approx(0.2)
+    # 计时中的采样不晚于阈值到达时刻
+    assert tracker.next_interval(1.9) == pytest.approx(0.1)
+
+    tracker.poll(2.0)
+    assert tracker.next_interval(2.0) == 0.5
+
+
+def test_resolves_only_after_movement_or_window_change():
+    # 前1秒在资源管理器中移动10次，随后静止（含不超过 move_tolerance 的抖动）
+    events = [(i * 0.1, 50 + 20 * i, 50, EXPLORER) for i in range(10)]
+    events += [(1.0 + i * 0.3, 300 + i % 2 * 3, 52, EXPLORER) for i in range(30)]
+    source = _source(events)
+    loop = HoverLoop(source, lambda trigger: None, tracker=_tracker(), clock=source.clock, sleep=source.sleep)
+
+    _step_until(loop, source, 1.5)
+    resolves, samples = loop.resolves, loop.samples
+    # 每次移动最多解析一次，外加进入资源管理器时的一次
+    assert resolves <= 10 + 1 + 1
+
+    _step_until(loop, source, 10.0)
+    assert loop.samples > samples + 20
+    assert loop.resolves == resolves
+
+    # 切换窗口再切回时重新解析
+    source.events.append((10.5, 300, 52, EDITOR))
+    source.events.append((11.0, 300, 52, EXPLORER))
+    _step_until(loop, source, 12.0)
+    assert loop.resolves == resolves + 1
+
+
+def test_no_resolves_outside_explorer():
+    events = [(i * 0.05, 10 * i, 50, EDITOR) for i in range(100)]
+    triggers, loop = replay(_source(events), tracker=_tracker())
+
+    assert triggers == []
+    assert loop.resolves == 0
+
+
+def test_replay_benchmark(capsys):
+    assert cli.main_cli(["bench", "hover", "--size", "120", "--json"]) == 0
+    result = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+
+    # 每10秒一个周期：停在文件上的4秒内触发（冷却时间内回到同一文件不触发），
+    # 静止期间不重新解析文件，解析次数远少于采样次数
+    assert result["triggers"] >= 6
+    assert 0 < result["resolves"] < result["samples"] / 2
+    # 平均采样间隔不小于 fast_interval 的一半
+    assert result["samples"] <= 120 / 0.025
+    assert result["step_us"] < 1000
@@ -0,0 +1,89 @@
+from key_cache import UnwrappedKeyCache
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _buffers(cache, user_id, encrypted_key):
+    key_buffer, salt_buffer, _ = cache._entries[cache.make_cache_key(user_id, encrypted_key)]
+    return key_buffer, salt_buffer
+
+
+def test_expired_entry_zeroed_by_other_lookups():
+    clock = FakeClock()
+    cache = UnwrappedKeyCache(max_entries=8, ttl=10, purge_interval=5, clock=clock)
+    cache.put("alice", b"wrapped-a", b"\x11" * 32, b"\x22" * 16)
+    key_buffer, salt_buffer = _buffers(cache, "alice", b"wrapped-a")
+
+    clock.now += 4
+    cache.put("bob", b"wrapped-b", b"\x33" * 32)
+    assert len(cache) == 2
+
+    # alice 的密钥过期后不再被查询：查询其他密钥时即被清除并清零
+    clock.now += 7
+    assert cache.get("bob", b"wrapped-b") == (b"\x33" * 32, None)
+    assert len(cache) == 1
+    assert key_buffer == bytes(32)
+    assert salt_buffer == bytes(16)
+
+
+def test_lookups_purge_at_most_once_per_interval():
+    clock = FakeClock()
+    cache = UnwrappedKeyCache(max_entries=8, ttl=10, purge_interval=30, clock=clock)
+    cache.put("alice", b"wrapped-a", b"\x11" * 32)
+    key_buffer, _ = _buffers(cache, "alice", b"wrapped-a")
+
+    clock.now += 11
+    cache.get("bob", b"wrapped-b")
+    # 距上次清理不足 purge_interval，过期条目暂时保留
+    assert len(cache) == 1
+    assert key_buffer == b"\x11" * 32
+
+    clock.now += 20
+    cache.get("bob", b"wrapped-b")
+    assert len(cache) == 0
+    assert key_buffer == bytes(32)
+
+
+def test_purge_expired_zeroes_only_expired_entries():
+    clock = FakeClock()
+    cache = UnwrappedKeyCache(max_entries=8, ttl=10, purge_interval=3600, clock=clock)
+    cache.put("alice", b"wrapped-a", b"\x11" * 32)
+    clock.now += 6
+    cache.put("bob", b"wrapped-b", b"\x33" * 32)
+    old_buffer, _ = _buffers(cache, "alice", b"wrapped-a")
+    new_buffer, _ = _buffers(cache, "bob", b"wrapped-b")
+
+    clock.now += 5
+    assert cache.purge_expired() == 1
+    assert old_buffer == bytes(32)
+    assert new_buffer == b"\x33" * 32
+    assert cache.get("bob", b"wrapped-b") == (b"\x33" * 32, None)
+
+
+def test_expired_entry_not_returned():
+    clock = FakeClock()
+    cache = UnwrappedKeyCache(max_entries=8, ttl=10, purge_interval=3600, clock=clock)
+    cache.put("alice", b"wrapped-a", b"\x11" * 32, b"\x22" * 16)
+    assert cache.get("alice", b"wrapped-a") == (b"\x11" * 32, b"\x22" * 16)
+
+    clock.now += 10
+    assert cache.get("alice", b"wrapped-a") == (None, None)
+    assert len(cache) == 0
+
+
+def test_evicted_entries_zeroed():
+    cache = UnwrappedKeyCache(max_entries=2, ttl=600)
+    cache.put("alice", b"wrapped-a", b"\x11" * 32)
+    key_buffer, _ = _buffers(cache, "alice", b"wrapped-a")
+    cache.put("bob", b"wrapped-b", b"\x33" * 32)
+    cache.put("carol", b"wrapped-c", b"\x44" * 32)
+
+    assert len(cache) == 2
+    assert key_buffer == bytes(32)
+    assert cache.forget_all() == 2
@@ -0,0 +1,147 @@
+import threading
+import time
+
+from message_dispatcher import MessageDispatcher
+
+
+def _message(message_type, value):
+    return {"type": message_type, "data": {"value": value}}
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class Recorder:
+    """记录处理顺序；gate 未设置时第一条消息阻塞在处理函数中"""
+
+    def __init__(self, block_first=False):
+        self.handled = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        if not block_first:
+            self.gate.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, data):
+        self.started.set()
+        self.gate.wait(5)
+        with self._lock:
+            self.handled.append(data["value"])
+
+
+def _free_slots(dispatcher):
+    """不阻塞地占用剩余的全部队列名额并归还，返回名额数"""
+    taken = 0
+    while dispatcher._slots.acquire(blocking=False):
+        taken += 1
+    for _ in range(taken):
+        dispatcher._slots.release()
+    return taken
+
+
+def test_messages_of_one_type_handled_in_order():
+    dispatcher = MessageDispatcher(max_workers=4, max_pending=16)
+    recorder = Recorder()
+    dispatcher.register("a", recorder)
+
+    for i in range(10):
+        assert dispatcher.dispatch(_message("a", i), timeout=1)
+    assert _wait_for(lambda: dispatcher.pending_count() == 0)
+    dispatcher.shutdown()
+
+    assert recorder.handled == list(range(10))
+    assert _free_slots(dispatcher) == 16
+
+
+def test_shutdown_waits_for_queued_messages_then_dispatch_again():
+    dispatcher = MessageDispatcher(max_workers=2, max_pending=4)
+    recorder = Recorder(block_first=True)
+    dispatcher.register("a", recorder)
+
+    for i in range(4):
+        assert dispatcher.dispatch(_message("a", i), timeout=1)
+    assert recorder.started.wait(5)
+    assert not dispatcher.try_dispatch(_message("a", 99))
+
+    threading.Timer(0.05, recorder.gate.set).start()
+    dispatcher.shutdown(wait=True)
+
+    # 排队中的消息在线程池停止后继续按顺序处理完毕，名额全部归还
+    assert recorder.handled == [0, 1, 2, 3]
+    assert dispatcher.pending_count() == 0
+    assert _free_slots(dispatcher) == 4
+
+    # 停止后再次分发时重新创建线程池
+    for i in range(4, 8):
+        assert dispatcher.dispatch(_message("a", i), timeout=1)
+    assert _wait_for(lambda: dispatcher.pending_count() == 0)
+    dispatcher.shutdown()
+    assert recorder.handled == list(range(8))
+    assert _free_slots(dispatcher) == 4
+
+
+def test_shutdown_without_wait_drops_queued_messages_and_releases_slots():
+    dispatcher = MessageDispatcher(max_workers=2, max_pending=4)
+    recorder = Recorder(block_first=True)
+    dispatcher.register("a", recorder)
+
+    for i in range(4):
+        assert dispatcher.dispatch(_message("a", i), timeout=1)
+    assert recorder.started.wait(5)
+    assert dispatcher.pending_count() == 4
+
+    dispatcher.shutdown(wait=False)
+    # 只剩正在处理的一条，丢弃的三条消息的名额已归还
+    assert dispatcher.pending_count() == 1
+    assert _free_slots(dispatcher) == 3
+
+    # 停止后分发的同类型消息排在正在处理的消息之后
+    for i in range(4, 7):
+        assert dispatcher.try_dispatch(_message("a", i))
+    assert not dispatcher.try_dispatch(_message("a", 99))
+    assert dispatcher.pending_count() == 4
+
+    recorder.gate.set()
+    assert _wait_for(lambda: dispatcher.pending_count() == 0)
+    assert recorder.handled == [0, 4, 5, 6]
+    assert _free_slots(dispatcher) == 4
+    dispatcher.shutdown()
+
+
+def test_shutdown_without_wait_then_dispatch_other_type():
+    dispatcher = MessageDispatcher(max_workers=2, max_pending=4)
+    blocked = Recorder(block_first=True)
+    other = Recorder()
+    dispatcher.register("a", blocked)
+    dispatcher.register("b", other)
+
+    for i in range(3):
+        assert dispatcher.dispatch(_message("a", i), timeout=1)
+    assert blocked.started.wait(5)
+    dispatcher.shutdown(wait=False)
+
+    for i in range(3):
+        assert dispatcher.dispatch(_message("b", i), timeout=1)
+    assert _wait_for(lambda: len(other.handled) == 3)
+    assert other.handled == [0, 1, 2]
+
+    blocked.gate.set()
+    assert _wait_for(lambda: dispatcher.pending_count() == 0)
+    assert blocked.handled == [0]
+    assert _free_slots(dispatcher) == 4
+    dispatcher.shutdown()
+
+
+def test_unknown_type_releases_slot():
+    dispatcher = MessageDispatcher(max_workers=1, max_pending=2)
+
+    for i in range(5):
+        assert dispatcher.try_dispatch(_message("unknown", i))
+    assert dispatcher.pending_count() == 0
+    assert _free_slots(dispatcher) == 2
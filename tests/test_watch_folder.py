@@ -0,0 +1,204 @@
+import os
+import time
+
+import pytest
+
+import main
+import watch_folder
+from watch_folder import StabilityTracker, WatchFolderEncryptor
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _write(path, data=b"x"):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def _append(path, data=b"y"):
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def _write_server_encrypted(path, original=b"hello"):
+    """写入服务器密钥加密文件格式的文件（密文和密钥密文为随机数据）"""
+    wrapped = os.urandom(256)
+    with open(path, "wb") as f:
+        f.write(os.urandom(16))
+        f.write(len(original).to_bytes(8, byteorder="big"))
+        f.write(os.urandom(16))
+        f.write(wrapped)
+        f.write(len(wrapped).to_bytes(4, byteorder="big"))
+        f.write(b"ENCRYPTED")
+    return str(path)
+
+
+def _encryptor(tmp_path, clock, **kwargs):
+    kwargs.setdefault("settle_time", 2.0)
+    kwargs.setdefault("encrypt", lambda path: path + ".enc")
+    return WatchFolderEncryptor(folders=[str(tmp_path)], clock=clock, **kwargs)
+
+
+def _queued(encryptor):
+    items = []
+    while not encryptor.queue.empty():
+        items.append(encryptor.queue.get_nowait())
+    return items
+
+
+def test_stability_tracker_waits_for_settle_time(tmp_path):
+    clock = FakeClock()
+    tracker = StabilityTracker(settle_time=2.0, clock=clock)
+    path = _write(tmp_path / "a.bin")
+
+    tracker.touch(path)
+    clock.now += 1.5
+    assert tracker.ready() == []
+
+    # 写入仍在继续：大小变化后重新计时
+    _append(path)
+    clock.now += 0.1
+    assert tracker.ready() == []
+    clock.now += 1.9
+    assert tracker.ready() == []
+    clock.now += 0.1
+    assert tracker.ready() == [path]
+    assert len(tracker) == 0
+
+
+def test_stability_tracker_drops_deleted_files(tmp_path):
+    clock = FakeClock()
+    tracker = StabilityTracker(settle_time=1.0, clock=clock)
+    path = _write(tmp_path / "a.bin")
+    tracker.touch(path)
+
+    os.remove(path)
+    clock.now += 5
+    assert tracker.ready() == []
+    assert len(tracker) == 0
+
+
+def test_duplicate_events_coalesced(tmp_path):
+    clock = FakeClock()
+    encryptor = _encryptor(tmp_path, clock)
+    path = _write(tmp_path / "a.bin")
+
+    for _ in range(50):
+        encryptor._process([path])
+    assert len(encryptor.tracker) == 1
+    assert encryptor.queue.qsize() == 0
+
+    clock.now += 2.0
+    encryptor._process([path, path])
+    assert encryptor.queue.qsize() == 1
+    assert encryptor.pending_count() == 1
+
+    # 已入队的文件的后续事件不再重复记录
+    encryptor._process([path] * 10)
+    assert len(encryptor.tracker) == 0
+    assert _queued(encryptor) == [path]
+
+
+def test_full_queue_moves_files_to_backlog(tmp_path):
+    clock = FakeClock()
+    encryptor = _encryptor(tmp_path, clock, queue_size=2)
+    paths = [_write(tmp_path / f"f{i}.bin") for i in range(5)]
+
+    encryptor._process(paths)
+    clock.now += 2.0
+    encryptor._process([])
+    assert encryptor.queue.qsize() == 2
+    assert len(encryptor._backlog) == 3
+    assert encryptor.pending_count() == 5
+
+    # 队列空出后，积压的文件在下一轮入队，已入队的文件不重复入队
+    first = _queued(encryptor)
+    encryptor._queued.difference_update(first)
+    encryptor._process([])
+    second = _queued(encryptor)
+    encryptor._queued.difference_update(second)
+    encryptor._process([])
+    third = _queued(encryptor)
+
+    assert sorted(first + second + third) == sorted(paths)
+    assert len(first) == len(second) == 2 and len(third) == 1
+    assert encryptor._backlog == []
+
+
+@pytest.mark.parametrize("name", ["a.bin.enc", "b.tmp", "c.part", "d.crdownload", "~$report.docx", ".hidden"])
+def test_ignore_patterns(tmp_path, name):
+    clock = FakeClock()
+    encryptor = _encryptor(tmp_path, clock)
+    path = _write(tmp_path / name)
+
+    assert encryptor.should_ignore(path)
+    encryptor._process([path])
+    clock.now += 10
+    encryptor._process([])
+    assert len(encryptor.tracker) == 0
+    assert encryptor.queue.qsize() == 0
+
+
+def test_files_with_newer_enc_skipped(tmp_path):
+    clock = FakeClock()
+    encryptor = _encryptor(tmp_path, clock)
+    done = _write(tmp_path / "done.bin")
+    _write(tmp_path / "done.bin.enc")
+    os.utime(done, (1, 1))
+    todo = _write(tmp_path / "report.pdf")
+
+    assert not encryptor.should_ignore(todo)
+    encryptor._process([done, todo])
+    clock.now += 2.0
+    encryptor._process([])
+    assert _queued(encryptor) == [todo]
+
+
+def test_remove_original_refused_for_local_output(tmp_path, capsys):
+    encryptor = _encryptor(tmp_path, FakeClock())
+    local = main.encrypt_locally(_write(tmp_path / "local.bin"), None)
+    server = _write_server_encrypted(tmp_path / "server.bin.enc")
+
+    assert not encryptor._can_remove_original(local)
+    assert "保留原文件" in capsys.readouterr().out
+    assert not encryptor._can_remove_original(_write(tmp_path / "garbage.enc", b"not encrypted"))
+    assert encryptor._can_remove_original(server)
+
+
+@pytest.mark.parametrize("mode", ["local", "server"])
+def test_worker_removes_original_only_for_server_output(tmp_path, monkeypatch, mode):
+    monkeypatch.setitem(watch_folder.WATCH_CONFIG, "remove_original", True)
+    encrypted = []
+
+    def encrypt(path):
+        if mode == "local":
+            result = main.encrypt_locally(path, None)
+        else:
+            result = _write_server_encrypted(path + ".enc")
+        encrypted.append(path)
+        return result
+
+    encryptor = WatchFolderEncryptor(folders=[str(tmp_path)], settle_time=0.1, workers=1, use_polling=True,
+                                     encrypt=encrypt)
+    path = str(tmp_path / "report.pdf")
+    encryptor.start()
+    try:
+        _write(path, b"content")
+        deadline = time.monotonic() + 10
+        while encryptor.encrypted + encryptor.failed == 0:
+            assert time.monotonic() < deadline, "等待加密超时"
+            time.sleep(0.02)
+    finally:
+        encryptor.stop()
+
+    assert encrypted == [path]
+    assert encryptor.encrypted == 1
+    assert os.path.exists(path + ".enc")
+    assert os.path.exists(path) == (mode == "local")
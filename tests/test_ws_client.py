@@ -0,0 +1,428 @@
+import os
+import json
+import time
+import base64
+import random
+import asyncio
+import threading
+
+import pytest
+
+websockets = pytest.importorskip("websockets")
+
+import ws_client
+import rpc_channel
+from ws_client import WebSocketClient
+
+
+class MockWsServer:
+    """
+    本地模拟的WebSocket服务器：记录收到的JSON消息，收到 hello 时按配置回复 hello_ack
+    rpc_request 交给 rpc_handler(method, params)，返回 (延迟秒数, result, error)，
+    返回None时不回复；每个请求在独立的任务中处理，延迟不同的请求按完成顺序回复
+    """
+
+    def __init__(self, batch=False, ack=True, rpc_handler=None):
+        self.batch = batch
+        self.ack = ack
+        self.rpc_handler = rpc_handler
+        self.received = []
+        self.responded = []  # 已回复的 request_id，按回复顺序
+        self.connections = []
+        self.server = None
+
+    async def handler(self, websocket):
+        self.connections.append(websocket)
+        tasks = []
+        try:
+            async for frame in websocket:
+                message = json.loads(frame)
+                self.received.append(message)
+                if message["type"] == "hello" and self.ack:
+                    await websocket.send(json.dumps({"type": "hello_ack", "timestamp": int(time.time()),
+                                                     "data": {"encoding": "json", "batch": self.batch}}))
+                elif message["type"] == "rpc_request" and self.rpc_handler is not None:
+                    tasks.append(asyncio.ensure_future(self.reply(websocket, message["data"])))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def reply(self, websocket, request):
+        reply = self.rpc_handler(request["method"], request["params"])
+        if reply is None:
+            return
+        delay, result, error = reply
+        await asyncio.sleep(delay)
+        data = {"request_id": request["request_id"], "result": result}
+        if error:
+            data["error"] = error
+        self.responded.append(request["request_id"])
+        await websocket.send(json.dumps({"type": "rpc_response", "timestamp": int(time.time()), "data": data}))
+
+    async def __aenter__(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.server.sockets[0].getsockname()[1]}"
+
+    def messages(self, message_type):
+        return [m for m in self.received if m["type"] == message_type]
+
+    def request_ids(self, method=None):
+        return [m["data"]["request_id"] for m in self.messages("rpc_request")
+                if method is None or m["data"]["method"] == method]
+
+
+async def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("等待条件超时")
+        await asyncio.sleep(0.01)
+
+
+class ClientRunner:
+    """在当前事件循环中运行 WebSocketClient 的一次连接"""
+
+    def __init__(self):
+        self.client = WebSocketClient()
+        self.task = None
+
+    async def connect(self):
+        client = self.client
+        client.loop = asyncio.get_running_loop()
+        client.message_queue = asyncio.Queue()
+        client.stop_event = asyncio.Event()
+        client.running = True
+        self.task = asyncio.ensure_future(client.connect_websocket())
+        await wait_until(lambda: client.is_connected)
+
+    async def close(self):
+        self.client.stop_event.set()
+        await self.task
+        self.client.dispatcher.shutdown(wait=False)
+
+    def enqueue(self, message_type, data):
+        self.client._enqueue(ws_client.make_message(message_type, data), time.perf_counter())
+
+
+@pytest.fixture
+def ws_config(monkeypatch):
+    monkeypatch.setitem(ws_client.SERVER_CONFIG, "ws_encodings", ["json"])
+    monkeypatch.setitem(ws_client.SERVER_CONFIG, "heartbeat_interval", 3600)
+
+    def use(server):
+        monkeypatch.setitem(ws_client.SERVER_CONFIG, "ws_url", server.url)
+    return use
+
+
+def run_with_client(ws_config, scenario, **server_options):
+    """启动模拟服务器并连接客户端，执行 scenario(server, client)，返回其结果"""
+    async def main():
+        async with MockWsServer(**server_options) as server:
+            ws_config(server)
+            runner = ClientRunner()
+            await runner.connect()
+            try:
+                return await scenario(server, runner.client)
+            finally:
+                await runner.close()
+    return asyncio.run(main())
+
+
+# --- 编码协商与批量发送 ---
+
+def _send_three(ws_config, batch, ack=True):
+    async def scenario(server, client):
+        await wait_until(lambda: server.messages("hello"))
+        await wait_until(lambda: client.batch_enabled == batch)
+        for i in range(3):
+            client._enqueue(ws_client.make_message("status", {"session_id": "s", "file_name": f"f{i}",
+                                                             "status": "ok"}), time.perf_counter())
+        await wait_until(lambda: len(server.messages("status")) == 3 or server.messages("batch"))
+        return server
+    return run_with_client(ws_config, scenario, batch=batch, ack=ack)
+
+
+def test_hello_sent_in_json_mode(ws_config):
+    server = _send_three(ws_config, batch=False)
+    hello = server.received[0]
+    assert hello["type"] == "hello"
+    assert hello["data"]["encodings"] == ["json"]
+    assert hello["data"]["batch"] is True
+
+
+def test_individual_frames_without_batch_capability(ws_config):
+    server = _send_three(ws_config, batch=False)
+    assert server.messages("batch") == []
+    assert [m["data"]["file_name"] for m in server.messages("status")] == ["f0", "f1", "f2"]
+
+
+def test_individual_frames_when_server_ignores_hello(ws_config):
+    server = _send_three(ws_config, batch=False, ack=False)
+    assert server.messages("batch") == []
+    assert len(server.messages("status")) == 3
+
+
+def test_batch_frame_after_batch_capability(ws_config):
+    server = _send_three(ws_config, batch=True)
+    (batch,) = server.messages("batch")
+    assert [m["data"]["file_name"] for m in batch["data"]["messages"]] == ["f0", "f1", "f2"]
+    assert server.messages("status") == []
+
+
+# --- RPC ---
+
+def echo_handler(method, params):
+    """按 params 中的 delay 延迟后回显参数；method 为 fail 时返回错误，为 hang 时不回复"""
+    if method == "hang":
+        return None
+    if method == "fail":
+        return 0, None, "服务器内部错误"
+    return params.get("delay", 0), {"echo": params}, None
+
+
+def test_rpc_response_resolves_future_by_request_id(ws_config):
+    async def scenario(server, client):
+        result = await client.request_async("echo", {"value": 42})
+        return server, client, result
+
+    server, client, result = run_with_client(ws_config, scenario, rpc_handler=echo_handler)
+    assert result == {"echo": {"value": 42}}
+    (request,) = server.messages("rpc_request")
+    assert request["data"]["method"] == "echo"
+    assert client.pending_requests == {}
+
+
+def test_rpc_error_reply_raises(ws_config):
+    async def scenario(server, client):
+        with pytest.raises(RuntimeError, match="服务器内部错误"):
+            await client.request_async("fail")
+        return client
+
+    client = run_with_client(ws_config, scenario, rpc_handler=echo_handler)
+    assert client.pending_requests == {}
+
+
+def test_out_of_order_replies_reach_their_own_future(ws_config):
+    async def scenario(server, client):
+        slow = client.request("echo", {"name": "slow", "delay": 0.3})
+        fast = client.request("echo", {"name": "fast", "delay": 0})
+        await asyncio.wrap_future(fast)
+        assert not slow.done()
+        await asyncio.wrap_future(slow)
+        return server, slow, fast
+
+    server, slow, fast = run_with_client(ws_config, scenario, rpc_handler=echo_handler)
+    assert slow.result()["echo"]["name"] == "slow"
+    assert fast.result()["echo"]["name"] == "fast"
+    # 服务器先回复了后发送的请求
+    assert server.responded == list(reversed(server.request_ids()))
+
+
+def test_rpc_timeout_fires(ws_config):
+    async def scenario(server, client):
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            await client.request_async("hang", timeout=0.2)
+        return client, time.monotonic() - started
+
+    client, elapsed = run_with_client(ws_config, scenario, rpc_handler=echo_handler)
+    assert 0.15 <= elapsed < 2
+    assert client.pending_requests == {}
+
+
+def test_many_requests_in_flight(ws_config):
+    count = 200
+    rng = random.Random(1)
+
+    async def scenario(server, client):
+        futures = [client.request("echo", {"index": i, "delay": rng.uniform(0, 0.2)}) for i in range(count)]
+        # 所有请求都在任何响应到达前发出
+        await wait_until(lambda: len(server.messages("rpc_request")) == count)
+        assert len(client.pending_requests) > count // 2
+        results = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        return server, client, results
+
+    server, client, results = run_with_client(ws_config, scenario, rpc_handler=echo_handler)
+    assert [r["echo"]["index"] for r in results] == list(range(count))
+    assert server.responded != server.request_ids()  # 响应确实是乱序到达的
+    assert client.pending_requests == {}
+
+
+def test_disconnect_fails_pending_requests(ws_config):
+    async def scenario(server, client):
+        future = client.request("hang")
+        await wait_until(lambda: server.messages("rpc_request"))
+        await server.connections[0].close()
+        with pytest.raises(ConnectionError):
+            await asyncio.wrap_future(future)
+        return client
+
+    client = run_with_client(ws_config, scenario, rpc_handler=echo_handler)
+    assert client.pending_requests == {}
+
+
+def test_request_while_disconnected_fails_immediately():
+    client = WebSocketClient()
+    future = client.request("echo", {})
+    assert isinstance(future.exception(timeout=0), ConnectionError)
+    assert not client.pending_messages
+
+
+def test_failed_rpc_requests_not_replayed_after_reconnect(ws_config):
+    import concurrent.futures
+
+    async def main():
+        async with MockWsServer() as server:
+            ws_config(server)
+            runner = ClientRunner()
+            client = runner.client
+            # 断线期间排队的两个请求：一个已因断线失败（调用方已改用HTTP），一个仍在等待
+            failed, live = concurrent.futures.Future(), concurrent.futures.Future()
+            client.pending_requests.update({"failed": failed, "live": live})
+            client._enqueue(ws_client.make_message("rpc_request", {"request_id": "failed", "method": "x"}), 0)
+            client._enqueue(ws_client.make_message("rpc_request", {"request_id": "live", "method": "x"}), 0)
+            client._fail_request("failed", ConnectionError("WebSocket连接已断开"))
+
+            await runner.connect()
+            await wait_until(lambda: server.messages("rpc_request"))
+            await runner.close()
+            return server, failed
+
+    server, failed = asyncio.run(main())
+    assert isinstance(failed.exception(), ConnectionError)
+    assert server.request_ids() == ["live"]
+
+
+def test_timed_out_rpc_request_dropped_from_send_queue(ws_config):
+    async def scenario(server, client):
+        future = client.request("echo", {}, timeout=10)
+        # 请求在发送前超时：发送循环应丢弃它而不是发给服务器
+        client._fail_request(next(iter(client.pending_requests)), TimeoutError())
+        client._enqueue(ws_client.make_message("status", {"file_name": "after"}), time.perf_counter())
+        await wait_until(lambda: server.messages("status"))
+        return server, future
+
+    server, future = run_with_client(ws_config, scenario)
+    assert isinstance(future.exception(), TimeoutError)
+    assert server.messages("rpc_request") == []
+
+
+# --- main 的服务器调用：RPC优先，失败时回退到HTTP ---
+
+class ThreadedClient:
+    """在后台线程中运行 WebSocketClient.run()，与图形界面中的用法相同"""
+
+    def __init__(self):
+        self.client = WebSocketClient()
+        self.thread = threading.Thread(target=self.client.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        deadline = time.monotonic() + 5
+        while not self.client.is_connected:
+            assert time.monotonic() < deadline, "连接超时"
+            time.sleep(0.01)
+
+    def stop(self):
+        self.client.stop()
+        self.thread.join(5)
+        self.client.dispatcher.shutdown(wait=False)
+
+
+@pytest.fixture
+def wrapped_key(key_server):
+    """用模拟密钥服务器的公钥包装的随机对称密钥：(密钥, 盐, 密钥密文)"""
+    import main
+    symmetric_key, salt = os.urandom(32), os.urandom(16)
+    encrypted_key = main.encrypt_symmetric_key(symmetric_key, salt, key_server.rsa_key.publickey())
+    return symmetric_key, salt, encrypted_key
+
+
+@pytest.fixture
+def rpc_server(ws_config, key_server):
+    """在后台线程的事件循环中运行模拟WebSocket服务器，key.decrypt 由模拟密钥服务器解密"""
+    mode = {"reply": "ok"}
+
+    def handler(method, params):
+        if method != "key.decrypt":
+            return 0, None, f"未知方法 {method}"
+        if mode["reply"] == "error":
+            return 0, None, "解密失败"
+        return 0, key_server.unwrap(params["encrypted_key"]), None
+
+    server = MockWsServer(rpc_handler=handler)
+    server.mode = mode
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    stop = asyncio.Event()
+
+    async def serve():
+        async with server:
+            ws_config(server)
+            ready.set()
+            await stop.wait()
+
+    thread = threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True)
+    thread.start()
+    ready.wait(5)
+    yield server
+    loop.call_soon_threadsafe(stop.set)
+    thread.join(5)
+    loop.close()
+    rpc_channel.set_rpc_channel(None)
+
+
+def test_key_decrypt_uses_rpc_when_connected(rpc_server, key_server, wrapped_key):
+    import main
+    symmetric_key, salt, encrypted_key = wrapped_key
+    runner = ThreadedClient()
+    runner.start()
+    rpc_channel.set_rpc_channel(runner.client)
+    try:
+        assert main.get_symmetric_key_from_server_v2("test_user", encrypted_key) == (symmetric_key, salt)
+    finally:
+        runner.stop()
+    assert len(rpc_server.request_ids("key.decrypt")) == 1
+    assert key_server.unwrap_requests("decrypt") == []
+
+
+def test_key_decrypt_falls_back_to_http_when_socket_down(rpc_server, key_server, wrapped_key):
+    import main
+    symmetric_key, salt, encrypted_key = wrapped_key
+    # 通道已设置但从未连接
+    rpc_channel.set_rpc_channel(WebSocketClient())
+
+    assert main.get_symmetric_key_from_server_v2("test_user", encrypted_key) == (symmetric_key, salt)
+    assert rpc_server.messages("rpc_request") == []
+    assert key_server.unwrap_requests("decrypt") == [1]
+
+
+def test_key_decrypt_falls_back_to_http_when_rpc_fails(rpc_server, key_server, wrapped_key):
+    import main
+    symmetric_key, salt, encrypted_key = wrapped_key
+    rpc_server.mode["reply"] = "error"
+    runner = ThreadedClient()
+    runner.start()
+    rpc_channel.set_rpc_channel(runner.client)
+    try:
+        assert main.get_symmetric_key_from_server_v2("test_user", encrypted_key) == (symmetric_key, salt)
+    finally:
+        runner.stop()
+    assert len(rpc_server.request_ids("key.decrypt")) == 1
+    assert key_server.unwrap_requests("decrypt") == [1]
+
+
+def test_call_server_rpc_returns_none_after_disconnect(rpc_server):
+    runner = ThreadedClient()
+    runner.start()
+    rpc_channel.set_rpc_channel(runner.client)
+    runner.stop()
+    assert rpc_channel.call_server_rpc("key.decrypt", {}) is None
@@ -0,0 +1,106 @@
+import json
+
+import pytest
+
+import cli
+from ws_codec import CODE_TYPES, MESSAGE_SCHEMAS, TYPE_CODES, MessageCodec, available_encodings
+
+SESSION_ID = "3f2b6c1e-8a47-4d0b-9c55-0e1f2a3b4c5d"
+REQUEST_ID = "0d9e8f7a-6b5c-4d3e-2f1a-0b9c8d7e6f5a"
+
+MESSAGES = {
+    "schema_full": {"type": "progress", "timestamp": 1.5,
+                    "data": {"session_id": SESSION_ID, "file_name": "报告.pdf", "progress": 42,
+                             "bytes_done": 4200, "bytes_total": 10000}},
+    "schema_none_value": {"type": "rpc_response", "timestamp": 2.0,
+                          "data": {"request_id": REQUEST_ID, "result": {"symmetric_key": "a2V5"}, "error": None}},
+    "schema_none_result": {"type": "rpc_response", "timestamp": 2.0,
+                           "data": {"request_id": REQUEST_ID, "result": None, "error": "未找到会话"}},
+    "schema_missing_tail": {"type": "register_session", "timestamp": 3.0, "data": {"session_id": SESSION_ID}},
+    "schema_missing_middle": {"type": "progress", "timestamp": 4.0,
+                              "data": {"session_id": SESSION_ID, "progress": 10}},
+    "schema_empty": {"type": "heartbeat", "timestamp": 5.0, "data": {}},
+    "schema_nested": {"type": "rpc_request", "timestamp": 6.0,
+                      "data": {"request_id": REQUEST_ID, "method": "decrypt_key",
+                               "params": {"user_id": "alice", "keys": ["a", "b"], "options": None}}},
+    "extra_field": {"type": "status", "timestamp": 7.0,
+                    "data": {"session_id": SESSION_ID, "file_name": "a.txt", "status": "done", "extra": None}},
+    "unknown_type": {"type": "session_rejected", "timestamp": 8.0,
+                     "data": {"session_id": SESSION_ID, "reason": None}},
+}
+
+
+class CompactJsonCodec(MessageCodec):
+    """
+    以JSON作为外层格式的二进制编码路径，用于在没有安装 msgpack/cbor2 时
+    测试按schema压缩和展开消息的逻辑
+    """
+
+    def __init__(self):
+        self.encoding = "compact-json"
+
+    def _pack(self, obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def _unpack(self, payload):
+        return json.loads(payload.decode("utf-8"))
+
+
+def _codecs():
+    return [pytest.param(MessageCodec(encoding), id=encoding) for encoding in available_encodings()] + \
+        [pytest.param(CompactJsonCodec(), id="compact-json")]
+
+
+@pytest.mark.parametrize("codec", _codecs())
+@pytest.mark.parametrize("name", list(MESSAGES))
+def test_round_trip_matches_json(codec, name):
+    message = MESSAGES[name]
+    decoded = codec.decode(codec.encode(message))
+
+    assert decoded == message
+    assert decoded == MessageCodec("json").decode(MessageCodec("json").encode(message))
+
+
+@pytest.mark.parametrize("codec", _codecs())
+def test_batch_round_trip(codec):
+    messages = list(MESSAGES.values())
+    decoded = codec.decode(codec.encode_batch(messages))
+
+    assert decoded == {"type": "batch", "timestamp": messages[-1]["timestamp"], "data": {"messages": messages}}
+
+
+def test_schema_messages_sent_without_field_names():
+    codec = CompactJsonCodec()
+
+    compact = codec._compact(MESSAGES["schema_none_value"])
+    assert compact == [TYPE_CODES["rpc_response"], 2.0, [REQUEST_ID, {"symmetric_key": "a2V5"}, None]]
+    # 缺少的末尾字段不编码
+    assert codec._compact(MESSAGES["schema_missing_tail"])[2] == [SESSION_ID]
+    # 缺少中间字段、包含未定义字段或无schema的消息保留字段名
+    for name in ("schema_missing_middle", "extra_field", "unknown_type"):
+        message = MESSAGES[name]
+        assert codec._compact(message) == [message["type"], message["timestamp"], message["data"]]
+
+
+def test_shorter_array_from_older_schema_decodes_present_fields():
+    # 旧版本的对端只发送较少的字段（字段只在末尾追加）
+    codec = CompactJsonCodec()
+    frame = codec._pack([TYPE_CODES["progress"], 1.0, [SESSION_ID, "a.txt", None]])
+
+    assert codec.decode(frame)["data"] == {"session_id": SESSION_ID, "file_name": "a.txt", "progress": None}
+
+
+def test_type_codes_cover_all_schemas():
+    assert set(CODE_TYPES.values()) == set(MESSAGE_SCHEMAS)
+
+
+def test_codec_benchmark(capsys):
+    assert cli.main_cli(["bench", "codec", "--size", "0.05", "--json"]) == 0
+    result = json.loads(capsys.readouterr().out.strip().splitlines()[-1])
+
+    assert result["iterations"] == 50
+    assert set(result["encodings"]) == set(available_encodings())
+    for messages in result["encodings"].values():
+        assert set(messages) == set(cli._codec_bench_messages())
+        assert all(item["bytes"] > 0 and item["decode_us"] > 0 for item in messages.values())
+        assert messages["batch"]["bytes"] > messages["progress"]["bytes"]
@@ -0,0 +1,412 @@
+import os
+import sys
+import time
+import queue
+import select
+import struct
+import fnmatch
+import argparse
+import threading
+import ctypes
+import ctypes.util
+
+try:
+    from config import WATCH_CONFIG
+except ImportError:
+    WATCH_CONFIG = {
+        "folders": [],
+        "recursive": True,
+        "settle_time": 2.0,
+        "poll_interval": 1.0,
+        "queue_size": 1000,
+        "workers": 2,
+        "ignore_patterns": ["*.enc", "*.tmp", "*.part", "*.crdownload", "~$*", ".*"],
+        "encrypt_existing": False,
+        "remove_original": False,
+        "user_id": "default_user",
+    }
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+def iter_files(folders, recursive=True):
+    """列出目录中的所有文件"""
+    for folder in folders:
+        if recursive:
+            for root, _, names in os.walk(folder):
+                for name in names:
+                    yield os.path.join(root, name)
+        else:
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            yield entry.path
+            except OSError as e:
+                print(f"读取目录失败 {folder}: {e}")
+
+
+class InotifyWatcher:
+    """
+    基于 inotify 的目录监控（仅Linux，通过ctypes调用libc）
+    wait(timeout) 返回期间有写入、创建或移入的文件路径集合；
+    内核事件队列溢出时返回所有文件，由调用方按大小和修改时间判断是否有变化
+    """
+
+    def __init__(self, folders, recursive=True):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("系统不支持 inotify")
+        self.folders = list(folders)
+        self.recursive = recursive
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._dirs = {}  # wd -> 目录路径
+        for folder in self.folders:
+            self._add_tree(folder)
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            print(f"无法监控目录 {path}: {os.strerror(ctypes.get_errno())}")
+            return
+        self._dirs[wd] = path
+
+    def _add_tree(self, folder):
+        self._add_watch(folder)
+        if self.recursive:
+            for root, dirs, _ in os.walk(folder):
+                for name in dirs:
+                    self._add_watch(os.path.join(root, name))
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + name_len].rstrip(b"\0")
+                offset += name_len
+                if mask & IN_Q_OVERFLOW:
+                    print("inotify 事件队列溢出，重新扫描监控目录")
+                    changed.update(iter_files(self.folders, self.recursive))
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                folder = self._dirs.get(wd)
+                if folder is None or not name:
+                    continue
+                path = os.path.join(folder, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                        # 新建或移入的子目录：添加监控，并处理添加监控前已写入的文件
+                        self._add_tree(path)
+                        changed.update(iter_files([path], True))
+                    continue
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """定期扫描目录的监控方式，用于不支持 inotify 的系统"""
+
+    def __init__(self, folders, recursive=True, interval=None):
+        self.folders = list(folders)
+        self.recursive = recursive
+        self.interval = interval or WATCH_CONFIG.get("poll_interval", 1.0)
+        self._snapshot = self._scan()
+        self._next_scan = time.monotonic() + self.interval
+
+    def _scan(self):
+        snapshot = {}
+        for path in iter_files(self.folders, self.recursive):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        delay = self._next_scan - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return set()
+        if delay > 0:
+            time.sleep(delay)
+        self._next_scan = time.monotonic() + self.interval
+        snapshot = self._scan()
+        changed = {path for path, sig in snapshot.items() if self._snapshot.get(path) != sig}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(folders, recursive=True, use_polling=False):
+    """优先使用 inotify，不可用时回退到定期扫描"""
+    if not use_polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folders, recursive)
+        except (OSError, AttributeError) as e:
+            print(f"inotify 不可用（{e}），使用定期扫描")
+    return PollingWatcher(folders, recursive)
+
+
+class StabilityTracker:
+    """
+    写入完成判断：文件的大小和修改时间在 settle_time 秒内不再变化时视为写入完成
+    同一文件的多次事件合并为一条记录
+    """
+
+    def __init__(self, settle_time=None, clock=time.monotonic):
+        self.settle_time = WATCH_CONFIG.get("settle_time", 2.0) if settle_time is None else settle_time
+        self.clock = clock
+        self._pending = {}  # 路径 -> ((大小, 修改时间), 最近一次变化的时间)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def touch(self, path):
+        """记录文件有新的事件"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._pending.pop(path, None)
+            return
+        signature = (st.st_size, st.st_mtime_ns)
+        entry = self._pending.get(path)
+        if entry is None or entry[0] != signature:
+            self._pending[path] = (signature, self.clock())
+
+    def ready(self):
+        """返回并移除已写入完成的文件"""
+        now = self.clock()
+        done = []
+        for path, (signature, changed_at) in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != signature:
+                self._pending[path] = (current, now)
+            elif now - changed_at >= self.settle_time:
+                del self._pending[path]
+                done.append(path)
+        return done
+
+
+class WatchFolderEncryptor:
+    """
+    监控目录自动加密
+    一个监控线程接收文件系统事件、合并重复事件并等待文件写入完成，写入完成的文件放入有界队列；
+    固定数量的工作线程从队列中取文件，使用共享进程池（main.get_shared_pool）加密。
+    队列已满时文件留在待处理列表中，下一轮再尝试，不为每个事件创建线程
+    """
+
+    def __init__(self, folders=None, recursive=None, settle_time=None, queue_size=None, workers=None,
+                 user_id=None, use_polling=False, encrypt=None, clock=time.monotonic):
+        self.folders = [os.path.abspath(f) for f in (folders or WATCH_CONFIG.get("folders", []))]
+        self.recursive = WATCH_CONFIG.get("recursive", True) if recursive is None else recursive
+        self.user_id = user_id or WATCH_CONFIG.get("user_id", "default_user")
+        self.workers = workers or WATCH_CONFIG.get("workers", 2)
+        self.use_polling = use_polling
+        self.ignore_patterns = WATCH_CONFIG.get("ignore_patterns", [])
+        self.tracker = StabilityTracker(settle_time, clock=clock)
+        self.queue = queue.Queue(maxsize=queue_size or WATCH_CONFIG.get("queue_size", 1000))
+        self.encrypt = encrypt or self._encrypt  # encrypt(file_path) -> 加密文件路径或None
+        self.running = False
+        self.encrypted = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._queued = set()  # 已在队列中或正在加密的文件
+        self._backlog = []  # 已写入完成但队列已满的文件
+        self._threads = []
+
+    def should_ignore(self, path):
+        """加密输出、临时文件和隐藏文件不处理"""
+        name = os.path.basename(path)
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore_patterns)
+
+    def already_encrypted(self, path):
+        """已存在不早于原文件的 .enc 文件"""
+        try:
+            return os.path.getmtime(path + ".enc") >= os.path.getmtime(path)
+        except OSError:
+            return False
+
+    def start(self):
+        """启动监控线程和工作线程"""
+        if not self.folders:
+            raise ValueError("未配置监控目录")
+        self.running = True
+        watcher = create_watcher(self.folders, self.recursive, self.use_polling)
+        print(f"开始监控 {len(self.folders)} 个目录（{type(watcher).__name__}）: {', '.join(self.folders)}")
+        if WATCH_CONFIG.get("encrypt_existing", False):
+            for path in iter_files(self.folders, self.recursive):
+                self._on_event(path)
+        self._threads = [threading.Thread(target=self._watch_loop, args=(watcher,), name="WatchFolder", daemon=True)]
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker, name=f"WatchEncrypt-{i}", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, wait=True):
+        """停止监控；wait为True时等待正在加密的文件完成"""
+        self.running = False
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def pending_count(self):
+        """等待写入完成、等待入队和队列中的文件数"""
+        with self._lock:
+            return len(self.tracker) + len(self._backlog) + len(self._queued)
+
+    def _on_event(self, path):
+        if self.should_ignore(path) or self.already_encrypted(path):
+            return
+        with self._lock:
+            if path in self._queued:
+                return
+        self.tracker.touch(path)
+
+    def _watch_loop(self, watcher):
+        tick = min(self.tracker.settle_time / 2, 0.5) or 0.1
+        try:
+            while self.running:
+                self._process(watcher.wait(tick))
+        except Exception as e:
+            print(f"目录监控出错: {e}")
+            self.running = False
+        finally:
+            watcher.close()
+
+    def _process(self, changed):
+        """处理一轮监控事件：合并事件，把写入完成的文件和上一轮未能入队的文件放入队列"""
+        for path in changed:
+            self._on_event(path)
+        self._enqueue(self._backlog + self.tracker.ready())
+
+    def _enqueue(self, paths):
+        backlog = []
+        for path in paths:
+            with self._lock:
+                if path in self._queued:
+                    continue
+                try:
+                    self.queue.put_nowait(path)
+                except queue.Full:
+                    backlog.append(path)
+                    continue
+                self._queued.add(path)
+        self._backlog = backlog
+
+    def _worker(self):
+        while self.running:
+            try:
+                path = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                result = self.encrypt(path)
+                with self._lock:
+                    if result:
+                        self.encrypted += 1
+                    else:
+                        self.failed += 1
+                if result and WATCH_CONFIG.get("remove_original", False) and self._can_remove_original(result):
+                    os.remove(path)
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                print(f"加密 {path} 时出错: {e}")
+            finally:
+                with self._lock:
+                    self._queued.discard(path)
+                self.queue.task_done()
+
+    def _can_remove_original(self, encrypted_path):
+        """只有密钥由服务器保管的加密文件才删除原文件，本地加密的文件密钥保存在文件中"""
+        from enc_format import read_encrypted_file_info
+        info = read_encrypted_file_info(encrypted_path)
+        if info is None or info["mode"] == "local":
+            print(f"{encrypted_path} 不是服务器密钥加密的文件，保留原文件")
+            return False
+        return True
+
+    def _encrypt(self, path):
+        """使用服务器公钥加密；无法获取公钥时失败，不回退到本地加密"""
+        import main
+        rsa_public_key = main.get_user_public_key_from_server(self.user_id)
+        if rsa_public_key is None:
+            print(f"无法获取服务器公钥，暂不加密 {path}")
+            return None
+        return main.aes_encrypt_file(path, self.user_id, rsa_public_key=rsa_public_key, pool=main.get_shared_pool())
+
+
+def main_cli(argv=None):
+    """命令行入口：python watch_folder.py 目录 [目录...]，Ctrl+C 停止"""
+    parser = argparse.ArgumentParser(description="监控目录，自动加密写入完成的文件")
+    parser.add_argument("folders", nargs="*", help="要监控的目录，默认使用 WATCH_CONFIG['folders']")
+    parser.add_argument("--no-recursive", action="store_true", help="不监控子目录")
+    parser.add_argument("--polling", action="store_true", help="使用定期扫描代替 inotify")
+    parser.add_argument("--settle", type=float, default=None, help="文件大小和修改时间保持不变多少秒后加密")
+    parser.add_argument("--workers", type=int, default=None, help="同时加密的文件数")
+    args = parser.parse_args(argv)
+
+    encryptor = WatchFolderEncryptor(
+        folders=args.folders or None,
+        recursive=False if args.no_recursive else None,
+        settle_time=args.settle,
+        workers=args.workers,
+        use_polling=args.polling,
+    )
+    try:
+        encryptor.start()
+    except ValueError as e:
+        print(e)
+        return 2
+    try:
+        while encryptor.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("正在停止...")
+    encryptor.stop()
+    print(f"已加密 {encryptor.encrypted} 个文件，失败 {encryptor.failed} 个")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
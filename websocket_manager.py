@@ -1,47 +1,41 @@
-import asyncio
-import json
-import time
-import threading
+import concurrent.futures
 from typing import Optional, Callable, Dict, Any
-import websockets
 from PyQt5.QtCore import QObject, pyqtSignal, QThread
-
-try:
-    from config import SERVER_CONFIG
-except ImportError:
-    SERVER_CONFIG = {
-        "ws_url": "ws://yourserver.com/ws",
-        "ws_timeout": 10,
-        "heartbeat_interval": 30,
-    }
+from message_dispatcher import MessageDispatcher
+from ws_client import WebSocketClient, make_message
 
 class WebSocketManager(QObject):
-    """WebSocket连接管理器，支持心跳包和异步通信"""
+    """
+    WebSocket连接管理器，支持心跳包和异步通信
+    连接、消息收发和RPC由不依赖Qt的 ws_client.WebSocketClient 实现，本类将其事件转为Qt信号
+    """
     
     # 定义信号
     connected = pyqtSignal()
     disconnected = pyqtSignal()
-    message_received = pyqtSignal(str)  # 接收到的消息
+    message_received = pyqtSignal(object)  # 接收到的消息（已在WebSocket线程中解码的字典）
     error_occurred = pyqtSignal(str)    # 错误信息
+    reconnecting = pyqtSignal(float)    # 即将重连，参数为等待秒数
+    _ui_call = pyqtSignal(object, object)  # 由工作线程转到GUI线程执行的处理函数及其参数
     
     def __init__(self):
         super().__init__()
-        self.websocket = None
         self.is_connected = False
-        self.heartbeat_task = None
-        self.receive_task = None
-        self.loop = None
         self.thread = None
-        self.message_handlers: Dict[str, Callable] = {}
+        self._ui_call.connect(self._run_ui_handler)
+        # 消息处理函数在分发器的线程池中执行，只有界面更新通过 _ui_call 回到GUI线程
+        self.dispatcher = MessageDispatcher(ui_invoker=self._ui_call.emit)
+        self.client = WebSocketClient(self.dispatcher)
         
     def start(self):
         """启动WebSocket连接"""
         if self.thread is None or not self.thread.isRunning():
-            self.thread = WebSocketThread(self)
+            self.thread = WebSocketThread(self.client)
             self.thread.connected.connect(self.on_connected)
             self.thread.disconnected.connect(self.on_disconnected)
             self.thread.message_received.connect(self.on_message_received)
             self.thread.error_occurred.connect(self.on_error_occurred)
+            self.thread.reconnecting.connect(self.reconnecting.emit)
             self.thread.start()
     
     def stop(self):
@@ -49,20 +43,55 @@ class WebSocketManager(QObject):
         if self.thread and self.thread.isRunning():
             self.thread.stop()
             self.thread.wait()
+        self.dispatcher.shutdown(wait=False)
     
     def send_message(self, message_type: str, data: Dict[str, Any] = None):
-        """发送消息到服务器"""
-        if self.thread and self.thread.isRunning():
-            message = {
-                "type": message_type,
-                "timestamp": int(time.time()),
-                "data": data or {}
-            }
-            self.thread.send_message(json.dumps(message))
-    
-    def register_handler(self, message_type: str, handler: Callable):
-        """注册消息处理器"""
-        self.message_handlers[message_type] = handler
+        """发送消息到服务器，连接断开期间的消息会在重连后补发"""
+        self.client.send_message(make_message(message_type, data))
+    
+    def get_send_latency_stats(self) -> Dict[str, float]:
+        """获取消息发送延迟统计"""
+        return self.client.get_send_latency_stats()
+    
+    @property
+    def session_id(self) -> Optional[str]:
+        return self.client.session_id
+    
+    def set_session_id(self, session_id: Optional[str]):
+        """设置会话ID，已连接时立即注册，断线重连后自动重新注册"""
+        self.client.set_session_id(session_id)
+    
+    @property
+    def rpc_available(self) -> bool:
+        """WebSocket是否已连接、可以发送RPC请求"""
+        return self.client.rpc_available
+    
+    def request(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> concurrent.futures.Future:
+        """发送RPC请求，返回在收到响应、超时或连接断开时完成的Future，见 WebSocketClient.request"""
+        return self.client.request(method, params, timeout)
+    
+    def call(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> Any:
+        """发送RPC请求并阻塞等待结果，失败时抛出异常"""
+        return self.client.call(method, params, timeout)
+    
+    async def request_async(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> Any:
+        """在任意事件循环中等待RPC请求的结果"""
+        return await self.client.request_async(method, params, timeout)
+    
+    def register_handler(self, message_type: str, handler: Callable, ui: bool = False):
+        """
+        注册消息处理器
+        处理器在工作线程中执行，同一类型的消息按接收顺序处理；
+        ui为True时处理器在GUI线程中执行，只应用于轻量的界面更新
+        """
+        self.dispatcher.register(message_type, handler, ui)
+    
+    def _run_ui_handler(self, handler: Callable, data: Dict[str, Any]):
+        """在GUI线程中执行界面处理器"""
+        try:
+            handler(data)
+        except Exception as e:
+            print(f"处理界面消息时出错: {e}")
     
     def on_connected(self):
         """连接成功回调"""
@@ -76,20 +105,9 @@ class WebSocketManager(QObject):
         self.disconnected.emit()
         print("WebSocket连接断开")
     
-    def on_message_received(self, message_str: str):
-        """接收消息回调"""
-        try:
-            message = json.loads(message_str)
-            message_type = message.get("type")
-            
-            if message_type in self.message_handlers:
-                self.message_handlers[message_type](message.get("data", {}))
-            else:
-                print(f"未处理的消息类型: {message_type}")
-                
-            self.message_received.emit(message_str)
-        except json.JSONDecodeError as e:
-            self.error_occurred.emit(f"消息解析错误: {e}")
+    def on_message_received(self, message: Dict[str, Any]):
+        """接收消息回调（处理器已由WebSocket线程交给分发器）"""
+        self.message_received.emit(message)
     
     def on_error_occurred(self, error: str):
         """错误回调"""
@@ -97,117 +115,27 @@ class WebSocketManager(QObject):
         print(f"WebSocket错误: {error}")
 
 class WebSocketThread(QThread):
-    """WebSocket工作线程"""
+    """运行 WebSocketClient 事件循环的Qt线程，将连接事件转为信号"""
     
     connected = pyqtSignal()
     disconnected = pyqtSignal()
-    message_received = pyqtSignal(str)
+    message_received = pyqtSignal(object)
     error_occurred = pyqtSignal(str)
+    reconnecting = pyqtSignal(float)
     
-    def __init__(self, manager: WebSocketManager):
+    def __init__(self, client: WebSocketClient):
         super().__init__()
-        self.manager = manager
-        self.running = False
-        self.websocket = None
-        self.loop = None
-        self.message_queue = asyncio.Queue()
+        self.client = client
+        client.on_connected = self.connected.emit
+        client.on_disconnected = self.disconnected.emit
+        client.on_message = self.message_received.emit
+        client.on_error = self.error_occurred.emit
+        client.on_reconnecting = self.reconnecting.emit
     
     def run(self):
         """运行WebSocket连接"""
-        try:
-            self.loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.loop)
-            self.running = True
-            
-            # 启动WebSocket连接
-            self.loop.run_until_complete(self.connect_websocket())
-            
-        except Exception as e:
-            self.error_occurred.emit(f"WebSocket线程错误: {e}")
-        finally:
-            self.running = False
-    
-    async def connect_websocket(self):
-        """连接WebSocket"""
-        try:
-            uri = SERVER_CONFIG["ws_url"]
-            self.websocket = await websockets.connect(
-                uri, 
-                ping_interval=20, 
-                ping_timeout=10,
-                close_timeout=10
-            )
-            
-            self.connected.emit()
-            
-            # 启动心跳任务
-            heartbeat_task = asyncio.create_task(self.heartbeat_loop())
-            receive_task = asyncio.create_task(self.receive_loop())
-            send_task = asyncio.create_task(self.send_loop())
-            
-            # 等待任务完成
-            await asyncio.gather(heartbeat_task, receive_task, send_task)
-            
-        except Exception as e:
-            self.error_occurred.emit(f"WebSocket连接失败: {e}")
-        finally:
-            if self.websocket:
-                await self.websocket.close()
-            self.disconnected.emit()
-    
-    async def heartbeat_loop(self):
-        """心跳包循环"""
-        while self.running and self.websocket:
-            try:
-                heartbeat_msg = {
-                    "type": "heartbeat",
-                    "timestamp": int(time.time()),
-                    "data": {"client_id": "pc_client"}
-                }
-                await self.websocket.send(json.dumps(heartbeat_msg))
-                await asyncio.sleep(SERVER_CONFIG["heartbeat_interval"])
-            except Exception as e:
-                self.error_occurred.emit(f"心跳包发送失败: {e}")
-                break
-    
-    async def receive_loop(self):
-        """接收消息循环"""
-        while self.running and self.websocket:
-            try:
-                message = await self.websocket.recv()
-                self.message_received.emit(message)
-            except websockets.exceptions.ConnectionClosed:
-                break
-            except Exception as e:
-                self.error_occurred.emit(f"接收消息失败: {e}")
-                break
-    
-    async def send_loop(self):
-        """发送消息循环"""
-        while self.running and self.websocket:
-            try:
-                # 从队列中获取消息
-                message = await asyncio.wait_for(
-                    self.message_queue.get(), 
-                    timeout=1.0
-                )
-                await self.websocket.send(message)
-            except asyncio.TimeoutError:
-                continue
-            except Exception as e:
-                self.error_occurred.emit(f"发送消息失败: {e}")
-                break
-    
-    def send_message(self, message: str):
-        """发送消息（线程安全）"""
-        if self.loop and self.running:
-            asyncio.run_coroutine_threadsafe(
-                self.message_queue.put(message), 
-                self.loop
-            )
+        self.client.run()
     
     def stop(self):
-        """停止线程"""
-        self.running = False
-        if self.loop:
-            self.loop.call_soon_threadsafe(self.loop.stop) 
\ No newline at end of file
+        """停止线程：通知事件循环关闭连接并结束所有任务"""
+        self.client.stop()
@@ -0,0 +1,417 @@
+import asyncio
+import time
+import uuid
+import random
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Optional, Callable, Dict, Any
+import websockets
+from ws_codec import MessageCodec, SCHEMA_VERSION, available_encodings
+from message_dispatcher import MessageDispatcher
+
+try:
+    from config import SERVER_CONFIG
+except ImportError:
+    SERVER_CONFIG = {
+        "ws_url": "ws://yourserver.com/ws",
+        "ws_timeout": 10,
+        "heartbeat_interval": 30,
+        "reconnect_base_delay": 1,
+        "reconnect_max_delay": 60,
+        "send_buffer_size": 1000,
+        "rpc_timeout": 10,
+        "ws_encodings": ["msgpack", "cbor", "json"],
+        "ws_compression": True,
+        "dispatch_workers": 4,
+        "dispatch_queue_size": 256,
+    }
+
+
+def make_message(message_type: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
+    """构造发送到服务器的消息"""
+    return {
+        "type": message_type,
+        "timestamp": int(time.time()),
+        "data": data or {}
+    }
+
+
+class WebSocketClient:
+    """
+    WebSocket连接和RPC请求/响应层，不依赖Qt，可在任意线程中运行（图形界面由 WebSocketThread 运行）
+    连接断开后按指数退避自动重连；发送队列由 run() 创建的事件循环持有，
+    其他线程通过 call_soon_threadsafe 投递消息，发送循环在消息到达时立即被唤醒。
+    连接事件通过可选回调通知：on_connected()、on_disconnected()、on_message(message)、
+    on_error(str)、on_reconnecting(delay)，回调在事件循环线程中调用
+    """
+    
+    def __init__(self, dispatcher: MessageDispatcher = None):
+        # 消息处理函数由分发器在线程池中执行
+        self.dispatcher = dispatcher or MessageDispatcher()
+        self.session_id: Optional[str] = None  # 每次（重新）连接后向服务器注册的会话
+        # 等待服务器响应的RPC请求：request_id -> Future
+        self.pending_requests: Dict[str, concurrent.futures.Future] = {}
+        self._rpc_lock = threading.Lock()
+        self.on_connected: Optional[Callable] = None
+        self.on_disconnected: Optional[Callable] = None
+        self.on_message: Optional[Callable] = None
+        self.on_error: Optional[Callable] = None
+        self.on_reconnecting: Optional[Callable] = None
+        self.running = False
+        self.websocket = None
+        self.loop = None
+        self.message_queue: Optional[asyncio.Queue] = None  # 在事件循环中创建
+        self.stop_event: Optional[asyncio.Event] = None
+        # 断线期间待发送的消息，重连后按顺序补发，超出容量时丢弃最早的消息
+        self.pending_messages = deque(maxlen=SERVER_CONFIG.get("send_buffer_size", 1000))
+        self.is_connected = False
+        # 当前连接使用的编解码器，连接建立时为JSON，收到 hello_ack 后切换
+        self.codec = MessageCodec("json")
+        # 服务器是否在 hello_ack 中声明支持批量消息，未声明时逐条发送
+        self.batch_enabled = False
+        # 最近发送消息的排队延迟（秒），从投递到写入WebSocket
+        self.send_latencies = deque(maxlen=1000)
+    
+    def _emit(self, callback: Optional[Callable], *args):
+        if callback is not None:
+            callback(*args)
+    
+    def set_session_id(self, session_id: Optional[str]):
+        """设置会话ID，已连接时立即注册，断线重连后自动重新注册"""
+        self.session_id = session_id
+        if self.is_connected and session_id:
+            self.send_message(make_message("register_session", {"session_id": session_id, "client_id": "pc_client"}))
+    
+    @property
+    def rpc_available(self) -> bool:
+        """WebSocket是否已连接、可以发送RPC请求"""
+        return self.is_connected
+    
+    def request(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> concurrent.futures.Future:
+        """
+        发送RPC请求，返回在收到响应、超时或连接断开时完成的Future
+        可在任意线程调用，多个请求可同时等待响应
+        """
+        future = concurrent.futures.Future()
+        if not self.rpc_available:
+            future.set_exception(ConnectionError("WebSocket未连接"))
+            return future
+        
+        request_id = uuid.uuid4().hex
+        timeout = timeout or SERVER_CONFIG.get("rpc_timeout", 10)
+        with self._rpc_lock:
+            self.pending_requests[request_id] = future
+        self.call_later(timeout, self._fail_request, request_id, TimeoutError(f"RPC请求 {method} 超时"))
+        self.send_message(make_message("rpc_request", {"request_id": request_id, "method": method, "params": params or {}}))
+        return future
+    
+    def call(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> Any:
+        """发送RPC请求并阻塞等待结果，失败时抛出异常"""
+        timeout = timeout or SERVER_CONFIG.get("rpc_timeout", 10)
+        # 超时由事件循环负责触发，这里多等待一秒作为兜底
+        return self.request(method, params, timeout).result(timeout + 1)
+    
+    async def request_async(self, method: str, params: Dict[str, Any] = None, timeout: float = None) -> Any:
+        """在任意事件循环中等待RPC请求的结果"""
+        return await asyncio.wrap_future(self.request(method, params, timeout))
+    
+    def handle_rpc_response(self, message: Dict[str, Any]) -> bool:
+        """在WebSocket线程中处理RPC响应，返回消息是否为RPC响应"""
+        if message.get("type") != "rpc_response":
+            return False
+        data = message.get("data", {})
+        with self._rpc_lock:
+            future = self.pending_requests.pop(data.get("request_id"), None)
+        if future is not None and not future.done():
+            if data.get("error"):
+                future.set_exception(RuntimeError(data["error"]))
+            else:
+                future.set_result(data.get("result"))
+        return True
+    
+    def is_request_pending(self, request_id: str) -> bool:
+        """RPC请求是否仍在等待响应（未超时、未因断线失败）"""
+        with self._rpc_lock:
+            future = self.pending_requests.get(request_id)
+        return future is not None and not future.done()
+    
+    def _fail_request(self, request_id: str, error: Exception):
+        """使单个等待中的RPC请求失败"""
+        with self._rpc_lock:
+            future = self.pending_requests.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+    
+    def fail_pending_requests(self, error: Exception):
+        """使所有等待中的RPC请求失败（连接断开时调用）"""
+        with self._rpc_lock:
+            futures = list(self.pending_requests.values())
+            self.pending_requests.clear()
+        for future in futures:
+            if not future.done():
+                future.set_exception(error)
+    
+    def run(self):
+        """在当前线程中运行事件循环和重连监督循环，直到 stop() 被调用"""
+        try:
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.message_queue = asyncio.Queue()
+            self.stop_event = asyncio.Event()
+            self.running = True
+            
+            # 启动重连监督循环
+            self.loop.run_until_complete(self.supervise())
+            
+        except Exception as e:
+            self._emit(self.on_error, f"WebSocket事件循环错误: {e}")
+        finally:
+            self.running = False
+            if self.loop:
+                try:
+                    self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+                finally:
+                    self.loop.close()
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """计算第attempt次重连前的等待时间（指数退避加随机抖动）"""
+        base_delay = SERVER_CONFIG.get("reconnect_base_delay", 1)
+        max_delay = SERVER_CONFIG.get("reconnect_max_delay", 60)
+        delay = min(base_delay * (2 ** attempt), max_delay)
+        return delay * random.uniform(0.5, 1.0)
+    
+    async def supervise(self):
+        """重连监督循环：连接断开或失败后等待一段时间再重新连接"""
+        attempt = 0
+        while self.running:
+            was_connected = await self.connect_websocket()
+            if not self.running:
+                break
+            # 成功建立过连接则从最短等待时间重新开始退避
+            attempt = 0 if was_connected else attempt + 1
+            delay = self.backoff_delay(attempt)
+            self._emit(self.on_reconnecting, delay)
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def connect_websocket(self) -> bool:
+        """连接WebSocket并运行到连接断开或线程停止，返回是否成功建立过连接"""
+        was_connected = False
+        try:
+            uri = SERVER_CONFIG["ws_url"]
+            self.codec = MessageCodec("json")
+            self.batch_enabled = False
+            self.websocket = await asyncio.wait_for(
+                websockets.connect(
+                    uri, 
+                    ping_interval=20, 
+                    ping_timeout=10,
+                    close_timeout=10,
+                    compression="deflate" if SERVER_CONFIG.get("ws_compression", True) else None
+                ),
+                timeout=SERVER_CONFIG.get("ws_timeout", 10)
+            )
+            was_connected = True
+            
+            # 协商编码和批量消息：不支持协商的服务器会忽略 hello，继续使用JSON并逐条发送
+            encodings = [e for e in SERVER_CONFIG.get("ws_encodings", ["json"]) if e in available_encodings()]
+            await self.websocket.send(self.codec.encode({
+                "type": "hello",
+                "timestamp": int(time.time()),
+                "data": {"encodings": encodings or ["json"], "schema_version": SCHEMA_VERSION, "batch": True}
+            }))
+            
+            # 重新注册会话并补发断线期间缓存的消息
+            if self.session_id:
+                await self.websocket.send(self.codec.encode({
+                    "type": "register_session",
+                    "timestamp": int(time.time()),
+                    "data": {"session_id": self.session_id, "client_id": "pc_client"}
+                }))
+            while self.pending_messages:
+                if self.is_stale(self.pending_messages[0]):
+                    self.pending_messages.popleft()
+                    continue
+                await self.websocket.send(self.codec.encode(self.pending_messages[0]))
+                self.pending_messages.popleft()
+            
+            self.is_connected = True
+            self._emit(self.on_connected)
+            
+            # 启动心跳任务
+            tasks = [
+                asyncio.ensure_future(self.heartbeat_loop()),
+                asyncio.ensure_future(self.receive_loop()),
+                asyncio.ensure_future(self.send_loop()),
+                asyncio.ensure_future(self.stop_event.wait()),
+            ]
+            
+            # 任一任务结束即视为连接断开
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            
+        except Exception as e:
+            self._emit(self.on_error, f"WebSocket连接失败: {e}")
+        finally:
+            self.is_connected = False
+            # 队列中尚未发送的消息转入缓存，等待重连后补发
+            while not self.message_queue.empty():
+                message, _ = self.message_queue.get_nowait()
+                self.pending_messages.append(message)
+            if self.websocket:
+                try:
+                    await self.websocket.close()
+                except Exception:
+                    pass
+                self.websocket = None
+            if was_connected:
+                self.fail_pending_requests(ConnectionError("WebSocket连接已断开"))
+                self._emit(self.on_disconnected)
+        return was_connected
+    
+    async def heartbeat_loop(self):
+        """心跳包循环"""
+        while self.running and self.websocket:
+            try:
+                heartbeat_msg = {
+                    "type": "heartbeat",
+                    "timestamp": int(time.time()),
+                    "data": {"client_id": "pc_client"}
+                }
+                await self.websocket.send(self.codec.encode(heartbeat_msg))
+                await asyncio.sleep(SERVER_CONFIG["heartbeat_interval"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._emit(self.on_error, f"心跳包发送失败: {e}")
+                break
+    
+    async def receive_loop(self):
+        """接收消息循环"""
+        while self.running and self.websocket:
+            try:
+                frame = await self.websocket.recv()
+                # 在本线程中解码，GUI线程只接收解码后的消息
+                try:
+                    message = self.codec.decode(frame)
+                except Exception as e:
+                    self._emit(self.on_error, f"消息解析错误: {e}")
+                    continue
+                messages = message.get("data", {}).get("messages", []) if message.get("type") == "batch" else [message]
+                for message in messages:
+                    await self.dispatch_incoming(message)
+            except asyncio.CancelledError:
+                raise
+            except websockets.exceptions.ConnectionClosed:
+                break
+            except Exception as e:
+                self._emit(self.on_error, f"接收消息失败: {e}")
+                break
+    
+    async def dispatch_incoming(self, message: Dict[str, Any]):
+        """处理一条已解码的消息"""
+        message_type = message.get("type")
+        if message_type == "hello_ack":
+            data = message.get("data", {})
+            encoding = data.get("encoding", "json")
+            if encoding in available_encodings():
+                self.codec = MessageCodec(encoding)
+                print(f"WebSocket消息编码: {encoding}")
+            self.batch_enabled = bool(data.get("batch"))
+            return
+        # RPC响应直接在本线程中完成对应的Future，不经过GUI线程
+        if self.handle_rpc_response(message):
+            return
+        # 分发器队列已满时在线程池中等待空位，期间暂停读取连接，心跳和发送不受影响
+        dispatcher = self.dispatcher
+        if not dispatcher.try_dispatch(message):
+            await self.loop.run_in_executor(None, dispatcher.dispatch, message)
+        self._emit(self.on_message, message)
+    
+    async def send_loop(self):
+        """
+        发送消息循环
+        等待队列中的第一条消息，再取出同时已就绪的其余消息；
+        服务器支持批量消息时合并为一帧发送，否则逐条发送
+        """
+        max_batch = SERVER_CONFIG.get("send_batch_max", 64)
+        while self.running and self.websocket:
+            batch = [await self.message_queue.get()]
+            while len(batch) < max_batch and not self.message_queue.empty():
+                batch.append(self.message_queue.get_nowait())
+            
+            messages = [message for message, _ in batch if not self.is_stale(message)]
+            if not messages:
+                continue
+            sent = 0
+            try:
+                if len(messages) > 1 and self.batch_enabled:
+                    await self.websocket.send(self.codec.encode_batch(messages))
+                    sent = len(messages)
+                else:
+                    for message in messages:
+                        await self.websocket.send(self.codec.encode(message))
+                        sent += 1
+            except asyncio.CancelledError:
+                self.pending_messages.extendleft(reversed(messages[sent:]))
+                raise
+            except Exception as e:
+                # 发送失败的消息留待重连后补发
+                self.pending_messages.extendleft(reversed(messages[sent:]))
+                self._emit(self.on_error, f"发送消息失败: {e}")
+                break
+            
+            sent_at = time.perf_counter()
+            self.send_latencies.extend(sent_at - queued_at for _, queued_at in batch)
+    
+    def is_stale(self, message: Dict[str, Any]) -> bool:
+        """
+        RPC请求的Future已完成（超时或断线失败，调用方已改用HTTP）时不再发送，
+        否则重连补发后服务器会重复执行同一请求
+        """
+        if message.get("type") != "rpc_request":
+            return False
+        return not self.is_request_pending(message.get("data", {}).get("request_id"))
+    
+    def _enqueue(self, message: Dict[str, Any], queued_at: float):
+        """在事件循环线程中将消息放入发送队列"""
+        if self.is_connected:
+            self.message_queue.put_nowait((message, queued_at))
+        else:
+            self.pending_messages.append(message)
+    
+    def send_message(self, message: Dict[str, Any]):
+        """发送消息（线程安全），未连接时缓存到重连后发送"""
+        if self.loop and self.running and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._enqueue, message, time.perf_counter())
+        else:
+            self.pending_messages.append(message)
+    
+    def call_later(self, delay: float, callback: Callable, *args):
+        """在事件循环中延迟执行回调（线程安全）"""
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.call_later, delay, callback, *args)
+    
+    def get_send_latency_stats(self) -> Dict[str, float]:
+        """最近发送消息的排队延迟统计（微秒）"""
+        latencies = sorted(self.send_latencies)
+        if not latencies:
+            return {"count": 0}
+        return {
+            "count": len(latencies),
+            "avg_us": sum(latencies) / len(latencies) * 1e6,
+            "p50_us": latencies[len(latencies) // 2] * 1e6,
+            "p99_us": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e6,
+            "max_us": latencies[-1] * 1e6,
+        }
+    
+    def stop(self):
+        """停止运行（线程安全）：通知事件循环关闭连接并结束所有任务，run() 随后返回"""
+        self.running = False
+        if self.loop and not self.loop.is_closed() and self.stop_event:
+            self.loop.call_soon_threadsafe(self.stop_event.set)
@@ -0,0 +1,136 @@
+import json
+
+try:
+    import msgpack
+    HAS_MSGPACK = True
+except ImportError:
+    HAS_MSGPACK = False
+
+try:
+    import cbor2
+    HAS_CBOR = True
+except ImportError:
+    HAS_CBOR = False
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# 各消息类型的字段顺序。二进制编码时按此顺序只发送字段值，不发送字段名；
+# 只能在末尾追加字段，追加新类型时同步提升 SCHEMA_VERSION
+SCHEMA_VERSION = 1
+MESSAGE_SCHEMAS = {
+    "heartbeat": ("client_id",),
+    "register_session": ("session_id", "client_id"),
+    "rpc_request": ("request_id", "method", "params"),
+    "rpc_response": ("request_id", "result", "error"),
+    "progress": ("session_id", "file_name", "progress", "bytes_done", "bytes_total"),
+    "status": ("session_id", "file_name", "status"),
+    "encryption_approved": ("session_id", "symmetric_key", "salt"),
+    "encryption_rejected": ("session_id", "reason"),
+}
+TYPE_CODES = {message_type: code for code, message_type in enumerate(MESSAGE_SCHEMAS)}
+CODE_TYPES = {code: message_type for message_type, code in TYPE_CODES.items()}
+
+
+def available_encodings():
+    """本机支持的编码，按优先级排列"""
+    encodings = []
+    if HAS_MSGPACK:
+        encodings.append("msgpack")
+    if HAS_CBOR:
+        encodings.append("cbor")
+    encodings.append("json")
+    return encodings
+
+
+def dumps_json(obj):
+    """JSON序列化，安装了orjson时使用orjson"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads_json(text):
+    """JSON反序列化，安装了orjson时使用orjson"""
+    if HAS_ORJSON:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+class MessageCodec:
+    """
+    WebSocket消息编解码器
+    json: 文本帧，消息格式与原有协议相同
+    msgpack/cbor: 二进制帧，消息编码为 [类型, 时间戳, 数据]，
+    有schema的类型以类型编号代替类型名，数据按schema顺序编码为数组
+    """
+
+    def __init__(self, encoding="json"):
+        if encoding not in available_encodings():
+            raise ValueError(f"不支持的编码: {encoding}")
+        self.encoding = encoding
+
+    @property
+    def is_binary(self):
+        return self.encoding != "json"
+
+    def encode(self, message):
+        """编码单条消息，返回 str（文本帧）或 bytes（二进制帧）"""
+        if not self.is_binary:
+            return dumps_json(message)
+        return self._pack(self._compact(message))
+
+    def encode_batch(self, messages):
+        """将多条消息编码为一帧，只应在服务器于 hello_ack 中声明支持批量消息后使用"""
+        if not self.is_binary:
+            return dumps_json({"type": "batch", "timestamp": messages[-1].get("timestamp"),
+                               "data": {"messages": messages}})
+        return self._pack(["batch", messages[-1].get("timestamp"), [self._compact(m) for m in messages]])
+
+    def decode(self, frame):
+        """解码一帧，文本帧始终按JSON解析，以兼容协商完成前和只支持文本的服务器"""
+        if isinstance(frame, str) or not self.is_binary:
+            return loads_json(frame)
+        return self._expand(self._unpack(frame))
+
+    def _compact(self, message):
+        message_type = message.get("type")
+        data = message.get("data") or {}
+        schema = MESSAGE_SCHEMAS.get(message_type)
+        if schema is None or set(data) - set(schema):
+            # 无schema或包含schema之外的字段时保留字段名
+            return [message_type, message.get("timestamp"), data]
+        # 按schema顺序编码到最后一个存在的字段，缺少的末尾字段不发送，值为None的字段照常编码
+        values = []
+        for field in schema:
+            if field not in data:
+                break
+            values.append(data[field])
+        if len(values) != len(data):
+            # 中间缺少字段时无法用数组区分"缺少"和"值为None"，保留字段名
+            return [message_type, message.get("timestamp"), data]
+        return [TYPE_CODES[message_type], message.get("timestamp"), values]
+
+    def _expand(self, compact):
+        message_type, timestamp, data = compact
+        if message_type == "batch":
+            return {"type": "batch", "timestamp": timestamp,
+                    "data": {"messages": [self._expand(item) for item in data]}}
+        if isinstance(message_type, int):
+            message_type = CODE_TYPES[message_type]
+            schema = MESSAGE_SCHEMAS[message_type]
+            data = dict(zip(schema, data))
+        return {"type": message_type, "timestamp": timestamp, "data": data}
+
+    def _pack(self, obj):
+        if self.encoding == "msgpack":
+            return msgpack.packb(obj, use_bin_type=True)
+        return cbor2.dumps(obj)
+
+    def _unpack(self, payload):
+        if self.encoding == "msgpack":
+            return msgpack.unpackb(payload, raw=False)
+        return cbor2.loads(payload)